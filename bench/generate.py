@@ -0,0 +1,124 @@
+import sys
+import random
+import argparse
+
+from core.stream import open_writer
+
+WORDS = (
+    "idea plan draft sketch review launch budget design research meeting note question answer "
+    "goal risk deadline feature bug fix release roadmap user story theme chapter scene outline"
+).split()
+
+SHAPES = {
+    "small": {"depth": 1, "fanout": 2, "nodes": 50, "wires": 60, "text_size": 10_000, "tasks": 100},
+    "medium": {"depth": 2, "fanout": 3, "nodes": 500, "wires": 700, "text_size": 200_000, "tasks": 5_000},
+    "large": {"depth": 3, "fanout": 3, "nodes": 5_000, "wires": 7_000, "text_size": 5_000_000, "tasks": 100_000}
+}
+
+def make_text(rng, size):
+    words = []
+    length = 0
+
+    while length < size:
+        word = rng.choice(WORDS)
+        words.append(word)
+        length += len(word) + 1
+
+    return " ".join(words)[:size]
+
+def make_nodes(rng, count, wires):
+    columns = max(1, int(count ** 0.5))
+
+    nodes = [
+        {
+            "id": node_id,
+            "type": "Comment",
+            "x": float((node_id - 1) % columns * 260),
+            "y": float((node_id - 1) // columns * 160),
+            "content": make_text(rng, rng.randint(0, 120))
+        }
+        for node_id in range(1, count + 1)
+    ]
+
+    links = []
+    if count > 1:
+        for wire_id in range(1, wires + 1):
+            start = rng.randint(1, count)
+            end = rng.randint(1, count - 1)
+
+            links.append({"id": wire_id, "start_node": start, "end_node": end + (end >= start)})
+
+    return {"nodes": nodes, "wires": links}
+
+def make_tasks(rng, count):
+    return [{"text": make_text(rng, rng.randint(8, 60)), "done": rng.random() < 0.3} for _ in range(count)]
+
+def generate_stacks(shape, seed=0):
+    # Yields (path, name, entry), a folder before everything inside it, so a whole project never sits in memory
+    rng = random.Random(seed)
+    pending = [("", "", 0)]
+
+    while pending:
+        parent_path, label, depth = pending.pop()
+
+        if depth == shape["depth"]:
+            for stack_type, content in (
+                ("nodes", lambda: make_nodes(rng, shape["nodes"], shape["wires"])),
+                ("todo", lambda: make_tasks(rng, shape["tasks"])),
+                ("text", lambda: make_text(rng, shape["text_size"]))
+            ):
+                name = f"{stack_type.capitalize()}{label}"
+                path = f"{parent_path}/{name}" if parent_path else name
+
+                yield path, name, {"type": stack_type, "content": content()}
+
+            continue
+
+        children = []
+        for position in range(1, shape["fanout"] + 1):
+            child_label = f"{label}.{position}" if label else f" {position}"
+            name = f"Folder{child_label}"
+            path = f"{parent_path}/{name}" if parent_path else name
+
+            yield path, name, {"type": "folder"}
+            children.append((path, child_label, depth + 1))
+
+        pending.extend(reversed(children))
+
+def write_project(path, shape, seed=0):
+    writer = open_writer(path)
+    paths = []
+
+    for stack_path, name, entry in generate_stacks(shape, seed):
+        writer.add_stack(name, entry)
+        paths.append(stack_path)
+
+    writer.add_paths(paths)
+    writer.close()
+
+    return paths
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Write a synthetic IdeaStack project, .json or .ideastack by extension.")
+    parser.add_argument("output")
+    parser.add_argument("--shape", choices=sorted(SHAPES), default="medium", help="preset the options below start from")
+    parser.add_argument("--seed", type=int, default=0)
+
+    for option in SHAPES["medium"]:
+        parser.add_argument(f"--{option.replace('_', '-')}", type=int, dest=option)
+
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+
+    shape = dict(SHAPES[args.shape])
+    for option in shape:
+        if getattr(args, option) is not None:
+            shape[option] = getattr(args, option)
+
+    paths = write_project(args.output, shape, args.seed)
+    print(f"Wrote {len(paths)} stacks to {args.output}")
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,306 @@
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+import argparse
+import tempfile
+import resource
+import statistics
+import tracemalloc
+
+# Set before Qt is imported, so the suite runs on a machine without a display
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from PyQt5.QtCore import QModelIndex
+from PyQt5.QtWidgets import QApplication
+
+from bench.generate import SHAPES, write_project
+from core import layout
+from core.journal import Journal
+from core.store import SqliteStore, export_project
+from core.search import SearchIndex
+from core.sidebar import SidebarModel
+from stacks import nodes, table, text, todo
+
+import cli
+
+DEFAULT_REPEAT = 5
+DEFAULT_THRESHOLD = 1.25
+
+BENCHMARKS = []
+
+def benchmark(function):
+    BENCHMARKS.append(function)
+    return function
+
+def first_stack(data, stack_type):
+    return next(name for name, entry in data["data"].items() if entry.get("type") == stack_type)
+
+def dispose(widget):
+    widget.deleteLater()
+    QApplication.sendPostedEvents(None, 0)
+
+# Each benchmark does its setup and returns the call being timed
+
+@benchmark
+def journal_load(context):
+    return lambda: Journal(context["json_path"]).load()
+
+@benchmark
+def sqlite_load(context):
+    store = SqliteStore(context["sqlite_path"])
+    return lambda: store.load()
+
+@benchmark
+def sidebar_expand(context):
+    data = context["data"]
+
+    def run():
+        model = SidebarModel(data["hierarchy"], data["data"])
+        pending = [QModelIndex()]
+
+        while pending:
+            parent = pending.pop()
+            while model.canFetchMore(parent):
+                model.fetchMore(parent)
+
+            pending.extend(model.index(row, 0, parent) for row in range(model.rowCount(parent)))
+
+    return run
+
+@benchmark
+def nodes_load(context):
+    data = context["data"]
+    name = first_stack(data, "nodes")
+
+    return lambda: dispose(nodes.Stack(name, data))
+
+@benchmark
+def nodes_load_all(context):
+    data = context["data"]
+    name = first_stack(data, "nodes")
+
+    def run():
+        stack = nodes.Stack(name, data)
+        stack.finish_loading()
+        dispose(stack)
+
+    return run
+
+@benchmark
+def nodes_save_all(context):
+    stack = nodes.Stack(first_stack(context["data"], "nodes"), context["data"])
+    stack.finish_loading()
+
+    def run():
+        for node in stack.node_items.values():
+            node.changed()
+        stack.take_changes()
+
+    return run
+
+@benchmark
+def nodes_layout(context):
+    stack = nodes.Stack(first_stack(context["data"], "nodes"), context["data"])
+    stack.finish_loading()
+
+    items = stack.nodes()
+    index = {node: position for position, node in enumerate(items)}
+    edges = [(index[wire.start_socket.parentItem()], index[wire.end_socket.parentItem()]) for wire in stack.wire_layer]
+    positions = [(node.x(), node.y()) for node in items]
+
+    return lambda: layout.arrange("layered", positions, edges, nodes.LAYOUT_SPACING_X, nodes.LAYOUT_SPACING_Y)
+
+@benchmark
+def todo_load(context):
+    data = context["data"]
+    name = first_stack(data, "todo")
+
+    return lambda: dispose(todo.Stack(name, data))
+
+@benchmark
+def todo_save(context):
+    stack = todo.Stack(first_stack(context["data"], "todo"), context["data"])
+
+    def run():
+        stack.model.set_done(range(stack.model.rowCount()), True)
+        stack.get_data()
+
+    return run
+
+@benchmark
+def text_open(context):
+    data = context["data"]
+    name = first_stack(data, "text")
+
+    return lambda: dispose(text.Stack(name, data))
+
+@benchmark
+def table_index(context):
+    path = os.path.join(context["work_dir"], "table.csv")
+
+    with open(path, "w", encoding="utf-8") as file:
+        file.write("id,task,done\n")
+        for row, task in enumerate(context["data"]["data"][first_stack(context["data"], "todo")]["content"] * 10):
+            file.write(f"{row},{task['text']},{int(task['done'])}\n")
+
+    def run():
+        source = table.CsvSource(path)
+        source.build_index(lambda fraction: None)
+        source.column(0)
+
+    return run
+
+@benchmark
+def journal_append(context):
+    journal = Journal(os.path.join(context["work_dir"], "append.json"))
+    journal.load()
+
+    name = first_stack(context["data"], "todo")
+    record = {"op": "content", "name": name, "content": context["data"]["data"][name]["content"]}
+
+    return lambda: journal.append(record)
+
+@benchmark
+def journal_compact(context):
+    path = os.path.join(context["work_dir"], "compact.json")
+    shutil.copy(context["json_path"], path)
+
+    journal = Journal(path)
+    name = first_stack(context["data"], "text")
+    record = {"op": "content", "name": name, "content": context["data"]["data"][name]["content"]}
+
+    def run():
+        journal.append(record)
+        journal.compact()
+
+    return run
+
+@benchmark
+def sqlite_export(context):
+    backend = Journal(context["json_path"])
+    target = os.path.join(context["work_dir"], "export.ideastack")
+
+    return lambda: export_project(backend, target)
+
+@benchmark
+def search_rebuild(context):
+    index = SearchIndex()
+    entries = list(context["data"]["data"].items())
+
+    def run():
+        index.rebuild(lambda: entries)
+        index.wait()
+
+    return run
+
+@benchmark
+def cli_validate(context):
+    return lambda: cli.validate_file(context["json_path"])
+
+def measure(function, context, repeat):
+    run = function(context)
+
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        run()
+        times.append((time.perf_counter() - started) * 1000)
+
+    # One more run under tracemalloc, which slows everything down too much to time alongside it
+    tracemalloc.start()
+    run()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "median_ms": round(statistics.median(times), 3),
+        "min_ms": round(min(times), 3),
+        "runs": repeat,
+        "peak_kb": peak // 1024
+    }
+
+def environment(shape_name, shape):
+    return {
+        "shape": shape_name,
+        "parameters": shape,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "qt_platform": os.environ["QT_QPA_PLATFORM"],
+        "max_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    }
+
+def compare(results, baseline, threshold):
+    regressions = []
+
+    for name, result in results.items():
+        previous = baseline.get("results", {}).get(name)
+        if not previous or not previous["median_ms"]:
+            result["baseline_ratio"] = None
+            continue
+
+        ratio = result["median_ms"] / previous["median_ms"]
+        result["baseline_ratio"] = round(ratio, 3)
+
+        if ratio > threshold:
+            regressions.append(name)
+
+    return regressions
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        description="Time IdeaStack's hot paths on a generated project. Run from the repository root as python -m bench.run."
+    )
+    parser.add_argument("--shape", choices=sorted(SHAPES), default="medium")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT)
+    parser.add_argument("--only", nargs="+", metavar="NAME", help="run only these benchmarks")
+    parser.add_argument("--output", default="bench-results.json", help="where the JSON results are written")
+    parser.add_argument("--baseline", help="earlier results file to compare against")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="slowdown ratio that counts as a regression")
+
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+
+    app = QApplication.instance() or QApplication(sys.argv)
+    shape = SHAPES[args.shape]
+
+    selected = [function for function in BENCHMARKS if not args.only or function.__name__ in args.only]
+
+    with tempfile.TemporaryDirectory(prefix="ideastack-bench-") as work_dir:
+        context = {"work_dir": work_dir, "json_path": os.path.join(work_dir, "project.json")}
+        context["sqlite_path"] = os.path.join(work_dir, "project.ideastack")
+
+        write_project(context["json_path"], shape)
+        write_project(context["sqlite_path"], shape)
+        context["data"] = Journal(context["json_path"]).load()
+
+        results = {}
+        for function in selected:
+            name = function.__name__
+            results[name] = measure(function, context, args.repeat)
+
+            print(f"{name:<18} {results[name]['median_ms']:>10.1f} ms {results[name]['peak_kb']:>10} KB peak", flush=True)
+            app.processEvents()
+
+    report = {"environment": environment(args.shape, shape), "results": results}
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as file:
+            regressions = compare(results, json.load(file), args.threshold)
+
+        for name in regressions:
+            print(f"Regression: {name} is {results[name]['baseline_ratio']:.2f}x its baseline", file=sys.stderr)
+
+    with open(args.output, "w", encoding="utf-8") as file:
+        json.dump(report, file, indent=4)
+
+    print(f"Results written to {args.output}")
+    return 1 if regressions else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
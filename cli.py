@@ -0,0 +1,348 @@
+import os
+import sys
+import json
+import sqlite3
+import argparse
+
+from collections import Counter
+
+# Nothing on this path may import PyQt5, it has to start fast and run where there is no display
+from core.stream import read_project, open_writer
+from core.hierarchy import unique_name
+from core.graph import GraphIndex
+
+READ_ERRORS = (OSError, ValueError, sqlite3.DatabaseError)
+
+CONTENT_TYPES = {"text": str, "todo": list, "nodes": dict, "table": dict}
+NODE_KEYS = ("type", "x", "y", "content")
+
+def map_files(function, paths, jobs):
+    if jobs == 1 or len(paths) < 2:
+        yield from map(function, paths)
+        return
+
+    # Imported here, multiprocessing alone costs a noticeable part of startup
+    from concurrent.futures import ProcessPoolExecutor
+
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        yield from executor.map(function, paths)
+
+def write_project(path, fill):
+    writer = open_writer(path)
+
+    try:
+        fill(writer)
+    except BaseException:
+        writer.abort()
+        raise
+
+    writer.close()
+
+def check_nodes(name, content, problems):
+    nodes = content.get("nodes", [])
+    wires = content.get("wires", [])
+
+    if not isinstance(nodes, list) or not isinstance(wires, list):
+        problems.append(f"{name}: nodes and wires should be lists")
+        return
+
+    ids = Counter(node.get("id") for node in nodes if isinstance(node, dict))
+
+    broken = sum(1 for node in nodes if not isinstance(node, dict) or any(key not in node for key in NODE_KEYS))
+    if broken:
+        problems.append(f"{name}: {broken} nodes are missing fields")
+
+    duplicates = [node_id for node_id, count in ids.items() if node_id is not None and count > 1]
+    if duplicates:
+        problems.append(f"{name}: duplicate node ids {sorted(duplicates, key=str)[:5]}")
+
+    dangling = sum(
+        1 for wire in wires
+        if not isinstance(wire, dict) or wire.get("start_node") not in ids or wire.get("end_node") not in ids
+    )
+    if dangling:
+        problems.append(f"{name}: {dangling} wires point at missing nodes")
+
+def check_entry(name, entry, problems):
+    if not isinstance(entry, dict):
+        problems.append(f"{name}: entry should be an object")
+        return
+
+    stack_type = entry.get("type")
+    if not isinstance(stack_type, str):
+        problems.append(f"{name}: missing stack type")
+        return
+
+    content = entry.get("content")
+    expected = CONTENT_TYPES.get(stack_type)
+
+    # Third-party stack types store whatever they like
+    if content is None or expected is None:
+        return
+
+    if not isinstance(content, expected):
+        problems.append(f"{name}: {stack_type} content should be a {expected.__name__}")
+
+    elif stack_type == "todo":
+        broken = sum(
+            1 for task in content
+            if not isinstance(task, dict) or not isinstance(task.get("text"), str) or not isinstance(task.get("done"), bool)
+        )
+        if broken:
+            problems.append(f"{name}: {broken} malformed tasks")
+
+    elif stack_type == "nodes":
+        check_nodes(name, content, problems)
+
+    elif stack_type == "table" and not isinstance(content.get("source", ""), str):
+        problems.append(f"{name}: table source should be a file path")
+
+def check_hierarchy(hierarchy, names, problems):
+    if not isinstance(hierarchy, list) or not all(isinstance(path, str) for path in hierarchy):
+        problems.append("hierarchy should be a list of paths")
+        return
+
+    leaves = Counter()
+    seen = set()
+
+    for path in hierarchy:
+        if path in seen:
+            problems.append(f"duplicate path '{path}'")
+            continue
+        if not all(path.split("/")):
+            problems.append(f"empty name in path '{path}'")
+
+        seen.add(path)
+        leaves[path.split("/")[-1]] += 1
+
+    for leaf, count in leaves.items():
+        if count > 1:
+            problems.append(f"{leaf}: listed {count} times, stack names must be unique")
+        if leaf not in names:
+            problems.append(f"{leaf}: listed in the hierarchy but has no data")
+
+    for name in names:
+        if name not in leaves:
+            problems.append(f"{name}: not listed in the hierarchy")
+
+def validate_file(path):
+    problems = []
+    names = set()
+    hierarchy = None
+
+    try:
+        for kind, payload in read_project(path):
+            if kind == "hierarchy":
+                hierarchy = payload
+            else:
+                name, entry = payload
+                names.add(name)
+                check_entry(name, entry, problems)
+    except READ_ERRORS as e:
+        problems.append(f"unreadable: {e}")
+        return path, problems
+
+    if hierarchy is None:
+        problems.append("missing hierarchy")
+    else:
+        check_hierarchy(hierarchy, names, problems)
+
+    return path, problems
+
+def stats_file(path):
+    stats = {
+        "path": path,
+        "bytes": os.path.getsize(path) if os.path.exists(path) else 0,
+        "paths": 0,
+        "stacks": 0,
+        "types": Counter(),
+        "nodes": 0,
+        "wires": 0,
+        "cyclic": 0,
+        "tasks": 0,
+        "done": 0,
+        "characters": 0
+    }
+
+    try:
+        for kind, payload in read_project(path):
+            if kind == "hierarchy":
+                stats["paths"] = len(payload)
+                continue
+
+            entry = payload[1] if isinstance(payload[1], dict) else {}
+            content = entry.get("content")
+
+            stats["stacks"] += 1
+            stats["types"][entry.get("type")] += 1
+
+            if isinstance(content, str):
+                stats["characters"] += len(content)
+            elif isinstance(content, list):
+                stats["tasks"] += len(content)
+                stats["done"] += sum(1 for task in content if isinstance(task, dict) and task.get("done"))
+            elif isinstance(content, dict):
+                stats["nodes"] += len(content.get("nodes", []))
+                stats["wires"] += len(content.get("wires", []))
+
+                if entry.get("type") == "nodes":
+                    try:
+                        stats["cyclic"] += GraphIndex.from_content(content).has_cycle()
+                    except (KeyError, TypeError, AttributeError):
+                        # Malformed node lists are validate's to report
+                        pass
+    except READ_ERRORS as e:
+        stats["error"] = str(e)
+
+    stats["types"] = dict(stats["types"])
+    return stats
+
+def run_validate(args):
+    failed = 0
+
+    for path, problems in map_files(validate_file, args.files, args.jobs):
+        if not problems:
+            print(f"{path}: ok")
+            continue
+
+        failed += 1
+        print(f"{path}: {len(problems)} problems")
+        for problem in problems:
+            print(f"    {problem}")
+
+    return 1 if failed else 0
+
+def run_stats(args):
+    failed = 0
+
+    for stats in map_files(stats_file, args.files, args.jobs):
+        failed += "error" in stats
+
+        if args.json:
+            print(json.dumps(stats))
+            continue
+
+        if "error" in stats:
+            print(f"{stats['path']}: unreadable: {stats['error']}")
+            continue
+
+        types = ", ".join(f"{count} {stack_type}" for stack_type, count in sorted(stats["types"].items(), key=lambda item: str(item[0])))
+        print(f"{stats['path']}: {stats['bytes']} bytes, {stats['stacks']} stacks ({types})")
+        print(
+            f"    {stats['nodes']} nodes, {stats['wires']} wires ({stats['cyclic']} graphs with cycles), "
+            f"{stats['tasks']} tasks ({stats['done']} done), {stats['characters']} characters of text"
+        )
+
+    return 1 if failed else 0
+
+def run_convert(args):
+    def fill(writer):
+        for kind, payload in read_project(args.source):
+            if kind == "hierarchy":
+                writer.add_paths(payload)
+            else:
+                writer.add_stack(*payload)
+
+    write_project(args.target, fill)
+    return 0
+
+def run_merge(args):
+    taken = set()
+    suffixes = {}
+
+    def fill(writer):
+        for file_path in args.files:
+            renames = {}
+            hierarchy = []
+
+            for kind, payload in read_project(file_path):
+                if kind == "hierarchy":
+                    hierarchy = payload
+                    continue
+
+                name, entry = payload
+                new_name = unique_name(name, taken, suffixes)
+                taken.add(new_name)
+
+                if new_name != name:
+                    renames[name] = new_name
+
+                writer.add_stack(new_name, entry)
+
+            # Folders are stacks too, so renaming every part carries children of a renamed folder along
+            writer.add_paths("/".join(renames.get(part, part) for part in path.split("/")) for path in hierarchy)
+
+            if renames:
+                print(f"{file_path}: renamed {len(renames)} stacks to avoid clashes", file=sys.stderr)
+
+    write_project(args.output, fill)
+    return 0
+
+def run_extract(args):
+    entry = None
+
+    for kind, payload in read_project(args.file):
+        if kind == "stack" and payload[0] == args.name:
+            entry = payload[1]
+            break
+
+    if entry is None:
+        print(f"error: no stack named '{args.name}' in {args.file}", file=sys.stderr)
+        return 1
+
+    if not args.output:
+        print(json.dumps(entry, indent=4))
+        return 0
+
+    def fill(writer):
+        writer.add_stack(args.name, entry)
+        writer.add_paths([args.name])
+
+    write_project(args.output, fill)
+    return 0
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="ideastack", description="Work with IdeaStack project files without the GUI.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    validate = commands.add_parser("validate", help="check project files for structural problems")
+    validate.add_argument("files", nargs="+")
+    validate.set_defaults(run=run_validate)
+
+    stats = commands.add_parser("stats", help="count stacks, nodes, tasks and text in project files")
+    stats.add_argument("files", nargs="+")
+    stats.add_argument("--json", action="store_true", help="print one JSON object per file")
+    stats.set_defaults(run=run_stats)
+
+    for command in (validate, stats):
+        command.add_argument("-j", "--jobs", type=int, default=os.cpu_count(), help="worker processes for many files")
+
+    convert = commands.add_parser("convert", help="convert between .json and .ideastack by file extension")
+    convert.add_argument("source")
+    convert.add_argument("target")
+    convert.set_defaults(run=run_convert)
+
+    merge = commands.add_parser("merge", help="combine projects, renaming stacks whose names clash")
+    merge.add_argument("output")
+    merge.add_argument("files", nargs="+")
+    merge.set_defaults(run=run_merge)
+
+    extract = commands.add_parser("extract", help="print one stack, or write it out as its own project")
+    extract.add_argument("file")
+    extract.add_argument("name")
+    extract.add_argument("-o", "--output")
+    extract.set_defaults(run=run_extract)
+
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+
+    try:
+        return args.run(args)
+    except READ_ERRORS as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 2
+
+if __name__ == "__main__":
+    sys.exit(main())
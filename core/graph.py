@@ -0,0 +1,165 @@
+from collections import Counter, deque
+
+class GraphIndex:
+    def __init__(self):
+        self.edges = {}
+        self.outgoing = {}
+        self.incoming = {}
+        self.node_edges = {}
+
+    @classmethod
+    def from_content(cls, content):
+        graph = cls()
+        content = content or {}
+
+        for entry in content.get("nodes", []):
+            graph.add_node(entry["id"])
+
+        for position, entry in enumerate(content.get("wires", [])):
+            start, end = entry.get("start_node"), entry.get("end_node")
+
+            if start in graph and end in graph:
+                graph.add_edge(entry.get("id", position), start, end)
+
+        return graph
+
+    def __contains__(self, node):
+        return node in self.outgoing
+
+    def __len__(self):
+        return len(self.outgoing)
+
+    def __iter__(self):
+        return iter(self.outgoing)
+
+    def add_node(self, node):
+        self.outgoing.setdefault(node, Counter())
+        self.incoming.setdefault(node, Counter())
+        self.node_edges.setdefault(node, set())
+
+    def remove_node(self, node):
+        for edge in list(self.node_edges.get(node, ())):
+            self.remove_edge(edge)
+
+        self.outgoing.pop(node, None)
+        self.incoming.pop(node, None)
+        self.node_edges.pop(node, None)
+
+    def add_edge(self, edge, start, end):
+        self.add_node(start)
+        self.add_node(end)
+
+        self.edges[edge] = (start, end)
+        self.node_edges[start].add(edge)
+        self.node_edges[end].add(edge)
+
+        self.outgoing[start][end] += 1
+        self.incoming[end][start] += 1
+
+    def remove_edge(self, edge):
+        if edge not in self.edges:
+            return
+
+        start, end = self.edges.pop(edge)
+
+        self.node_edges[start].discard(edge)
+        self.node_edges[end].discard(edge)
+
+        # Counters keep parallel wires between the same two nodes apart
+        self.outgoing[start][end] -= 1
+        if not self.outgoing[start][end]:
+            del self.outgoing[start][end]
+
+        self.incoming[end][start] -= 1
+        if not self.incoming[end][start]:
+            del self.incoming[end][start]
+
+    def walk(self, starts, neighbours):
+        seen = set()
+        queue = deque(start for start in starts if start in self)
+
+        while queue:
+            node = queue.popleft()
+
+            for neighbour in neighbours[node]:
+                if neighbour not in seen:
+                    seen.add(neighbour)
+                    queue.append(neighbour)
+
+        return seen
+
+    def downstream(self, *starts):
+        return self.walk(starts, self.outgoing)
+
+    def upstream(self, *starts):
+        return self.walk(starts, self.incoming)
+
+    def reaches(self, start, end):
+        if start not in self or end not in self:
+            return False
+
+        seen = {start}
+        stack = [start]
+
+        while stack:
+            node = stack.pop()
+            if node == end:
+                return True
+
+            for neighbour in self.outgoing[node]:
+                if neighbour not in seen:
+                    seen.add(neighbour)
+                    stack.append(neighbour)
+
+        return False
+
+    def topological_order(self):
+        in_degree = {node: len(sources) for node, sources in self.incoming.items()}
+        queue = deque(node for node, degree in in_degree.items() if degree == 0)
+        order = []
+
+        while queue:
+            node = queue.popleft()
+            order.append(node)
+
+            for neighbour in self.outgoing[node]:
+                in_degree[neighbour] -= 1
+                if in_degree[neighbour] == 0:
+                    queue.append(neighbour)
+
+        if len(order) != len(self.outgoing):
+            return None
+
+        return order
+
+    def find_cycle(self):
+        # Iterative colouring DFS, so long chains do not hit the recursion limit
+        state = {}
+
+        for root in self.outgoing:
+            if root in state:
+                continue
+
+            path = [root]
+            iterators = [iter(self.outgoing[root])]
+            state[root] = "open"
+
+            while iterators:
+                neighbour = next(iterators[-1], None)
+
+                if neighbour is None:
+                    state[path.pop()] = "done"
+                    iterators.pop()
+
+                elif state.get(neighbour) == "open":
+                    return path[path.index(neighbour):]
+
+                elif neighbour not in state:
+                    state[neighbour] = "open"
+                    path.append(neighbour)
+                    iterators.append(iter(self.outgoing[neighbour]))
+
+        return None
+
+    def has_cycle(self):
+        return self.find_cycle() is not None
@@ -0,0 +1,174 @@
+def unique_name(base, taken, suffixes=None):
+    if base not in taken:
+        return base
+
+    # Callers naming many stacks keep the next free suffix per base, so each name is not searched for from 1
+    i = 1 if suffixes is None else suffixes.get(base, 1)
+    while f"{base} {i}" in taken:
+        i += 1
+
+    if suffixes is not None:
+        suffixes[base] = i + 1
+
+    return f"{base} {i}"
+
+class PathNode:
+    __slots__ = ("name", "parent", "children", "listed")
+
+    def __init__(self, name, parent=None):
+        self.name = name
+        self.parent = parent
+        self.children = {}
+        self.listed = False
+
+    @property
+    def path(self):
+        parts = []
+        node = self
+
+        while node.parent is not None:
+            parts.append(node.name)
+            node = node.parent
+
+        return "/".join(reversed(parts))
+
+    def walk(self):
+        pending = [self]
+
+        while pending:
+            node = pending.pop()
+            yield node
+            pending.extend(reversed(list(node.children.values())))
+
+class HierarchyIndex:
+    def __init__(self, paths=()):
+        self.root = PathNode("")
+        self.count = 0
+
+        # Stack names are unique across the tree, so listed nodes are also kept by name
+        self.names = {}
+
+        # Next free suffix per base name for unique_name, kept as long as the project is open
+        self.suffixes = {}
+
+        for path in paths:
+            self.add(path)
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        return iter(self.paths())
+
+    def __contains__(self, path):
+        node = self.find(path)
+        return node is not None and node.listed
+
+    def find(self, path):
+        node = self.root
+
+        for part in path.split("/"):
+            node = node.children.get(part)
+            if node is None:
+                return None
+
+        return node
+
+    def find_name(self, name):
+        return self.names.get(name)
+
+    def forget_name(self, node):
+        if self.names.get(node.name) is node:
+            del self.names[node.name]
+
+    def ensure(self, parts):
+        node = self.root
+
+        for part in parts:
+            child = node.children.get(part)
+            if child is None:
+                child = PathNode(part, node)
+                node.children[part] = child
+            node = child
+
+        return node
+
+    def add(self, path):
+        node = self.ensure(path.split("/"))
+
+        if not node.listed:
+            node.listed = True
+            self.count += 1
+            self.names[node.name] = node
+
+        return node
+
+    def remove(self, path):
+        node = self.find(path)
+        if node is None:
+            return []
+
+        del node.parent.children[node.name]
+        node.parent = None
+
+        removed = list(node.walk())
+
+        for child in removed:
+            if child.listed:
+                self.count -= 1
+                self.forget_name(child)
+
+        return removed
+
+    def check_move(self, node, new_path):
+        parts = new_path.split("/")
+        parent = self.root
+
+        for part in parts[:-1]:
+            parent = parent.children.get(part)
+            if parent is None:
+                return
+            if parent is node:
+                raise ValueError(f"Cannot move '{node.path}' into itself")
+
+        existing = parent.children.get(parts[-1])
+        if existing is not None and existing is not node:
+            raise ValueError(f"'{new_path}' already exists")
+
+    def move(self, old_path, new_path):
+        node = self.find(old_path)
+        if node is None:
+            return self.add(new_path)
+
+        self.check_move(node, new_path)
+
+        parts = new_path.split("/")
+        new_parent = self.ensure(parts[:-1])
+
+        del node.parent.children[node.name]
+
+        if node.listed:
+            self.forget_name(node)
+            self.names[parts[-1]] = node
+
+        node.name = parts[-1]
+        node.parent = new_parent
+        new_parent.children[node.name] = node
+
+        return node
+
+    def paths(self):
+        result = []
+        pending = [(child, child.name) for child in reversed(list(self.root.children.values()))]
+
+        while pending:
+            node, path = pending.pop()
+            if node.listed:
+                result.append(path)
+
+            pending.extend(
+                (child, f"{path}/{child.name}")
+                for child in reversed(list(node.children.values()))
+            )
+
+        return result
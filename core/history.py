@@ -0,0 +1,147 @@
+import os
+import json
+import time
+import zlib
+import hashlib
+
+from core import trace
+
+HISTORY_SUFFIX = ".history"
+COMPRESS_LEVEL = 1
+
+def history_path(project_path):
+    return f"{project_path}{HISTORY_SUFFIX}"
+
+def encode_entry(entry):
+    # Sorted keys make equal entries hash the same however their dicts were built
+    return json.dumps(entry, sort_keys=True, separators=(",", ":")).encode("utf-8")
+
+def write_atomic(path, data):
+    temp_path = f"{path}.tmp"
+
+    with open(temp_path, "wb") as file:
+        file.write(data)
+        file.flush()
+        os.fsync(file.fileno())
+
+    os.replace(temp_path, path)
+
+def parents(hierarchy):
+    return {path.rpartition("/")[2]: path.rpartition("/")[0] for path in hierarchy}
+
+class History:
+    def __init__(self, path):
+        self.path = path
+        self.blob_dir = os.path.join(path, "blobs")
+        self.manifest_dir = os.path.join(path, "manifests")
+
+        # Manifests never change once written, so each is read at most once
+        self.manifests = {}
+
+    def blob_path(self, digest):
+        return os.path.join(self.blob_dir, digest[:2], digest[2:])
+
+    def write_blob(self, data):
+        digest = hashlib.sha256(data).hexdigest()
+        path = self.blob_path(digest)
+
+        # Content addressed, a blob already on disk is the same bytes
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            write_atomic(path, zlib.compress(data, COMPRESS_LEVEL))
+
+        return digest
+
+    def read_blob(self, digest):
+        with open(self.blob_path(digest), "rb") as file:
+            return json.loads(zlib.decompress(file.read()))
+
+    @trace.traced("history.commit", "save")
+    def commit(self, entries, hierarchy, label=""):
+        os.makedirs(self.manifest_dir, exist_ok=True)
+
+        stacks = {name: self.write_blob(encode_entry(entry)) for name, entry in entries}
+
+        created = time.time()
+        manifest = {"created": created, "label": label, "hierarchy": list(hierarchy), "stacks": stacks}
+
+        data = encode_entry(manifest)
+        # The time prefix keeps file names in commit order, the hash keeps two commits in one millisecond apart
+        version_id = f"{int(created * 1000):013d}-{hashlib.sha256(data).hexdigest()[:12]}"
+        manifest["id"] = version_id
+
+        write_atomic(os.path.join(self.manifest_dir, f"{version_id}.json"), data)
+        self.manifests[version_id] = manifest
+
+        return manifest
+
+    def version_ids(self):
+        if not os.path.isdir(self.manifest_dir):
+            return []
+
+        return sorted(name[:-5] for name in os.listdir(self.manifest_dir) if name.endswith(".json"))
+
+    def manifest(self, version_id):
+        manifest = self.manifests.get(version_id)
+
+        if manifest is None:
+            with open(os.path.join(self.manifest_dir, f"{version_id}.json"), "r", encoding="utf-8") as file:
+                manifest = json.load(file)
+
+            manifest["id"] = version_id
+            self.manifests[version_id] = manifest
+
+        return manifest
+
+    def versions(self):
+        return [self.manifest(version_id) for version_id in self.version_ids()]
+
+    def stack_versions(self, name):
+        # Only the versions where this stack's content actually changed
+        result = []
+        previous = None
+
+        for manifest in self.versions():
+            digest = manifest["stacks"].get(name)
+
+            if digest != previous and digest is not None:
+                result.append(manifest)
+            previous = digest
+
+        return result
+
+    def diff(self, old, new):
+        old_stacks = old["stacks"] if old else {}
+        new_stacks = new["stacks"]
+
+        # Only stacks in both versions can have moved, added and removed ones are listed on their own
+        old_parents = parents(old["hierarchy"]) if old else {}
+        new_parents = parents(new["hierarchy"])
+
+        return {
+            "added": sorted(new_stacks.keys() - old_stacks.keys()),
+            "removed": sorted(old_stacks.keys() - new_stacks.keys()),
+            "changed": sorted(name for name in new_stacks.keys() & old_stacks.keys() if new_stacks[name] != old_stacks[name]),
+            "moved": any(
+                name in old_parents and old_parents[name] != parent
+                for name, parent in new_parents.items()
+            )
+        }
+
+    def read_stack(self, version_id, name):
+        return self.read_blob(self.manifest(version_id)["stacks"][name])
+
+    def stack_path(self, version_id, name):
+        for path in self.manifest(version_id)["hierarchy"]:
+            if path.split("/")[-1] == name:
+                return path
+
+        return name
+
+    def checkout(self, version_id):
+        manifest = self.manifest(version_id)
+
+        return {
+            "hierarchy": list(manifest["hierarchy"]),
+            "data": {name: self.read_blob(digest) for name, digest in manifest["stacks"].items()}
+        }
@@ -0,0 +1,264 @@
+import os
+import json
+import mmap
+import codecs
+import threading
+
+from core import trace
+from core.hierarchy import HierarchyIndex
+
+COMPACT_THRESHOLD = 4 * 1024 * 1024
+
+def default_scheme():
+    return {
+        "hierarchy": [],
+        "data": {}
+    }
+
+def patch_content(content, record):
+    if "splices" in record:
+        text = content or ""
+        for position, removed, inserted in record["splices"]:
+            text = text[:position] + inserted + text[position + removed:]
+
+        return text
+
+    if "rows" in record:
+        tasks = content or []
+        if "length" in record:
+            del tasks[record["length"]:]
+
+        # Rows past the end are new tasks, which arrive in order
+        for position, task in record["rows"]:
+            if position < len(tasks):
+                tasks[position] = task
+            else:
+                tasks.append(task)
+
+        return tasks
+
+    content = content or {}
+
+    for field, ids in record.get("remove", {}).items():
+        removed = set(ids)
+        content[field] = [entry for entry in content.get(field, []) if entry.get("id") not in removed]
+
+    for field, entries in record.get("upsert", {}).items():
+        items = content.setdefault(field, [])
+        positions = {entry.get("id"): position for position, entry in enumerate(items)}
+
+        for entry in entries:
+            position = positions.get(entry["id"])
+
+            if position is None:
+                positions[entry["id"]] = len(items)
+                items.append(entry)
+            else:
+                items[position] = entry
+
+    for key, value in record.get("set", {}).items():
+        content[key] = value
+
+    return content
+
+def apply_record(data, record):
+    op = record["op"]
+    stacks = data["data"]
+    hierarchy = data["hierarchy"]
+
+    if op == "put":
+        stacks[record["name"]] = record["entry"]
+
+    elif op == "content":
+        stacks.setdefault(record["name"], {})["content"] = record["content"]
+
+    elif op == "patch":
+        entry = stacks.setdefault(record["name"], {})
+        entry["content"] = patch_content(entry.get("content"), record)
+
+    elif op == "drop":
+        stacks.pop(record["name"], None)
+
+    elif op == "rename":
+        if record["old"] in stacks:
+            stacks[record["new"]] = stacks.pop(record["old"])
+
+    elif op == "path_add":
+        hierarchy.add(record["path"])
+
+    elif op == "path_remove":
+        hierarchy.remove(record["path"])
+
+    elif op == "path_move":
+        hierarchy.move(record["old"], record["new"])
+
+class RecordWriter:
+    def append(self, *records):
+        raise NotImplementedError
+
+    def put(self, name, entry):
+        self.append({"op": "put", "name": name, "entry": entry})
+
+    def set_content(self, name, content):
+        self.append({"op": "content", "name": name, "content": content})
+
+    def drop(self, name):
+        self.append({"op": "drop", "name": name})
+
+    def rename(self, old_name, new_name):
+        self.append({"op": "rename", "old": old_name, "new": new_name})
+
+    def add_path(self, path):
+        self.append({"op": "path_add", "path": path})
+
+    def remove_path(self, path):
+        self.append({"op": "path_remove", "path": path})
+
+    def move_path(self, old_path, new_path):
+        self.append({"op": "path_move", "old": old_path, "new": new_path})
+
+class Journal(RecordWriter):
+    def __init__(self, path="temp.json", compact_threshold=COMPACT_THRESHOLD):
+        self.path = path
+        self.journal_path = f"{path}.journal"
+        self.folding_path = f"{path}.journal.old"
+        self.compact_threshold = compact_threshold
+
+        self.file = None
+        self.compactor = None
+
+        self.lock = threading.Lock()
+        self.compact_lock = threading.Lock()
+
+    @trace.traced("journal.load", "load")
+    def load(self):
+        if not os.path.exists(self.path):
+            self.write_snapshot(default_scheme())
+
+        data = self.read_snapshot()
+
+        for path in (self.folding_path, self.journal_path):
+            if os.path.exists(path):
+                self.replay(data, path)
+
+        return data
+
+    def read_snapshot(self):
+        with open(self.path, "rb") as file:
+            if os.fstat(file.fileno()).st_size == 0:
+                raise ValueError(f"{self.path} is empty")
+
+            # Decoded straight from the mapped pages, without reading the file into a buffer first
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as view:
+                text, _ = codecs.utf_8_decode(view, "strict", True)
+
+        data = json.loads(text)
+
+        data["hierarchy"] = HierarchyIndex(data["hierarchy"])
+        return data
+
+    def replay(self, data, path):
+        with open(path, "r", encoding="utf-8") as file:
+            for line in file:
+                line = line.strip()
+                if not line:
+                    continue
+
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # A torn final line from a crash mid-append, nothing after it was written
+                    break
+
+                apply_record(data, record)
+
+    @trace.traced("journal.append", "save")
+    def append(self, *records):
+        lines = "".join(json.dumps(record, separators=(",", ":")) + "\n" for record in records)
+
+        with self.lock:
+            if self.file is None:
+                self.file = open(self.journal_path, "a", encoding="utf-8")
+
+            self.file.write(lines)
+            self.file.flush()
+            os.fsync(self.file.fileno())
+            size = self.file.tell()
+
+        if size >= self.compact_threshold:
+            self.compact_in_background()
+
+    def rotate(self):
+        if os.path.exists(self.folding_path):
+            return
+
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+        if os.path.exists(self.journal_path):
+            os.replace(self.journal_path, self.folding_path)
+
+    def compact_in_background(self):
+        if self.compactor and self.compactor.is_alive():
+            return
+
+        self.compactor = threading.Thread(target=self.compact, daemon=True)
+        self.compactor.start()
+
+    @trace.traced("journal.compact", "save")
+    def compact(self):
+        with self.compact_lock:
+            # A second pass picks up the live journal when a leftover from a crash was folded first
+            for _ in range(2):
+                with self.lock:
+                    self.rotate()
+
+                if not os.path.exists(self.folding_path):
+                    return
+
+                data = self.read_snapshot()
+                self.replay(data, self.folding_path)
+
+                data["hierarchy"] = data["hierarchy"].paths()
+                self.write_snapshot(data)
+
+                os.remove(self.folding_path)
+
+    @trace.traced("journal.write_snapshot", "save")
+    def write_snapshot(self, data, path=None):
+        path = path or self.path
+        temp_path = f"{path}.tmp"
+
+        with open(temp_path, "w", encoding="utf-8") as file:
+            json.dump(data, file, indent=4)
+            file.flush()
+            os.fsync(file.fileno())
+
+        os.replace(temp_path, path)
+
+    def read_all(self):
+        # Held so a background compaction cannot fold the journal between reading the snapshot and replaying it
+        with self.compact_lock:
+            data = self.load()
+
+        data["hierarchy"] = data["hierarchy"].paths()
+        return data
+
+    def export(self, file_path):
+        # One read of this project and one write of the new file, this project's own files are left as they are
+        self.write_snapshot(self.read_all(), file_path)
+
+    def drop_journal(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+        for path in (self.journal_path, self.folding_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def replace_data(self, data):
+        with self.compact_lock, self.lock:
+            self.drop_journal()
+            self.write_snapshot(data)
@@ -0,0 +1,143 @@
+import numpy as np
+
+FORCE_ITERATIONS = 60
+BLOCK_SIZE = 512
+
+# Above this many nodes, repulsion is estimated from a random sample each iteration
+REPULSION_SAMPLES = 1024
+
+def edge_arrays(count, edges):
+    edges = np.asarray(edges, dtype=np.int64).reshape(-1, 2)
+
+    # Self loops and dangling wires carry no layout information
+    keep = (edges[:, 0] != edges[:, 1]) & (edges >= 0).all(axis=1) & (edges < count).all(axis=1)
+    edges = edges[keep]
+
+    return edges[:, 0], edges[:, 1]
+
+def assign_layers(count, sources, targets):
+    layers = np.zeros(count, dtype=np.int64)
+    in_degree = np.bincount(targets, minlength=count)
+
+    placed = np.zeros(count, dtype=bool)
+    active = np.ones(len(sources), dtype=bool)
+
+    layer = 0
+    while not placed.all():
+        frontier = ~placed & (in_degree == 0)
+
+        if not frontier.any():
+            # A cycle, break it at the remaining node with the fewest incoming wires
+            remaining = np.flatnonzero(~placed)
+            frontier = np.zeros(count, dtype=bool)
+            frontier[remaining[np.argmin(in_degree[remaining])]] = True
+
+        layers[frontier] = layer
+        placed |= frontier
+
+        leaving = active & frontier[sources]
+        in_degree -= np.bincount(targets[leaving], minlength=count)
+        active &= ~leaving
+
+        layer += 1
+
+    return layers
+
+def layered(count, edges, spacing_x, spacing_y, sweeps=2):
+    if count == 0:
+        return np.zeros((0, 2))
+
+    sources, targets = edge_arrays(count, edges)
+    layers = assign_layers(count, sources, targets)
+
+    rank = np.zeros(count)
+    order = np.lexsort((np.arange(count), layers))
+    rank[order] = np.arange(count) - np.searchsorted(layers[order], layers[order])
+
+    # Barycenter sweeps pull each node towards the average rank of the nodes wired into it
+    for _ in range(sweeps):
+        totals = np.bincount(targets, weights=rank[sources], minlength=count)
+        counts = np.bincount(targets, minlength=count)
+
+        barycenter = np.where(counts > 0, totals / np.maximum(counts, 1), rank)
+        order = np.lexsort((barycenter, layers))
+        rank[order] = np.arange(count) - np.searchsorted(layers[order], layers[order])
+
+    # Centre every layer on the same horizontal line
+    sizes = np.bincount(layers)
+    offsets = (sizes.max() - sizes[layers]) / 2
+
+    return np.column_stack((layers * spacing_x, (rank + offsets) * spacing_y))
+
+def force_directed(positions, edges, spacing, iterations=FORCE_ITERATIONS, seed=0):
+    positions = np.array(positions, dtype=np.float32).reshape(-1, 2)
+    count = len(positions)
+
+    if count < 2:
+        return positions.astype(np.float64)
+
+    sources, targets = edge_arrays(count, edges)
+
+    # Nodes stacked on the same spot would never separate, so they start slightly apart
+    rng = np.random.default_rng(seed)
+    positions += rng.uniform(-spacing, spacing, positions.shape).astype(np.float32) * 0.1
+
+    k = np.float32(spacing)
+    k2 = k * k
+    temperature = spacing * np.sqrt(count) / 2
+
+    for step in range(iterations):
+        displacement = np.zeros_like(positions)
+        x = positions[:, 0]
+        y = positions[:, 1]
+
+        if count > REPULSION_SAMPLES:
+            sample = rng.choice(count, REPULSION_SAMPLES, replace=False)
+            other_x = x[sample]
+            other_y = y[sample]
+            scale = k2 * np.float32(count / REPULSION_SAMPLES)
+        else:
+            other_x = x
+            other_y = y
+            scale = k2
+
+        # Repulsion in blocks of rows keeps the working set at BLOCK_SIZE x others
+        for start in range(0, count, BLOCK_SIZE):
+            stop = min(start + BLOCK_SIZE, count)
+
+            dx = x[start:stop, None] - other_x[None, :]
+            dy = y[start:stop, None] - other_y[None, :]
+            strength = scale / np.maximum(dx * dx + dy * dy, np.float32(1e-2))
+
+            displacement[start:stop, 0] = (dx * strength).sum(axis=1)
+            displacement[start:stop, 1] = (dy * strength).sum(axis=1)
+
+        delta = positions[sources] - positions[targets]
+        distance = np.sqrt((delta * delta).sum(axis=1, keepdims=True))
+        pull = delta * distance / k
+
+        np.subtract.at(displacement, sources, pull)
+        np.add.at(displacement, targets, pull)
+
+        length = np.sqrt((displacement * displacement).sum(axis=1, keepdims=True))
+        limit = temperature * (1 - step / iterations)
+
+        positions += displacement / np.maximum(length, np.float32(1e-6)) * np.minimum(length, limit)
+
+    return positions.astype(np.float64)
+
+def arrange(mode, positions, edges, spacing_x, spacing_y):
+    positions = np.asarray(positions, dtype=np.float64).reshape(-1, 2)
+
+    if mode == "layered":
+        result = layered(len(positions), edges, spacing_x, spacing_y)
+    elif mode == "force":
+        result = force_directed(positions, edges, spacing_x)
+    else:
+        raise ValueError(f"Unknown layout mode '{mode}'")
+
+    # Keep the graph where it was rather than jumping to the origin
+    if len(result):
+        result += positions.mean(axis=0) - result.mean(axis=0)
+
+    return result
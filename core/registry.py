@@ -0,0 +1,159 @@
+import os
+import ast
+import sys
+import json
+import importlib
+import importlib.util
+
+from importlib import metadata
+
+STACKS_PACKAGE = "stacks"
+STACKS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), STACKS_PACKAGE)
+
+ENTRY_POINT_GROUP = "ideastack.stacks"
+
+def cache_dir():
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "ideastack")
+
+def read_metadata(path):
+    with open(path, "r", encoding="utf-8") as file:
+        tree = ast.parse(file.read(), filename=path)
+
+    version = "0"
+    has_stack = False
+
+    for statement in tree.body:
+        if isinstance(statement, ast.Assign):
+            for target in statement.targets:
+                if isinstance(target, ast.Name) and target.id == "VERSION":
+                    version = str(ast.literal_eval(statement.value))
+
+        elif isinstance(statement, ast.ClassDef) and statement.name == "Stack":
+            has_stack = True
+
+    if not has_stack:
+        return None
+
+    return {"version": version}
+
+class StackPlugin:
+    def __init__(self, name, module, version="0", source="builtin"):
+        self.name = name
+        self.module = module
+        self.version = version
+        self.source = source
+
+        self.stack_class = None
+
+    def load(self):
+        if self.stack_class is None:
+            module = importlib.import_module(self.module)
+            self.stack_class = getattr(module, "Stack")
+
+        return self.stack_class
+
+class StackRegistry:
+    def __init__(self, stacks_dir=STACKS_DIR, manifest_path=None):
+        self.stacks_dir = stacks_dir
+        self.manifest_path = manifest_path or os.path.join(cache_dir(), "stacks.json")
+
+        self.plugins = {}
+
+    def discover(self):
+        manifest = self.read_manifest()
+        fresh = {}
+
+        for file in sorted(os.listdir(self.stacks_dir)):
+            if not file.endswith(".py") or file.startswith("_"):
+                continue
+
+            path = os.path.join(self.stacks_dir, file)
+            mtime = os.stat(path).st_mtime_ns
+
+            cached = manifest.get(path)
+            if cached and cached["mtime"] == mtime:
+                meta = cached["meta"]
+            else:
+                try:
+                    meta = read_metadata(path)
+                except SyntaxError as e:
+                    # Left out of the manifest, so the warning repeats until the module is fixed
+                    print(f"Skipping stack module {file}: {e}", file=sys.stderr)
+                    continue
+
+            fresh[path] = {"mtime": mtime, "meta": meta}
+
+            if meta is not None:
+                name = file[:-3]
+                self.plugins[name] = StackPlugin(name, f"{STACKS_PACKAGE}.{name}", version=meta["version"])
+
+        self.discover_entry_points(manifest, fresh)
+
+        if fresh != manifest:
+            self.write_manifest(fresh)
+
+    def discover_entry_points(self, manifest, fresh):
+        for entry_point in metadata.entry_points(group=ENTRY_POINT_GROUP):
+            if entry_point.name in self.plugins:
+                continue
+
+            module = entry_point.value.split(":")[0]
+            version = entry_point.dist.version if entry_point.dist else "0"
+
+            key = f"{entry_point.name}={module}@{version}"
+            cached = manifest.get(key)
+
+            if cached:
+                meta = cached["meta"]
+            else:
+                spec = importlib.util.find_spec(module)
+
+                try:
+                    meta = read_metadata(spec.origin) if spec and spec.origin else None
+                except SyntaxError as e:
+                    print(f"Skipping stack plugin {entry_point.name}: {e}", file=sys.stderr)
+                    continue
+
+            fresh[key] = {"mtime": None, "meta": meta}
+
+            if meta is not None:
+                self.plugins[entry_point.name] = StackPlugin(
+                    entry_point.name,
+                    module,
+                    version=version,
+                    source=entry_point.dist.name if entry_point.dist else "entry point"
+                )
+
+    def read_manifest(self):
+        try:
+            with open(self.manifest_path, "r", encoding="utf-8") as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return {}
+
+    def write_manifest(self, manifest):
+        try:
+            os.makedirs(os.path.dirname(self.manifest_path), exist_ok=True)
+
+            temp_path = f"{self.manifest_path}.tmp"
+            with open(temp_path, "w", encoding="utf-8") as file:
+                json.dump(manifest, file, indent=4)
+
+            os.replace(temp_path, self.manifest_path)
+        except OSError:
+            # The manifest is only a cache, a read-only home directory just means rescanning next time
+            pass
+
+    def names(self):
+        return sorted(self.plugins)
+
+    def get(self, name):
+        plugin = self.plugins.get(name)
+        if plugin is None:
+            raise LookupError(f"Unknown stack type '{name}'")
+
+        return plugin
+
+    def stack_class(self, name):
+        return self.get(name).load()
@@ -0,0 +1,159 @@
+import time
+import queue
+import threading
+
+from PyQt5.QtCore import QObject, QTimer, pyqtSignal
+
+from core import trace
+from core.journal import RecordWriter
+from core.store import export_project
+
+DEBOUNCE_MS = 500
+
+class SaveScheduler(QObject, RecordWriter):
+    saved = pyqtSignal(float, int)
+    exported = pyqtSignal(str)
+    export_failed = pyqtSignal(str, str)
+    versioned = pyqtSignal(object)
+    failed = pyqtSignal(str)
+
+    def __init__(self, backend, debounce=DEBOUNCE_MS):
+        super().__init__()
+
+        self.backend = backend
+
+        self.pending = []
+        self.content_slots = {}
+
+        # Called with every flushed batch, after it has been queued for the backend
+        self.listeners = []
+
+        self.last_latency = 0.0
+        self.tasks = queue.Queue()
+
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setInterval(debounce)
+        self.timer.timeout.connect(self.flush)
+
+        self.worker = threading.Thread(target=self.run, daemon=True)
+        self.worker.start()
+
+    @property
+    def queue_depth(self):
+        return self.tasks.qsize()
+
+    def append(self, *records):
+        for record in records:
+            if record["op"] == "content":
+                self.submit_content(record["name"], record)
+            else:
+                # Structural records pin the order of everything queued before them
+                self.content_slots.clear()
+                self.pending.append(record)
+
+        self.timer.start()
+
+    def defer_content(self, name, producer):
+        self.submit_content(name, producer)
+        self.timer.start()
+
+    def submit_content(self, name, entry):
+        slot = self.content_slots.get(name)
+
+        # A deferred producer may only yield a patch on top of a queued full record, so it goes after it
+        if slot is None or (callable(entry) and not callable(self.pending[slot])):
+            self.content_slots[name] = len(self.pending)
+            self.pending.append(entry)
+        else:
+            self.pending[slot] = entry
+
+    @trace.traced("saver.flush", "save")
+    def flush(self):
+        self.timer.stop()
+
+        batch = []
+        for entry in self.pending:
+            if callable(entry):
+                try:
+                    entry = entry()
+                except RuntimeError:
+                    # The stack widget was deleted before the debounce window closed
+                    continue
+
+            if entry is not None:
+                batch.append(entry)
+
+        self.pending = []
+        self.content_slots = {}
+
+        if batch:
+            self.tasks.put(lambda: self.write(batch))
+
+            for listener in self.listeners:
+                listener(batch)
+
+    def write(self, batch):
+        started = time.perf_counter()
+        self.backend.append(*batch)
+
+        # Reported only once the batch is written, a failed write goes out through failed instead
+        self.last_latency = (time.perf_counter() - started) * 1000
+        self.saved.emit(self.last_latency, self.queue_depth)
+
+    def discard(self):
+        self.timer.stop()
+
+        self.pending = []
+        self.content_slots = {}
+
+    def compact(self):
+        self.flush()
+
+        # Folds the journal into the project file itself, so the file on disk is the saved project
+        backend = self.backend
+        if hasattr(backend, "compact"):
+            self.tasks.put(backend.compact)
+
+    def export(self, file_path, reopen=None):
+        self.flush()
+
+        def task():
+            try:
+                export_project(self.backend, file_path)
+
+                # Switched on the worker, so every write queued after this one lands in the new file
+                if reopen is not None:
+                    self.backend = reopen()
+            except Exception as e:
+                self.export_failed.emit(file_path, str(e))
+                return
+
+            self.exported.emit(file_path)
+
+        self.tasks.put(task)
+
+    def save_version(self, history, entries, hierarchy, label):
+        self.flush()
+
+        # Queued behind the flushed batch, so the version includes every edit made before it
+        def task():
+            self.versioned.emit(history.commit(entries(), hierarchy, label))
+
+        self.tasks.put(task)
+
+    def wait(self):
+        self.tasks.join()
+
+    def run(self):
+        while True:
+            task = self.tasks.get()
+
+            # Any error is reported and the worker keeps going, a dead worker would hang every wait()
+            try:
+                with trace.span("saver.write", "save"):
+                    task()
+            except Exception as e:
+                self.failed.emit(str(e))
+            finally:
+                self.tasks.task_done()
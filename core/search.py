@@ -0,0 +1,318 @@
+import re
+import heapq
+import queue
+import bisect
+import threading
+
+from core import trace
+
+TOKEN_PATTERN = re.compile(r"\w+")
+
+LABEL_LENGTH = 80
+RESULT_LIMIT = 200
+PREFIX_LIMIT = 64
+
+# New words are kept apart from the sorted vocabulary until there are enough to be worth a re-sort
+MERGE_THRESHOLD = 1024
+
+def tokenize(text):
+    return TOKEN_PATTERN.findall(text.lower())
+
+def content_documents(content):
+    if isinstance(content, str):
+        yield "text", content
+
+    elif isinstance(content, list):
+        for position, task in enumerate(content):
+            if isinstance(task, dict):
+                yield ("task", position), task.get("text", "")
+
+    elif isinstance(content, dict):
+        for node in content.get("nodes", []):
+            yield ("node", node.get("id")), node.get("content", "")
+
+def prepare_document(text):
+    return set(tokenize(text)), make_label(text)
+
+def prepare_content(content):
+    # Tokenized on the worker before the lock is taken, searches only wait for the swap into the index
+    return [(ref, *prepare_document(text)) for ref, text in content_documents(content)]
+
+def prepare_record(record):
+    op = record["op"]
+
+    if op == "put":
+        return prepare_content(record["entry"].get("content"))
+
+    if op == "content":
+        return prepare_content(record["content"])
+
+    if op == "patch":
+        typed = set()
+        for _, _, inserted in record.get("splices", ()):
+            typed.update(tokenize(inserted))
+
+        documents = [
+            (("node", node["id"]), *prepare_document(node.get("content", "")))
+            for node in record.get("upsert", {}).get("nodes", [])
+        ]
+        documents.extend(
+            (("task", position), *prepare_document(task.get("text", "")))
+            for position, task in record.get("rows", ())
+        )
+        return typed, documents
+
+    return None
+
+def make_label(text):
+    text = " ".join(text[:LABEL_LENGTH * 2].split())
+
+    if len(text) > LABEL_LENGTH:
+        return text[:LABEL_LENGTH - 1] + "…"
+
+    return text
+
+class SearchIndex:
+    def __init__(self):
+        self.lock = threading.Lock()
+
+        self.postings = {}
+        self.documents = {}
+        self.stack_documents = {}
+        self.labels = {}
+
+        self.sorted_tokens = []
+        self.new_tokens = set()
+
+        self.generation = 0
+        self.building = False
+
+        self.tasks = queue.Queue()
+        self.worker = threading.Thread(target=self.run, daemon=True)
+        self.worker.start()
+
+    def run(self):
+        while True:
+            task = self.tasks.get()
+
+            try:
+                task()
+            finally:
+                self.tasks.task_done()
+
+    def wait(self):
+        self.tasks.join()
+
+    def rebuild(self, entries):
+        # entries is called on the worker thread, so a store can read its rows there
+        self.generation += 1
+        generation = self.generation
+        self.building = True
+
+        @trace.traced("search.rebuild", "search")
+        def task():
+            with self.lock:
+                self.clear()
+
+            for name, entry in entries():
+                if generation != self.generation:
+                    return
+
+                documents = prepare_content((entry or {}).get("content"))
+
+                with self.lock:
+                    self.index_stack(name, documents)
+
+            self.building = False
+            self.merge_tokens()
+
+        self.tasks.put(task)
+
+    def apply(self, records):
+        @trace.traced("search.apply", "search")
+        def task():
+            prepared = [prepare_record(record) for record in records]
+
+            with self.lock:
+                for record, documents in zip(records, prepared):
+                    self.apply_record(record, documents)
+
+            if len(self.new_tokens) > MERGE_THRESHOLD:
+                self.merge_tokens()
+
+        self.tasks.put(task)
+
+    def apply_record(self, record, prepared):
+        op = record["op"]
+
+        if op == "put":
+            self.remove_stack(record["name"])
+            self.index_stack(record["name"], prepared)
+
+        elif op == "content":
+            self.index_content(record["name"], prepared)
+
+        elif op == "patch":
+            name = record["name"]
+            typed, documents = prepared
+
+            # Only what was typed is added, words that were deleted stay findable until the note is next saved whole
+            if typed:
+                self.extend_document((name, "text"), typed)
+
+            for node_id in record.get("remove", {}).get("nodes", []):
+                self.remove_document((name, ("node", node_id)))
+
+            if "length" in record:
+                length = record["length"]
+                for doc in [doc for doc in self.stack_documents.get(name, ()) if doc[1][0] == "task" and doc[1][1] >= length]:
+                    self.remove_document(doc)
+
+            for ref, tokens, label in documents:
+                self.replace_document((name, ref), tokens, label)
+
+        elif op == "drop":
+            self.remove_stack(record["name"])
+
+        elif op == "rename":
+            self.rename_stack(record["old"], record["new"])
+
+    def clear(self):
+        self.postings = {}
+        self.documents = {}
+        self.stack_documents = {}
+        self.labels = {}
+
+        self.sorted_tokens = []
+        self.new_tokens = set()
+
+    def index_stack(self, name, documents):
+        self.index_document((name, "name"), name)
+        self.index_content(name, documents)
+
+    def index_content(self, name, documents):
+        stale = {doc for doc in self.stack_documents.get(name, ()) if doc[1] != "name"}
+
+        for ref, tokens, label in documents:
+            doc = (name, ref)
+            stale.discard(doc)
+            self.replace_document(doc, tokens, label)
+
+        for doc in stale:
+            self.remove_document(doc)
+
+    def index_document(self, doc, text):
+        self.replace_document(doc, *prepare_document(text))
+
+    def extend_document(self, doc, tokens):
+        self.replace_document(doc, self.documents.get(doc, set()) | tokens, self.labels.get(doc, ""))
+
+    def replace_document(self, doc, tokens, label):
+        old_tokens = self.documents.get(doc, set())
+
+        for token in old_tokens - tokens:
+            self.unlink(token, doc)
+
+        for token in tokens - old_tokens:
+            postings = self.postings.get(token)
+            if postings is None:
+                postings = self.postings[token] = set()
+                self.new_tokens.add(token)
+
+            postings.add(doc)
+
+        self.documents[doc] = tokens
+        self.labels[doc] = label
+        self.stack_documents.setdefault(doc[0], set()).add(doc)
+
+    def unlink(self, token, doc):
+        postings = self.postings.get(token)
+        if postings is None:
+            return
+
+        postings.discard(doc)
+        if not postings:
+            del self.postings[token]
+            self.new_tokens.discard(token)
+
+    def remove_document(self, doc):
+        for token in self.documents.pop(doc, ()):
+            self.unlink(token, doc)
+
+        self.labels.pop(doc, None)
+
+        documents = self.stack_documents.get(doc[0])
+        if documents is not None:
+            documents.discard(doc)
+            if not documents:
+                del self.stack_documents[doc[0]]
+
+    def remove_stack(self, name):
+        for doc in list(self.stack_documents.get(name, ())):
+            self.remove_document(doc)
+
+    def rename_stack(self, old_name, new_name):
+        for doc in list(self.stack_documents.get(old_name, ())):
+            tokens = self.documents[doc]
+            label = self.labels.get(doc, "")
+
+            self.remove_document(doc)
+
+            new_doc = (new_name, doc[1])
+            if doc[1] == "name":
+                self.index_document(new_doc, new_name)
+            else:
+                self.replace_document(new_doc, tokens, label)
+
+    def merge_tokens(self):
+        # Sorted outside the lock, only this worker changes the vocabulary so nothing is missed in between
+        with self.lock:
+            tokens = list(self.postings)
+            merged = set(self.new_tokens)
+
+        tokens.sort()
+
+        with self.lock:
+            self.sorted_tokens = tokens
+            self.new_tokens -= merged
+
+    def prefix_tokens(self, prefix):
+        tokens = []
+        start = bisect.bisect_left(self.sorted_tokens, prefix)
+
+        for token in self.sorted_tokens[start:start + PREFIX_LIMIT]:
+            if not token.startswith(prefix):
+                break
+            if token in self.postings:
+                tokens.append(token)
+
+        tokens.extend(token for token in self.new_tokens if token.startswith(prefix))
+        return tokens
+
+    def search(self, query, limit=RESULT_LIMIT):
+        terms = tokenize(query)
+        if not terms:
+            return []
+
+        with self.lock:
+            sets = []
+
+            for term in terms[:-1]:
+                postings = self.postings.get(term)
+                if not postings:
+                    return []
+                sets.append(postings)
+
+            # The last word is still being typed, so it matches as a prefix
+            prefix_sets = [self.postings[token] for token in self.prefix_tokens(terms[-1])]
+            if not prefix_sets:
+                return []
+
+            last = prefix_sets[0] if len(prefix_sets) == 1 else set().union(*prefix_sets)
+            sets.append(last)
+            sets.sort(key=len)
+
+            matches = sets[0].intersection(*sets[1:]) if len(sets) > 1 else sets[0]
+            docs = heapq.nsmallest(limit, matches, key=lambda doc: (doc[0].lower(), str(doc[1])))
+
+            return [(doc[0], doc[1], self.labels.get(doc, "")) for doc in docs]
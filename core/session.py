@@ -0,0 +1,164 @@
+import os
+import time
+import shutil
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+    import msvcrt
+
+from core.journal import Journal
+from core.history import history_path
+from core.registry import cache_dir
+from core.store import SqliteStore, SQLITE_SUFFIX
+
+LOCK_SUFFIX = ".lock"
+UNTITLED_PREFIX = "untitled-"
+
+# Where the project lived before sessions, picked up once so an upgrade keeps the last unsaved work
+LEGACY_PATH = "temp.json"
+
+class ProjectLocked(OSError):
+    pass
+
+def untitled_dir():
+    return os.path.join(cache_dir(), "untitled")
+
+def sidecar_paths(path):
+    return [f"{path}.journal", f"{path}.journal.old", f"{path}.tmp", f"{path}-wal", f"{path}-shm"]
+
+def new_untitled_path():
+    return os.path.join(untitled_dir(), f"{UNTITLED_PREFIX}{os.getpid()}-{int(time.time() * 1000)}.json")
+
+def adopt_legacy():
+    if not os.path.exists(LEGACY_PATH):
+        return
+
+    path = new_untitled_path()
+    for source, target in zip([LEGACY_PATH] + sidecar_paths(LEGACY_PATH), [path] + sidecar_paths(path)):
+        if os.path.exists(source):
+            shutil.move(source, target)
+
+class ProjectLock:
+    def __init__(self, path):
+        self.path = f"{path}{LOCK_SUFFIX}"
+        self.file = None
+
+    def try_lock(self, file):
+        try:
+            if fcntl:
+                fcntl.flock(file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                msvcrt.locking(file.fileno(), msvcrt.LK_NBLCK, 1)
+        except OSError:
+            return False
+
+        return True
+
+    def acquire(self):
+        while True:
+            file = open(self.path, "a+")
+
+            if not self.try_lock(file):
+                file.close()
+                raise ProjectLocked(f"{self.path[:-len(LOCK_SUFFIX)]} is open in another IdeaStack window")
+
+            # The holder before us may have removed the file after we opened it, so the lock must be on the live one
+            try:
+                current = os.stat(self.path)
+            except FileNotFoundError:
+                file.close()
+                continue
+
+            if current.st_ino != os.fstat(file.fileno()).st_ino:
+                file.close()
+                continue
+
+            file.seek(0)
+            file.truncate()
+            file.write(str(os.getpid()))
+            file.flush()
+
+            self.file = file
+            return
+
+    def release(self):
+        if self.file is None:
+            return
+
+        # Removed while still held, so nobody can lock the old file after it is gone
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+        self.file.close()
+        self.file = None
+
+class ProjectSession:
+    def __init__(self, path, untitled=False):
+        self.path = os.path.abspath(path)
+        self.untitled = untitled
+
+        self.lock = ProjectLock(self.path)
+        self.lock.acquire()
+
+    @classmethod
+    def resume_untitled(cls):
+        # The newest untitled project nobody else has open, like temp.json used to be, or a fresh one
+        directory = untitled_dir()
+        os.makedirs(directory, exist_ok=True)
+        adopt_legacy()
+
+        candidates = [
+            os.path.join(directory, name) for name in os.listdir(directory)
+            if name.startswith(UNTITLED_PREFIX) and name.endswith(".json")
+        ]
+        candidates.sort(key=os.path.getmtime, reverse=True)
+
+        for path in candidates:
+            try:
+                return cls(path, untitled=True)
+            except ProjectLocked:
+                continue
+
+        return cls(new_untitled_path(), untitled=True)
+
+    @property
+    def title(self):
+        return "Untitled" if self.untitled else os.path.basename(self.path)
+
+    def open_backend(self):
+        if self.path.endswith(SQLITE_SUFFIX):
+            return SqliteStore(self.path)
+
+        return Journal(self.path)
+
+    def clear_sidecars(self):
+        # Left over from whatever was saved here before, they must not be replayed over the new file
+        for path in sidecar_paths(self.path):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def close(self):
+        self.lock.release()
+
+    def discard(self, moved_to=None):
+        # An untitled project that was saved elsewhere has nothing left worth keeping, except its versions
+        if self.untitled:
+            self.clear_sidecars()
+            if os.path.exists(self.path):
+                os.remove(self.path)
+
+            history = history_path(self.path)
+            if os.path.isdir(history):
+                target = history_path(moved_to) if moved_to else None
+
+                if target and not os.path.exists(target):
+                    shutil.move(history, target)
+                else:
+                    shutil.rmtree(history, ignore_errors=True)
+
+        # Released last, so no other window can resume this project while its files are being removed
+        self.close()
@@ -0,0 +1,289 @@
+import bisect
+
+from PyQt5.QtCore import Qt, QAbstractItemModel, QModelIndex, QMimeData, pyqtSignal
+
+from core import trace
+from core.store import stack_type
+
+FETCH_BATCH = 256
+PATH_MIME_TYPE = "application/x-ideastack-path"
+
+class SidebarModel(QAbstractItemModel):
+    move_requested = pyqtSignal(str, str)
+
+    def __init__(self, hierarchy, stacks):
+        super().__init__()
+
+        self.hierarchy = hierarchy
+        self.stacks = stacks
+
+        # Only folders that have been expanded get a sorted row list
+        self.rows = {}
+        self.positions = {}
+        self.fetched = {}
+
+    @trace.traced("sidebar.reset", "sidebar")
+    def reset(self, hierarchy, stacks):
+        self.beginResetModel()
+
+        self.hierarchy = hierarchy
+        self.stacks = stacks
+
+        self.rows = {}
+        self.positions = {}
+        self.fetched = {}
+
+        self.endResetModel()
+
+    def child_rows(self, node):
+        rows = self.rows.get(node)
+
+        if rows is None:
+            rows = sorted(node.children.values(), key=lambda child: child.name)
+            self.rows[node] = rows
+            self.reindex(node)
+
+        return rows
+
+    def reindex(self, node, start=0):
+        rows = self.rows[node]
+
+        for row in range(start, len(rows)):
+            self.positions[rows[row]] = row
+
+    def is_folder(self, node):
+        return stack_type(self.stacks, node.name) == "folder"
+
+    def node_for(self, index):
+        if index.isValid():
+            return index.internalPointer()
+
+        return self.hierarchy.root
+
+    def index_for(self, node):
+        if node is self.hierarchy.root or node.parent is None:
+            return QModelIndex()
+
+        row = self.positions.get(node)
+        if row is None or row >= self.fetched.get(node.parent, 0):
+            return QModelIndex()
+
+        return self.createIndex(row, 0, node)
+
+    def is_visible(self, node):
+        while node is not self.hierarchy.root:
+            if not self.index_for(node).isValid():
+                return False
+            node = node.parent
+
+        return True
+
+    def reveal(self, node):
+        ancestors = []
+        while node is not self.hierarchy.root:
+            ancestors.append(node)
+            node = node.parent
+
+        for node in reversed(ancestors):
+            parent = node.parent
+            parent_index = self.index_for(parent)
+
+            self.child_rows(parent)
+            while self.fetched.get(parent, 0) <= self.positions[node]:
+                self.fetchMore(parent_index)
+
+        return self.index_for(ancestors[0]) if ancestors else QModelIndex()
+
+    def index(self, row, column, parent=QModelIndex()):
+        node = self.node_for(parent)
+
+        if column != 0 or row < 0 or row >= self.fetched.get(node, 0):
+            return QModelIndex()
+
+        return self.createIndex(row, 0, self.child_rows(node)[row])
+
+    def parent(self, index):
+        if not index.isValid():
+            return QModelIndex()
+
+        return self.index_for(index.internalPointer().parent)
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.column() > 0:
+            return 0
+
+        return self.fetched.get(self.node_for(parent), 0)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 1
+
+    def hasChildren(self, parent=QModelIndex()):
+        node = self.node_for(parent)
+
+        if node is self.hierarchy.root:
+            return bool(node.children)
+
+        return bool(node.children) or self.is_folder(node)
+
+    def canFetchMore(self, parent):
+        node = self.node_for(parent)
+        return self.fetched.get(node, 0) < len(node.children)
+
+    @trace.traced("sidebar.fetch", "sidebar")
+    def fetchMore(self, parent):
+        node = self.node_for(parent)
+
+        start = self.fetched.get(node, 0)
+        count = min(FETCH_BATCH, len(self.child_rows(node)) - start)
+        if count <= 0:
+            return
+
+        self.beginInsertRows(parent, start, start + count - 1)
+        self.fetched[node] = start + count
+        self.endInsertRows()
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+
+        if role in (Qt.DisplayRole, Qt.EditRole, Qt.ToolTipRole):
+            return index.internalPointer().name
+
+        return None
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if orientation == Qt.Horizontal and role == Qt.DisplayRole:
+            return "IdeaStacks"
+
+        return None
+
+    def flags(self, index):
+        if not index.isValid():
+            return Qt.ItemIsDropEnabled
+
+        flags = Qt.ItemIsEnabled | Qt.ItemIsSelectable | Qt.ItemIsDragEnabled
+        if self.is_folder(index.internalPointer()):
+            flags |= Qt.ItemIsDropEnabled
+
+        return flags
+
+    def supportedDropActions(self):
+        return Qt.MoveAction
+
+    def mimeTypes(self):
+        return [PATH_MIME_TYPE]
+
+    def mimeData(self, indexes):
+        paths = [index.internalPointer().path for index in indexes if index.isValid()]
+
+        mime = QMimeData()
+        mime.setData(PATH_MIME_TYPE, "\n".join(paths).encode("utf-8"))
+        return mime
+
+    def dropMimeData(self, mime, action, row, column, parent):
+        if action != Qt.MoveAction or not mime.hasFormat(PATH_MIME_TYPE):
+            return False
+
+        parent_path = self.node_for(parent).path
+        for path in bytes(mime.data(PATH_MIME_TYPE)).decode("utf-8").split("\n"):
+            self.move_requested.emit(path, parent_path)
+
+        # The move already happened through move(), so the view must not remove the source rows
+        return False
+
+    def add(self, path):
+        parts = path.split("/")
+        existing = self.hierarchy.root
+
+        for depth, part in enumerate(parts):
+            if part not in existing.children:
+                break
+            existing = existing.children[part]
+        else:
+            return self.hierarchy.add(path)
+
+        node = self.hierarchy.add(path)
+        self.attach(existing.children[parts[depth]])
+
+        return node
+
+    def remove(self, path):
+        node = self.hierarchy.find(path)
+        if node is None:
+            return []
+
+        self.detach(node, node.parent)
+        removed = self.hierarchy.remove(path)
+
+        for child in removed:
+            self.rows.pop(child, None)
+            self.positions.pop(child, None)
+            self.fetched.pop(child, None)
+
+        return removed
+
+    def move(self, old_path, new_path):
+        node = self.hierarchy.find(old_path)
+        if node is None:
+            return self.add(new_path)
+
+        self.hierarchy.check_move(node, new_path)
+
+        self.detach(node, node.parent)
+        self.hierarchy.move(old_path, new_path)
+        self.attach(node)
+
+        return node
+
+    def attach(self, node):
+        parent = node.parent
+        rows = self.rows.get(parent)
+
+        if rows is None:
+            self.positions.pop(node, None)
+
+            parent_index = self.index_for(parent)
+            if parent_index.isValid():
+                self.dataChanged.emit(parent_index, parent_index)
+            return
+
+        row = bisect.bisect_left(rows, node.name, key=lambda child: child.name)
+        fetched = self.fetched.get(parent, 0)
+
+        if row < fetched or fetched == len(rows):
+            visible = self.is_visible(parent)
+            if visible:
+                self.beginInsertRows(self.index_for(parent), row, row)
+
+            rows.insert(row, node)
+            self.fetched[parent] = fetched + 1
+            self.reindex(parent, row)
+
+            if visible:
+                self.endInsertRows()
+        else:
+            rows.insert(row, node)
+            self.reindex(parent, row)
+
+    def detach(self, node, parent):
+        rows = self.rows.get(parent)
+        if rows is None:
+            return
+
+        row = self.positions[node]
+        fetched = self.fetched.get(parent, 0)
+
+        if row < fetched:
+            visible = self.is_visible(parent)
+            if visible:
+                self.beginRemoveRows(self.index_for(parent), row, row)
+
+            rows.pop(row)
+            self.fetched[parent] = fetched - 1
+            self.reindex(parent, row)
+
+            if visible:
+                self.endRemoveRows()
+        else:
+            rows.pop(row)
+            self.reindex(parent, row)
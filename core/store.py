@@ -0,0 +1,337 @@
+import os
+import json
+import sqlite3
+import threading
+
+from collections.abc import MutableMapping
+
+from core import trace
+from core.journal import Journal, RecordWriter, patch_content
+from core.hierarchy import HierarchyIndex
+
+SQLITE_SUFFIX = ".ideastack"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS hierarchy (
+    path TEXT PRIMARY KEY,
+    position INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS hierarchy_position ON hierarchy (position);
+
+CREATE TABLE IF NOT EXISTS stacks (
+    name TEXT PRIMARY KEY,
+    type TEXT,
+    meta TEXT NOT NULL DEFAULT '{}'
+);
+CREATE INDEX IF NOT EXISTS stacks_type ON stacks (type);
+
+CREATE TABLE IF NOT EXISTS contents (
+    name TEXT PRIMARY KEY,
+    content TEXT NOT NULL
+);
+"""
+
+@trace.traced("export_project", "save")
+def export_project(backend, file_path):
+    if isinstance(backend, Journal) and file_path.endswith(SQLITE_SUFFIX):
+        data = backend.read_all()
+
+        temp_path = f"{file_path}.tmp"
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+        store = SqliteStore(temp_path, wal=False)
+        store.import_data(data)
+        store.close()
+
+        os.replace(temp_path, file_path)
+    else:
+        backend.export(file_path)
+
+def join_entry(stack_type, meta, content):
+    entry = {} if stack_type is None else {"type": stack_type}
+    entry.update(json.loads(meta))
+
+    if content is not None:
+        entry["content"] = json.loads(content)
+
+    return entry
+
+def stack_type(stacks, name):
+    # Only the type column is read for stacks that are not loaded yet, their content stays on disk
+    if isinstance(stacks, LazyStacks):
+        return stacks.type_of(name)
+
+    return stacks.get(name, {}).get("type")
+
+def split_entry(entry):
+    meta = {key: value for key, value in entry.items() if key not in ("type", "content")}
+    return entry.get("type"), json.dumps(meta)
+
+class LazyStacks(MutableMapping):
+    def __init__(self, store):
+        self.store = store
+
+        self.loaded = {}
+        self.removed = set()
+
+    def __getitem__(self, name):
+        if name in self.loaded:
+            return self.loaded[name]
+        if name in self.removed:
+            raise KeyError(name)
+
+        entry = self.store.read_entry(name)
+        if entry is None:
+            raise KeyError(name)
+
+        self.loaded[name] = entry
+        return entry
+
+    def type_of(self, name):
+        if name in self.loaded:
+            return self.loaded[name].get("type")
+        if name in self.removed:
+            return None
+
+        return self.store.read_type(name)
+
+    def __setitem__(self, name, entry):
+        self.removed.discard(name)
+        self.loaded[name] = entry
+
+    def __delitem__(self, name):
+        if name not in self:
+            raise KeyError(name)
+
+        self.loaded.pop(name, None)
+        self.removed.add(name)
+
+    def __contains__(self, name):
+        if name in self.loaded:
+            return True
+        if name in self.removed:
+            return False
+
+        return self.store.has_stack(name)
+
+    def __iter__(self):
+        yield from self.loaded
+
+        for name in self.store.stack_names():
+            if name not in self.loaded and name not in self.removed:
+                yield name
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+class SqliteStore(RecordWriter):
+    def __init__(self, path, wal=True):
+        self.path = path
+        self.wal = wal
+        self.local = threading.local()
+
+        with self.connection() as conn:
+            conn.executescript(SCHEMA)
+
+    def connection(self):
+        conn = getattr(self.local, "conn", None)
+
+        if conn is None:
+            conn = sqlite3.connect(self.path)
+            if self.wal:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute("PRAGMA synchronous=NORMAL")
+            self.local.conn = conn
+
+        return conn
+
+    def close(self):
+        conn = getattr(self.local, "conn", None)
+
+        if conn is not None:
+            conn.close()
+            self.local.conn = None
+
+    @trace.traced("sqlite.load", "load")
+    def load(self):
+        return {
+            "hierarchy": HierarchyIndex(self.paths()),
+            "data": LazyStacks(self)
+        }
+
+    def paths(self):
+        rows = self.connection().execute("SELECT path FROM hierarchy ORDER BY position")
+        return [path for (path,) in rows]
+
+    @trace.traced("sqlite.read_entry", "load")
+    def read_entry(self, name):
+        conn = self.connection()
+
+        row = conn.execute("SELECT type, meta FROM stacks WHERE name = ?", (name,)).fetchone()
+        if row is None:
+            return None
+
+        content = conn.execute("SELECT content FROM contents WHERE name = ?", (name,)).fetchone()
+
+        return join_entry(*row, content[0] if content else None)
+
+    def entries(self):
+        rows = self.connection().execute(
+            "SELECT stacks.name, stacks.type, stacks.meta, contents.content "
+            "FROM stacks LEFT JOIN contents ON contents.name = stacks.name"
+        )
+
+        for name, stack_type, meta, content in rows:
+            yield name, join_entry(stack_type, meta, content)
+
+    def read_type(self, name):
+        row = self.connection().execute("SELECT type FROM stacks WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else None
+
+    def has_stack(self, name):
+        row = self.connection().execute("SELECT 1 FROM stacks WHERE name = ?", (name,)).fetchone()
+        return row is not None
+
+    def stack_names(self):
+        for (name,) in self.connection().execute("SELECT name FROM stacks"):
+            yield name
+
+    @trace.traced("sqlite.append", "save")
+    def append(self, *records):
+        conn = self.connection()
+
+        with conn:
+            for record in records:
+                self.apply(conn, record)
+
+    def apply(self, conn, record):
+        op = record["op"]
+
+        if op == "put":
+            entry = record["entry"]
+            stack_type, meta = split_entry(entry)
+
+            conn.execute(
+                "INSERT OR REPLACE INTO stacks (name, type, meta) VALUES (?, ?, ?)",
+                (record["name"], stack_type, meta)
+            )
+
+            if "content" in entry:
+                self.write_content(conn, record["name"], entry["content"])
+            else:
+                conn.execute("DELETE FROM contents WHERE name = ?", (record["name"],))
+
+        elif op == "content":
+            self.write_content(conn, record["name"], record["content"])
+
+        elif op == "patch":
+            row = conn.execute("SELECT content FROM contents WHERE name = ?", (record["name"],)).fetchone()
+            content = json.loads(row[0]) if row else None
+
+            self.write_content(conn, record["name"], patch_content(content, record))
+
+        elif op == "drop":
+            conn.execute("DELETE FROM stacks WHERE name = ?", (record["name"],))
+            conn.execute("DELETE FROM contents WHERE name = ?", (record["name"],))
+
+        elif op == "rename":
+            conn.execute("UPDATE stacks SET name = ? WHERE name = ?", (record["new"], record["old"]))
+            conn.execute("UPDATE contents SET name = ? WHERE name = ?", (record["new"], record["old"]))
+
+        elif op == "path_add":
+            self.add_path_row(conn, record["path"])
+
+        elif op == "path_remove":
+            path = record["path"]
+            conn.execute(
+                "DELETE FROM hierarchy WHERE path = ? OR (path > ? AND path < ?)",
+                (path, f"{path}/", f"{path}0")
+            )
+
+        elif op == "path_move":
+            old = record["old"]
+            # '0' sorts right after '/', so the range covers exactly the descendants of old
+            moved = conn.execute(
+                "UPDATE hierarchy SET path = ? || substr(path, ?) "
+                "WHERE path = ? OR (path > ? AND path < ?)",
+                (record["new"], len(old) + 1, old, f"{old}/", f"{old}0")
+            )
+
+            if moved.rowcount == 0:
+                self.add_path_row(conn, record["new"])
+
+    def write_content(self, conn, name, content):
+        conn.execute(
+            "INSERT OR REPLACE INTO contents (name, content) VALUES (?, ?)",
+            (name, json.dumps(content))
+        )
+
+    def add_path_row(self, conn, path):
+        conn.execute(
+            "INSERT OR IGNORE INTO hierarchy (path, position) "
+            "SELECT ?, COALESCE(MAX(position), 0) + 1 FROM hierarchy",
+            (path,)
+        )
+
+    def import_data(self, data):
+        conn = self.connection()
+
+        with conn:
+            conn.execute("DELETE FROM hierarchy")
+            conn.execute("DELETE FROM stacks")
+            conn.execute("DELETE FROM contents")
+
+            conn.executemany(
+                "INSERT OR IGNORE INTO hierarchy (path, position) VALUES (?, ?)",
+                ((path, position) for position, path in enumerate(data["hierarchy"]))
+            )
+
+            for name, entry in data["data"].items():
+                stack_type, meta = split_entry(entry)
+                conn.execute(
+                    "INSERT INTO stacks (name, type, meta) VALUES (?, ?, ?)",
+                    (name, stack_type, meta)
+                )
+
+                if "content" in entry:
+                    self.write_content(conn, name, entry["content"])
+
+    def replace_data(self, data):
+        self.import_data(data)
+
+    def export(self, file_path):
+        temp_path = f"{file_path}.tmp"
+
+        if file_path.endswith(SQLITE_SUFFIX):
+            target = sqlite3.connect(temp_path)
+            self.connection().backup(target)
+            target.close()
+        else:
+            self.export_json(temp_path)
+
+        with open(temp_path, "rb") as file:
+            os.fsync(file.fileno())
+
+        os.replace(temp_path, file_path)
+
+    def export_json(self, file_path):
+        conn = self.connection()
+
+        with open(file_path, "w", encoding="utf-8") as file:
+            file.write('{\n    "hierarchy": ')
+            file.write(json.dumps(self.paths()))
+            file.write(',\n    "data": {')
+
+            rows = conn.execute(
+                "SELECT stacks.name, stacks.type, stacks.meta, contents.content "
+                "FROM stacks LEFT JOIN contents ON contents.name = stacks.name"
+            )
+
+            separator = "\n"
+            for name, stack_type, meta, content in rows:
+                entry = join_entry(stack_type, meta, content)
+                file.write(f"{separator}        {json.dumps(name)}: {json.dumps(entry)}")
+                separator = ",\n"
+
+            file.write("\n    }\n}\n")
@@ -0,0 +1,200 @@
+import os
+import re
+import json
+
+from core.store import SqliteStore, SQLITE_SUFFIX
+
+CHUNK_SIZE = 1024 * 1024
+WRITE_BATCH = 256
+
+WHITESPACE = re.compile(r"[ \t\n\r]*")
+
+class JsonStream:
+    def __init__(self, file, chunk_size=CHUNK_SIZE):
+        self.file = file
+        self.chunk_size = chunk_size
+        self.decoder = json.JSONDecoder()
+
+        # Only the text from the value being decoded onwards is kept in memory
+        self.buffer = ""
+        self.position = 0
+        self.consumed = 0
+        self.eof = False
+
+    def offset(self):
+        return self.consumed + self.position
+
+    def fill(self, size):
+        self.consumed += self.position
+        self.buffer = self.buffer[self.position:]
+        self.position = 0
+
+        chunk = self.file.read(size)
+        if not chunk:
+            self.eof = True
+
+        self.buffer += chunk
+        return bool(chunk)
+
+    def peek(self):
+        while True:
+            self.position = WHITESPACE.match(self.buffer, self.position).end()
+
+            if self.position < len(self.buffer):
+                return self.buffer[self.position]
+            if not self.fill(self.chunk_size):
+                return ""
+
+    def expect(self, char):
+        if self.peek() != char:
+            raise ValueError(f"Expected '{char}' at offset {self.offset()}")
+
+        self.position += 1
+
+    def value(self):
+        self.peek()
+        size = self.chunk_size
+
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.position)
+            except json.JSONDecodeError as e:
+                if self.eof:
+                    raise ValueError(f"Invalid JSON at offset {self.consumed + e.pos}") from None
+                end = None
+
+            # A number at the very end of the buffer may continue in the next chunk
+            if end is not None and (end < len(self.buffer) or self.eof):
+                self.position = end
+                return value
+
+            # Doubling keeps one large value from being re-parsed once per chunk
+            self.fill(size)
+            size *= 2
+
+    def keys(self):
+        # The caller reads each key's value before asking for the next key
+        self.expect("{")
+
+        if self.peek() == "}":
+            self.position += 1
+            return
+
+        while True:
+            key = self.value()
+            if not isinstance(key, str):
+                raise ValueError(f"Expected a key at offset {self.offset()}")
+
+            self.expect(":")
+            yield key
+
+            if self.peek() == ",":
+                self.position += 1
+                continue
+
+            self.expect("}")
+            return
+
+def read_project(path):
+    # Yields ("hierarchy", paths) and ("stack", (name, entry)) in file order, one stack in memory at a time
+    if path.endswith(SQLITE_SUFFIX):
+        yield from read_store(path)
+        return
+
+    with open(path, "r", encoding="utf-8") as file:
+        stream = JsonStream(file)
+
+        for key in stream.keys():
+            if key == "data":
+                for name in stream.keys():
+                    yield "stack", (name, stream.value())
+            elif key == "hierarchy":
+                yield "hierarchy", stream.value()
+            else:
+                stream.value()
+
+        if stream.peek():
+            raise ValueError(f"Unexpected data at offset {stream.offset()}")
+
+def read_store(path):
+    # Opening a missing path would create an empty database
+    if not os.path.exists(path):
+        raise FileNotFoundError(path)
+
+    store = SqliteStore(path, wal=False)
+
+    try:
+        yield "hierarchy", store.paths()
+
+        for item in store.entries():
+            yield "stack", item
+    finally:
+        store.close()
+
+class JsonProjectWriter:
+    def __init__(self, path):
+        self.path = path
+        self.temp_path = f"{path}.tmp"
+        self.hierarchy = []
+
+        # Stacks are written as they arrive, the hierarchy is only complete once they are all in
+        self.file = open(self.temp_path, "w", encoding="utf-8")
+        self.file.write('{\n    "data": {')
+        self.separator = "\n"
+
+    def add_stack(self, name, entry):
+        self.file.write(f"{self.separator}        {json.dumps(name)}: {json.dumps(entry)}")
+        self.separator = ",\n"
+
+    def add_paths(self, paths):
+        self.hierarchy.extend(paths)
+
+    def close(self):
+        self.file.write(f'\n    }},\n    "hierarchy": {json.dumps(self.hierarchy)}\n}}\n')
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.file.close()
+
+        os.replace(self.temp_path, self.path)
+
+    def abort(self):
+        self.file.close()
+        os.remove(self.temp_path)
+
+class SqliteProjectWriter:
+    def __init__(self, path):
+        self.path = path
+        self.temp_path = f"{path}.tmp"
+
+        if os.path.exists(self.temp_path):
+            os.remove(self.temp_path)
+
+        self.store = SqliteStore(self.temp_path, wal=False)
+        self.pending = []
+
+    def add_stack(self, name, entry):
+        self.pending.append({"op": "put", "name": name, "entry": entry})
+
+        if len(self.pending) >= WRITE_BATCH:
+            self.store.append(*self.pending)
+            self.pending = []
+
+    def add_paths(self, paths):
+        self.pending.extend({"op": "path_add", "path": path} for path in paths)
+
+    def close(self):
+        self.store.append(*self.pending)
+        self.pending = []
+        self.store.close()
+
+        os.replace(self.temp_path, self.path)
+
+    def abort(self):
+        self.store.close()
+        os.remove(self.temp_path)
+
+def open_writer(path):
+    if path.endswith(SQLITE_SUFFIX):
+        return SqliteProjectWriter(path)
+
+    return JsonProjectWriter(path)
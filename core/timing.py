@@ -0,0 +1,27 @@
+import os
+import sys
+import time
+
+STARTED = time.perf_counter()
+
+marks = []
+reported = set()
+
+def enabled():
+    return bool(os.environ.get("IDEASTACK_TIMING"))
+
+def mark(label):
+    marks.append((label, (time.perf_counter() - STARTED) * 1000))
+
+def mark_once(label):
+    if all(existing != label for existing, _ in marks):
+        mark(label)
+
+def report():
+    if not enabled():
+        return
+
+    for label, elapsed in marks:
+        if label not in reported:
+            print(f"[startup] {label}: {elapsed:.1f} ms", file=sys.stderr)
+            reported.add(label)
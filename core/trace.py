@@ -0,0 +1,143 @@
+import os
+import json
+import time
+import functools
+import threading
+
+from collections import deque
+
+ENV_VAR = "IDEASTACK_TRACE"
+DEFAULT_PATH = "ideastack-trace.json"
+
+# Oldest events fall off the end, so a long session cannot grow the buffer without bound
+MAX_EVENTS = 500_000
+FRAME_WINDOW = 120
+
+STARTED = time.perf_counter()
+PID = os.getpid()
+
+events = deque(maxlen=MAX_EVENTS)
+frames = deque(maxlen=FRAME_WINDOW)
+thread_names = {}
+
+active = bool(os.environ.get(ENV_VAR))
+
+def enabled():
+    return active
+
+def enable(on=True):
+    global active
+    active = on
+
+def output_path():
+    # IDEASTACK_TRACE=1 traces to the default file, any other value is taken as the path
+    value = os.environ.get(ENV_VAR, "")
+    return DEFAULT_PATH if value in ("", "1") else value
+
+def now():
+    return (time.perf_counter() - STARTED) * 1_000_000
+
+def thread_id():
+    tid = threading.get_ident()
+
+    if tid not in thread_names:
+        thread_names[tid] = threading.current_thread().name
+
+    return tid
+
+class Span:
+    __slots__ = ("name", "category", "args", "started")
+
+    def __init__(self, name, category, args):
+        self.name = name
+        self.category = category
+        self.args = args
+
+    def __enter__(self):
+        self.started = now()
+        return self
+
+    def __exit__(self, *exc):
+        event = {
+            "name": self.name,
+            "cat": self.category,
+            "ph": "X",
+            "ts": self.started,
+            "dur": now() - self.started,
+            "pid": PID,
+            "tid": thread_id()
+        }
+        if self.args:
+            event["args"] = self.args
+
+        events.append(event)
+        return False
+
+class NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+NULL_SPAN = NullSpan()
+
+def span(name, category="app", **args):
+    if not active:
+        return NULL_SPAN
+
+    return Span(name, category, args)
+
+def traced(name=None, category="app"):
+    def decorate(function):
+        label = name or function.__qualname__
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not active:
+                return function(*args, **kwargs)
+
+            with Span(label, category, None):
+                return function(*args, **kwargs)
+
+        return wrapper
+
+    return decorate
+
+def counter(name, **values):
+    if not active:
+        return
+
+    events.append({"name": name, "ph": "C", "ts": now(), "pid": PID, "tid": thread_id(), "args": values})
+
+def frame(duration_ms):
+    frames.append((time.perf_counter(), duration_ms))
+
+def frame_stats():
+    # Frames per second over the last second of painting, and the last frame's time
+    if not frames:
+        return 0.0, 0.0
+
+    cutoff = time.perf_counter() - 1.0
+    recent = sum(1 for finished, _ in frames if finished >= cutoff)
+
+    return float(recent), frames[-1][1]
+
+def clear():
+    events.clear()
+    frames.clear()
+
+def export(path):
+    metadata = [
+        {"name": "thread_name", "ph": "M", "pid": PID, "tid": tid, "args": {"name": thread_name}}
+        for tid, thread_name in thread_names.items()
+    ]
+
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as file:
+        json.dump({"traceEvents": metadata + list(events), "displayTimeUnit": "ms"}, file)
+
+    os.replace(temp_path, path)
+    return len(events)
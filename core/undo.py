@@ -0,0 +1,150 @@
+import os
+
+from collections import deque
+
+DEFAULT_BUDGET_MB = 16
+COMMAND_COST = 256
+
+def undo_budget():
+    try:
+        megabytes = int(os.environ.get("IDEASTACK_UNDO_MB", DEFAULT_BUDGET_MB))
+    except ValueError:
+        megabytes = DEFAULT_BUDGET_MB
+
+    return megabytes * 1024 * 1024
+
+def estimate_size(value):
+    pending = [value]
+    size = 0
+
+    while pending:
+        value = pending.pop()
+
+        if isinstance(value, str):
+            size += 49 + len(value)
+        elif isinstance(value, dict):
+            size += 64 + 24 * len(value)
+            pending.extend(value.keys())
+            pending.extend(value.values())
+        elif isinstance(value, (list, tuple)):
+            size += 56 + 8 * len(value)
+            pending.extend(value)
+        else:
+            size += 28
+
+    return size
+
+class Command:
+    __slots__ = ("label", "undo", "redo", "owner", "cost", "discard")
+
+    def __init__(self, label, undo, redo, owner=None, cost=COMMAND_COST, discard=None):
+        self.label = label
+        self.undo = undo
+        self.redo = redo
+        self.owner = owner
+        self.cost = cost
+        self.discard = discard
+
+class UndoStack:
+    def __init__(self, budget=None):
+        self.budget = undo_budget() if budget is None else budget
+
+        self.history = deque()
+        self.undone = deque()
+        self.total_cost = 0
+
+        # Commands held per owner across both lists, so owners can ask whether they still have history
+        self.owners = {}
+
+        # Set while a command runs, so the edits it makes are not recorded again
+        self.applying = False
+
+    def push(self, command):
+        if self.applying:
+            return
+
+        self.history.append(command)
+        self.total_cost += command.cost
+        self.owners[command.owner] = self.owners.get(command.owner, 0) + 1
+
+        # Dropped only after the new command is in, so owners can tell they still have history
+        self.drop_all(self.undone)
+
+        while self.total_cost > self.budget and len(self.history) > 1:
+            self.drop(self.history.popleft(), evicted=True)
+
+    def charge(self, command, cost):
+        # For commands that keep growing after they are pushed, the budget is checked again on the next push
+        command.cost += cost
+        self.total_cost += cost
+
+    def drop(self, command, evicted=False):
+        self.total_cost -= command.cost
+
+        count = self.owners.pop(command.owner, 0) - 1
+        if count > 0:
+            self.owners[command.owner] = count
+
+        if command.discard:
+            command.discard(evicted)
+
+    def drop_all(self, commands):
+        dropped = list(commands)
+        commands.clear()
+
+        for command in dropped:
+            self.drop(command)
+
+    def latest(self, commands, scope):
+        for position in range(len(commands) - 1, -1, -1):
+            if commands[position].owner in scope:
+                return position
+
+        return None
+
+    def run(self, source, target, scope, action):
+        position = self.latest(source, scope)
+        if position is None:
+            return None
+
+        command = source[position]
+        del source[position]
+
+        self.applying = True
+        try:
+            getattr(command, action)()
+        finally:
+            self.applying = False
+
+        target.append(command)
+        return command
+
+    def undo(self, scope=(None,)):
+        return self.run(self.history, self.undone, scope, "undo")
+
+    def redo(self, scope=(None,)):
+        return self.run(self.undone, self.history, scope, "redo")
+
+    def owns(self, owner):
+        return owner in self.owners
+
+    def discard_owner(self, owner):
+        if owner not in self.owners:
+            return
+
+        dropped = []
+        for commands in (self.history, self.undone):
+            kept = [command for command in commands if command.owner is not owner]
+            dropped.extend(command for command in commands if command.owner is owner)
+
+            commands.clear()
+            commands.extend(kept)
+
+        for command in dropped:
+            self.drop(command)
+
+    def clear(self):
+        self.drop_all(self.history)
+        self.drop_all(self.undone)
+
+        self.total_cost = 0
@@ -0,0 +1,105 @@
+import os
+
+from collections import OrderedDict
+
+DEFAULT_BUDGET_MB = 256
+BASE_COST = 64 * 1024
+
+def cache_budget():
+    try:
+        megabytes = int(os.environ.get("IDEASTACK_WORKSPACE_CACHE_MB", DEFAULT_BUDGET_MB))
+    except ValueError:
+        megabytes = DEFAULT_BUDGET_MB
+
+    return megabytes * 1024 * 1024
+
+def estimate_cost(workspace):
+    if hasattr(workspace, "memory_cost"):
+        return BASE_COST + workspace.memory_cost()
+
+    return BASE_COST
+
+class WorkspaceCache:
+    def __init__(self, evict, budget=None):
+        self.evict = evict
+        self.budget = cache_budget() if budget is None else budget
+
+        self.entries = OrderedDict()
+        self.total_cost = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.rebuilds = 0
+        self.rebuild_time = 0.0
+        self.last_rebuild_time = 0.0
+
+    def __contains__(self, stack_name):
+        return stack_name in self.entries
+
+    def take(self, stack_name):
+        entry = self.entries.pop(stack_name, None)
+
+        if entry is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self.total_cost -= entry[1]
+        return entry[0]
+
+    def put(self, stack_name, workspace):
+        cost = estimate_cost(workspace)
+
+        self.entries[stack_name] = (workspace, cost)
+        self.total_cost += cost
+
+        while self.total_cost > self.budget and self.entries:
+            name, (evicted, evicted_cost) = self.entries.popitem(last=False)
+            self.total_cost -= evicted_cost
+            self.evictions += 1
+
+            self.evict(name, evicted)
+
+    def discard(self, stack_name):
+        entry = self.entries.pop(stack_name, None)
+        if entry is None:
+            return None
+
+        self.total_cost -= entry[1]
+        return entry[0]
+
+    def rename(self, old_name, new_name):
+        if old_name in self.entries:
+            workspace, cost = self.entries.pop(old_name)
+            workspace.stack_name = new_name
+            self.entries[new_name] = (workspace, cost)
+
+    def clear(self):
+        workspaces = [workspace for workspace, _ in self.entries.values()]
+
+        self.entries.clear()
+        self.total_cost = 0
+
+        return workspaces
+
+    def record_rebuild(self, seconds):
+        self.rebuilds += 1
+        self.rebuild_time += seconds
+        self.last_rebuild_time = seconds
+
+    def stats(self):
+        lookups = self.hits + self.misses
+
+        return {
+            "entries": len(self.entries),
+            "cost": self.total_cost,
+            "budget": self.budget,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "rebuilds": self.rebuilds,
+            "average_rebuild_ms": self.rebuild_time / self.rebuilds * 1000 if self.rebuilds else 0.0,
+            "last_rebuild_ms": self.last_rebuild_time * 1000
+        }
@@ -1,47 +1,260 @@
 import os
 import sys
-import json
-import importlib
-import shutil
+import time
 
-from PyQt5.QtCore import Qt
+from core import timing, trace
+
+from PyQt5.QtCore import Qt, QTimer, pyqtSignal
 from PyQt5.QtGui import QKeySequence
 from PyQt5.QtWidgets import (
     QApplication, QMainWindow, QWidget,
-    QVBoxLayout, QSplitter, QTreeWidget, QLabel,
-    QShortcut, QInputDialog, QTreeWidgetItem,
-    QMenu, QMessageBox, QFileDialog, QAction
+    QVBoxLayout, QSplitter, QTreeView, QLabel,
+    QShortcut, QInputDialog, QLineEdit, QListWidget, QListWidgetItem,
+    QMenu, QMessageBox, QFileDialog, QAction, QDialog, QHBoxLayout, QPushButton, QAbstractItemView
 )
 
-class Sidebar(QTreeWidget):
+from core.saver import SaveScheduler
+from core.hierarchy import unique_name
+from core.store import SqliteStore, SQLITE_SUFFIX
+from core.sidebar import SidebarModel
+from core.workspaces import WorkspaceCache
+from core.registry import StackRegistry
+from core.search import SearchIndex
+from core.undo import UndoStack, Command, estimate_size
+from core.history import History, history_path
+from core.session import ProjectSession, ProjectLocked
+
+OVERLAY_INTERVAL = 500
+
+PROJECT_FILTER = f"JSON Files (*.json);;IdeaStack Databases (*{SQLITE_SUFFIX});;All Files (*)"
+
+class Sidebar(QTreeView):
     def __init__(self, parent_window):
         super().__init__()
 
         self.parent_window = parent_window
 
+        self.setUniformRowHeights(True)
+
         self.setDragEnabled(True)
         self.setAcceptDrops(True)
-        self.setDragDropMode(QTreeWidget.InternalMove)
+        self.setDropIndicatorShown(True)
+        self.setDragDropMode(QTreeView.InternalMove)
 
-    def drop_event(self, event):
-        dragged_item = self.currentItem()
-        target_item = self.itemAt(event.pos())
+class SearchPanel(QWidget):
+    result_activated = pyqtSignal(str, object)
 
-        if target_item:
-            target_info = self.parent_window.current_data['data'].get(target_item.text(0), {})
-            if target_info.get('type') != 'folder':
-                event.ignore()
-                return
+    def __init__(self, search_index):
+        super().__init__()
+
+        self.search_index = search_index
+
+        self.layout = QVBoxLayout(self)
+        self.layout.setContentsMargins(0, 0, 0, 0)
+        self.layout.setSpacing(0)
+
+        self.field = QLineEdit()
+        self.field.setPlaceholderText("Search stacks...")
+        self.field.setClearButtonEnabled(True)
+        self.field.textChanged.connect(self.run_search)
+
+        self.results = QListWidget()
+        self.results.setUniformItemSizes(True)
+        self.results.setMaximumHeight(240)
+        self.results.itemActivated.connect(self.activate)
+        self.results.itemClicked.connect(self.activate)
+        self.results.hide()
+
+        self.layout.addWidget(self.field)
+        self.layout.addWidget(self.results)
+
+    def run_search(self, text):
+        self.results.clear()
+        self.results.setVisible(bool(text.strip()))
+
+        hits = self.search_index.search(text)
+
+        for stack_name, ref, label in hits:
+            title = stack_name if ref == "name" else f"{stack_name}: {label}"
+
+            item = QListWidgetItem(title)
+            item.setData(Qt.UserRole, (stack_name, ref))
+            self.results.addItem(item)
+
+        if not hits and self.search_index.building:
+            self.results.addItem("Indexing project...")
+
+    def activate(self, item):
+        hit = item.data(Qt.UserRole)
+        if hit:
+            self.result_activated.emit(*hit)
+
+class PerformanceOverlay(QLabel):
+    def __init__(self, window):
+        super().__init__(window)
+
+        self.window = window
+
+        self.setAttribute(Qt.WA_TransparentForMouseEvents)
+        self.setStyleSheet("background-color: rgba(0, 0, 0, 170); color: #9f9; padding: 6px; font-family: monospace;")
+        self.hide()
+
+        self.timer = QTimer(self)
+        self.timer.setInterval(OVERLAY_INTERVAL)
+        self.timer.timeout.connect(self.refresh)
+
+    def set_shown(self, shown):
+        self.setVisible(shown)
+
+        if shown:
+            self.refresh()
+            self.raise_()
+            self.timer.start()
+        else:
+            self.timer.stop()
+
+    def refresh(self):
+        fps, frame_ms = trace.frame_stats()
+        saver = self.window.saver
+
+        lines = [
+            f"{fps:.0f} fps, last frame {frame_ms:.1f} ms",
+            f"Last save {saver.last_latency:.0f} ms, {saver.queue_depth} queued"
+        ]
+
+        workspace = self.window.workspace
+        if hasattr(workspace, "item_counts"):
+            lines.append(", ".join(f"{count} {name}" for name, count in workspace.item_counts().items()))
+
+        self.setText("\n".join(lines))
+        self.adjustSize()
+        self.move(self.window.width() - self.width() - 12, self.window.menuBar().height() + 12)
+
+class HistoryDialog(QDialog):
+    def __init__(self, window, stack_name=None):
+        super().__init__(window)
 
-        old_path = self.parent_window.get_full_path(dragged_item)
-        super().drop_event(event)
-        new_path = self.parent_window.get_full_path(dragged_item)
+        self.window = window
+        self.history = window.history
+        self.stack_name = stack_name
 
-        if old_path != new_path:
-            if old_path in self.parent_window.current_data['hierarchy']:
-                self.parent_window.current_data['hierarchy'].remove(old_path)
-            self.parent_window.current_data['hierarchy'].append(new_path)
-            self.parent_window.update_json()
+        self.setWindowTitle(f"History of {stack_name}" if stack_name else "Version History")
+        self.resize(760, 440)
+
+        self.layout = QVBoxLayout(self)
+        self.lists = QHBoxLayout()
+        self.buttons = QHBoxLayout()
+
+        # Select one version to compare it with the one before, or two to compare them with each other
+        self.version_list = QListWidget()
+        self.version_list.setSelectionMode(QAbstractItemView.ExtendedSelection)
+        self.version_list.itemSelectionChanged.connect(self.show_changes)
+
+        self.change_list = QListWidget()
+        self.change_list.setUniformItemSizes(True)
+
+        self.lists.addWidget(self.version_list, 1)
+        self.lists.addWidget(self.change_list, 1)
+
+        self.restore_stack_button = QPushButton("Restore Stack")
+        self.restore_stack_button.clicked.connect(self.restore_stack)
+        self.restore_project_button = QPushButton("Restore Project")
+        self.restore_project_button.clicked.connect(self.restore_project)
+        self.close_button = QPushButton("Close")
+        self.close_button.clicked.connect(self.reject)
+
+        self.buttons.addStretch(1)
+        for button in (self.restore_stack_button, self.restore_project_button, self.close_button):
+            self.buttons.addWidget(button)
+
+        self.layout.addLayout(self.lists)
+        self.layout.addLayout(self.buttons)
+
+        self.load_versions()
+
+    def load_versions(self):
+        versions = self.history.versions()
+        self.previous = dict(zip((manifest["id"] for manifest in versions[1:]), versions))
+
+        shown = self.history.stack_versions(self.stack_name) if self.stack_name else versions
+
+        for manifest in reversed(shown):
+            diff = self.history.diff(self.previous.get(manifest["id"]), manifest)
+            created = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(manifest["created"]))
+            summary = f"+{len(diff['added'])} ~{len(diff['changed'])} -{len(diff['removed'])}"
+
+            item = QListWidgetItem(f"{created}  {manifest['label'] or 'Untitled'}  ({summary})")
+            item.setData(Qt.UserRole, manifest["id"])
+            self.version_list.addItem(item)
+
+        if self.version_list.count():
+            self.version_list.setCurrentRow(0)
+        else:
+            self.change_list.addItem("No versions saved yet")
+
+    def selected_ids(self):
+        return sorted(item.data(Qt.UserRole) for item in self.version_list.selectedItems())
+
+    def show_changes(self):
+        self.change_list.clear()
+
+        selected = self.selected_ids()
+        if len(selected) == 1:
+            new = self.history.manifest(selected[0])
+            old = self.previous.get(new["id"])
+        elif len(selected) == 2:
+            old, new = (self.history.manifest(version_id) for version_id in selected)
+        else:
+            return
+
+        diff = self.history.diff(old, new)
+        marks = {name: "+" for name in diff["added"]}
+        marks.update((name, "~") for name in diff["changed"])
+
+        if diff["moved"]:
+            self.change_list.addItem("Folders were rearranged")
+
+        # Changed stacks first, removed ones can be brought back from the older version
+        names = sorted(new["stacks"], key=lambda name: (name not in marks, name.lower()))
+        rows = [(marks.get(name, " "), name, new["id"]) for name in names]
+        rows[len(marks):len(marks)] = [("-", name, old["id"]) for name in diff["removed"]]
+
+        for mark, name, version_id in rows:
+            item = QListWidgetItem(f"{mark} {name}")
+            item.setData(Qt.UserRole, (version_id, name))
+            self.change_list.addItem(item)
+
+            if name == self.stack_name:
+                self.change_list.setCurrentItem(item)
+
+    def restore_stack(self):
+        item = self.change_list.currentItem()
+        target = item.data(Qt.UserRole) if item else None
+
+        if not target:
+            QMessageBox.information(self, "Restore Stack", "Select a stack from the list on the right.")
+            return
+
+        self.window.restore_stack(*target)
+        self.accept()
+
+    def restore_project(self):
+        selected = self.selected_ids()
+        if len(selected) != 1:
+            QMessageBox.information(self, "Restore Project", "Select a single version to restore.")
+            return
+
+        reply = QMessageBox.question(
+            self,
+            "Restore Project",
+            "Replace the whole project with this version? The current state is saved as a version first.",
+            QMessageBox.Yes | QMessageBox.No,
+            QMessageBox.No
+        )
+
+        if reply == QMessageBox.Yes:
+            self.window.restore_project(selected[0])
+            self.accept()
 
 class IdeaStack(QMainWindow):
     def __init__(self):
@@ -51,7 +264,31 @@ class IdeaStack(QMainWindow):
         self.active_stack_name = None
         self.workspace = None
 
-        self.setWindowTitle("Idea Stack")
+        self.registry = StackRegistry()
+        self.registry.discover()
+        timing.mark("stack discovery")
+
+        self.workspace_cache = WorkspaceCache(self.evict_workspace)
+        self.undo_stack = UndoStack()
+
+        # Edits are written to the open file itself, an unsaved project lives in the cache directory until Save As
+        self.session = ProjectSession.resume_untitled()
+        self.pending_session = None
+        self.backend = self.session.open_backend()
+
+        self.saver = SaveScheduler(self.backend)
+        self.saver.saved.connect(self.show_save_status)
+        self.saver.exported.connect(self.show_exported)
+        self.saver.export_failed.connect(self.show_export_error)
+        self.saver.failed.connect(self.show_save_error)
+        self.saver.versioned.connect(self.show_versioned)
+
+        self.history = History(history_path(self.backend.path))
+
+        self.search_index = SearchIndex()
+        self.saver.listeners.append(self.search_index.apply)
+
+        self.update_title()
         self.setMinimumSize(1280, 720)
 
         self.main_container = QWidget()
@@ -65,15 +302,20 @@ class IdeaStack(QMainWindow):
         self.splitter = QSplitter(Qt.Horizontal)
         self.layout.addWidget(self.splitter)
 
+        self.side_panel = QWidget()
+        self.side_layout = QVBoxLayout(self.side_panel)
+        self.side_layout.setContentsMargins(0, 0, 0, 0)
+        self.side_layout.setSpacing(0)
+        self.splitter.addWidget(self.side_panel)
+
+        self.search_panel = SearchPanel(self.search_index)
+        self.search_panel.result_activated.connect(self.jump_to_result)
+        self.side_layout.addWidget(self.search_panel)
+
         self.sidebar = Sidebar(self)
-        self.sidebar.setHeaderLabel("IdeaStacks")
-        self.splitter.addWidget(self.sidebar)
+        self.side_layout.addWidget(self.sidebar, 1)
         self.sidebar.setMinimumWidth(150)
 
-        self.sidebar.setDragEnabled(True)
-        self.sidebar.setAcceptDrops(True)
-        self.sidebar.setDragDropMode(QTreeWidget.InternalMove)
-
         self.sidebar.setContextMenuPolicy(Qt.CustomContextMenu)
         self.sidebar.customContextMenuRequested.connect(self.show_right_click)
 
@@ -83,22 +325,29 @@ class IdeaStack(QMainWindow):
 
         self.splitter.setSizes([200, 720])
 
-        self.create_temp_json()
+        self.load_session_data()
         self.create_menubar()
 
-        self.load_sidebar()
+        self.sidebar_model = SidebarModel(self.current_data['hierarchy'], self.current_data['data'])
+        self.sidebar_model.move_requested.connect(self.move_item)
+        self.sidebar.setModel(self.sidebar_model)
 
-        self.sidebar.itemClicked.connect(self.load_stack_content)
+        self.sidebar.clicked.connect(self.load_stack_content)
 
         self.new_stack_key = QShortcut(QKeySequence("Ctrl+N"), self)
         self.new_stack_key.activated.connect(self.show_stack_selector)
 
+        self.search_key = QShortcut(QKeySequence("Ctrl+F"), self)
+        self.search_key.activated.connect(self.search_panel.field.setFocus)
+
+        self.rebuild_search_index()
+
+        self.overlay = PerformanceOverlay(self)
+
+        timing.mark("main window")
+
     def show_stack_selector(self):
-        stack_options = ["Folder"] + [
-            file[:-3]
-            for file in os.listdir("stacks")
-            if file.endswith(".py")
-        ]
+        stack_options = ["Folder"] + self.registry.names()
 
         stack_type, ok = QInputDialog.getItem(
             self,
@@ -116,90 +365,139 @@ class IdeaStack(QMainWindow):
                 self.add_stack_to_sidebar(stack_type)
 
     def add_folder_to_sidebar(self):
-        name = "New Folder"
+        name = unique_name("New Folder", self.current_data['data'], self.current_data['hierarchy'].suffixes)
+        self.add_item(name, {"type": "folder"})
 
-        if name in self.current_data['data']:
-            i = 1
-            while f"{name} {i}" in self.current_data['data']:
-                i += 1
-            name = f"{name} {i}"
+    def add_stack_to_sidebar(self, stack_type):
+        name = unique_name(f"New {stack_type}", self.current_data['data'], self.current_data['hierarchy'].suffixes)
+        self.add_item(name, {"type": stack_type})
+
+    def add_item(self, name, entry):
+        items = [(name, name, entry)]
+        self.restore_items(items)
+
+        self.undo_stack.push(Command(
+            f"Add {name}",
+            lambda: self.remove_items(name),
+            lambda: self.restore_items(items),
+            cost=estimate_size(entry)
+        ))
+
+    def restore_items(self, items):
+        for path, name, entry in items:
+            if entry is not None:
+                self.current_data['data'][name] = entry
+                self.saver.put(name, entry)
+
+            self.sidebar_model.add(path)
+            self.saver.add_path(path)
+
+    @trace.traced()
+    def load_stack_content(self, index):
+        self.save_workspace()
+
+        stack_name = self.sidebar_model.node_for(index).name
+        stack_info = self.current_data['data'].get(stack_name)
 
-        new_folder = QTreeWidgetItem(self.sidebar, [name])
-        new_folder.setChildIndicatorPolicy(QTreeWidgetItem.ShowIndicator)
+        if not stack_info or stack_info.get('type') == 'folder':
+            return
 
-        self.current_data['hierarchy'].append(name)
-        self.current_data['data'][name] = {"type": "folder"}
+        if stack_name == self.active_stack_name:
+            return
 
-        self.update_json()
+        current_sizes = self.splitter.sizes()
 
-    def add_stack_to_sidebar(self, stack_type):
-        name = f"New {stack_type}"
+        workspace = self.workspace_cache.take(stack_name)
+        if workspace is None:
+            workspace = self.build_workspace(stack_name, stack_info['type'])
+            if workspace is None:
+                return
 
-        if name in self.current_data["data"]:
-            i = 1
-            while f"{name} {i}" in self.current_data["data"]:
-                i += 1
-            name = f"{name} {i}"
+            self.statusBar().showMessage(
+                f"Built {stack_name} in {self.workspace_cache.last_rebuild_time * 1000:.0f} ms", 2000
+            )
 
-        QTreeWidgetItem(self.sidebar, [name])
+        self.detach_workspace()
+        self.workspace = workspace
 
-        self.current_data['hierarchy'].append(name)
-        self.current_data['data'][name] = {"type": stack_type}
+        self.splitter.addWidget(self.workspace)
+        self.splitter.setSizes(current_sizes)
 
-        self.update_json()
+        self.active_stack_name = stack_name
 
-    def load_stack_content(self, item):
-        if self.workspace:
-            self.current_data = self.workspace.get_data()
-            self.update_json()
+    @trace.traced()
+    def build_workspace(self, stack_name, stack_type):
+        started = time.perf_counter()
 
-        stack_name = item.text(0)
-        stack_info = self.current_data['data'].get(stack_name)
+        try:
+            stack_class = self.registry.stack_class(stack_type)
+            workspace = stack_class(stack_name, self.current_data)
 
-        if not stack_info or stack_info.get('type') == 'folder':
-            return
+        except (LookupError, ImportError, AttributeError) as e:
+            QMessageBox.critical(self, "Stack Error", f"Could not open {stack_name}: {e}")
+            return None
 
-        stack_type = stack_info['type']
+        self.workspace_cache.record_rebuild(time.perf_counter() - started)
 
-        current_sizes = self.splitter.sizes()
+        timing.mark_once("first stack open")
+        timing.report()
 
+        if hasattr(workspace, "undo_stack"):
+            workspace.undo_stack = self.undo_stack
+
+        if hasattr(workspace, "save_requested"):
+            workspace.save_requested.connect(self.save_workspace)
+        if hasattr(workspace, "content_changed"):
+            # Bound to its own stack, cached workspaces can still change after another one is shown
+            workspace.content_changed.connect(lambda: self.workspace_changed(workspace))
+
+        return workspace
+
+    def detach_workspace(self):
         old_widget = self.splitter.widget(1)
         if old_widget:
             old_widget.setParent(None)
-            old_widget.deleteLater()
 
-        try:
-            module = importlib.import_module(f"stacks.{stack_type}")
-            stack_class = getattr(module, "Stack")
-            self.workspace = stack_class(stack_name, self.current_data)
+            if old_widget is self.workspace:
+                self.workspace_cache.put(self.workspace.stack_name, self.workspace)
+            else:
+                old_widget.deleteLater()
 
-        except (ImportError, AttributeError) as e:
-            print(f"Error loading {stack_name}: {e}")
+        self.workspace = None
+        self.active_stack_name = None
 
-        self.splitter.addWidget(self.workspace)
-        self.splitter.setSizes(current_sizes)
+    def evict_workspace(self, stack_name, workspace):
+        if stack_name in self.current_data['data']:
+            data = workspace.get_data()
+            self.saver.set_content(stack_name, data['data'][stack_name].get('content'))
 
-        self.active_stack_name = stack_name
+        self.undo_stack.discard_owner(workspace)
+        workspace.deleteLater()
 
     def show_right_click(self, position):
-        item = self.sidebar.itemAt(position)
-        if item is None:
+        index = self.sidebar.indexAt(position)
+        if not index.isValid():
             return
 
+        node = self.sidebar_model.node_for(index)
+
         menu = QMenu()
 
         rename_action = menu.addAction("Rename")
         delete_action = menu.addAction("Delete")
+        history_action = menu.addAction("Version History")
 
         action = menu.exec_(self.sidebar.mapToGlobal(position))
 
         if action == rename_action:
-            self.rename_item(item)
+            self.rename_item(node)
         elif action == delete_action:
-            self.delete_item(item)
+            self.delete_item(node)
+        elif action == history_action:
+            self.show_history(node.name)
 
-    def rename_item(self, item):
-        old_name = item.text(0)
+    def rename_item(self, node):
+        old_name = node.name
 
         new_name, ok = QInputDialog.getText(
             self,
@@ -220,24 +518,55 @@ class IdeaStack(QMainWindow):
 
             return
 
-        for i, path in enumerate(self.current_data["hierarchy"]):
-            parts = path.split("/")
-            if parts[-1] == old_name:
-                parts[-1] = new_name
-                self.current_data["hierarchy"][i] = "/".join(parts)
+        old_path = node.path
+        new_path = "/".join(old_path.split("/")[:-1] + [new_name])
+
+        self.relocate_item(old_path, new_path, "Rename")
+
+    def move_item(self, old_path, parent_path):
+        name = old_path.split("/")[-1]
+        new_path = f"{parent_path}/{name}" if parent_path else name
+
+        if old_path == new_path:
+            return
+
+        self.relocate_item(old_path, new_path, "Move")
+
+    def relocate_item(self, old_path, new_path, label):
+        try:
+            self.move_path(old_path, new_path)
+        except ValueError as e:
+            QMessageBox.critical(self, f"{label} Error", str(e))
+            return
+
+        self.undo_stack.push(Command(
+            f"{label} {old_path.split('/')[-1]}",
+            lambda: self.move_path(new_path, old_path),
+            lambda: self.move_path(old_path, new_path)
+        ))
+
+    def move_path(self, old_path, new_path):
+        self.sidebar_model.move(old_path, new_path)
+        self.saver.move_path(old_path, new_path)
 
-                break
+        old_name = old_path.split("/")[-1]
+        new_name = new_path.split("/")[-1]
+
+        if old_name == new_name:
+            return
 
         if old_name == self.active_stack_name:
             self.active_stack_name = new_name
+            self.workspace.stack_name = new_name
+        else:
+            self.workspace_cache.rename(old_name, new_name)
 
-        self.current_data['data'][new_name] = self.current_data['data'].pop(old_name)
-
-        item.setText(0, new_name)
-        self.update_json()
+        if old_name in self.current_data['data']:
+            self.current_data['data'][new_name] = self.current_data['data'].pop(old_name)
+            self.saver.rename(old_name, new_name)
 
-    def delete_item(self, item):
-        stack_name = item.text(0)
+    def delete_item(self, node):
+        stack_name = node.name
 
         reply = QMessageBox.question(
             self,
@@ -249,58 +578,260 @@ class IdeaStack(QMainWindow):
         if reply == QMessageBox.No:
             return
 
+        path = node.path
+        items = self.remove_items(path)
+
+        self.undo_stack.push(Command(
+            f"Delete {stack_name}",
+            lambda: self.restore_items(items),
+            lambda: self.remove_items(path),
+            cost=estimate_size([entry for _, _, entry in items])
+        ))
+
+    def remove_items(self, path):
+        node = self.current_data['hierarchy'].find(path)
+        if node is None:
+            return []
+
+        self.save_workspace()
+
+        items = []
+        for child in node.walk():
+            name = child.name
+
+            # Open stacks write their latest content back so undo restores it
+            workspace = self.workspace_cache.discard(name)
+            if workspace:
+                workspace.get_data()
+                self.undo_stack.discard_owner(workspace)
+                workspace.deleteLater()
+
+            if child.listed:
+                items.append((child.path, name, self.current_data['data'].get(name)))
+
         current_sizes = self.splitter.sizes()
 
-        parent = item.parent()
-        if parent:
-            parent.removeChild(item)
-        else:
-            index = self.sidebar.indexOfTopLevelItem(item)
-            self.sidebar.takeTopLevelItem(index)
+        removed = [child.name for child in self.sidebar_model.remove(path)]
+        self.saver.remove_path(path)
 
-        if stack_name in self.current_data['data']:
-            self.current_data['data'].pop(stack_name)
+        for name in removed:
+            if name in self.current_data['data']:
+                self.current_data['data'].pop(name)
+                self.saver.drop(name)
 
-        for path in self.current_data['hierarchy'][:]:
-            if path.split('/')[-1] == stack_name:
-                self.current_data['hierarchy'].remove(path)
-                break
+        if self.active_stack_name in removed:
+            self.undo_stack.discard_owner(self.workspace)
+            self.show_placeholder(current_sizes)
 
-        if self.active_stack_name == stack_name:
-            old_widget = self.splitter.widget(1)
-            if old_widget:
-                old_widget.setParent(None)
-                old_widget.deleteLater()
+        return items
 
-            self.content_area = QLabel("Select a stack to view content")
-            self.content_area.setAlignment(Qt.AlignCenter)
-            self.splitter.addWidget(self.content_area)
+    def show_placeholder(self, sizes):
+        old_widget = self.splitter.widget(1)
+        if old_widget:
+            old_widget.setParent(None)
+            old_widget.deleteLater()
 
-            self.splitter.setSizes(current_sizes)
+        self.content_area = QLabel("Select a stack to view content")
+        self.content_area.setAlignment(Qt.AlignCenter)
+        self.splitter.addWidget(self.content_area)
 
-            self.active_stack_name = None
+        self.splitter.setSizes(sizes)
 
-        self.update_json()
+        self.active_stack_name = None
+        self.workspace = None
 
-    def create_temp_json(self):
-        if not os.path.exists("temp.json"):
-            default_scheme = {
-                "hierarchy": [],
-                "data": {}
-            }
+    def close_workspace(self, name):
+        workspace = self.workspace_cache.discard(name)
 
-            with open("temp.json", "w", encoding="utf-8") as file:
-                json.dump(default_scheme, file, indent=4)
+        if name == self.active_stack_name:
+            workspace = self.workspace
+            self.show_placeholder(self.splitter.sizes())
 
-            self.current_data = default_scheme
+        if workspace:
+            self.undo_stack.discard_owner(workspace)
+            workspace.deleteLater()
 
-        else:
-            with open("temp.json", "r", encoding="utf-8") as file:
-                self.current_data = json.load(file)
+    def replace_entry(self, name, entry):
+        reopen = name == self.active_stack_name
+
+        # An open copy of the stack would write its old content back over this one
+        self.close_workspace(name)
+
+        self.current_data['data'][name] = entry
+        self.saver.put(name, entry)
+
+        node = self.current_data['hierarchy'].find_name(name)
+        if reopen and node:
+            self.load_stack_content(self.sidebar_model.reveal(node))
+
+    def show_history(self, stack_name=None):
+        self.save_workspace()
+        HistoryDialog(self, stack_name).exec_()
+
+    def save_version(self):
+        label, ok = QInputDialog.getText(self, "Save Version", "Describe this version:")
+        if not ok:
+            return
+
+        self.commit_version(label)
+
+    def commit_version(self, label):
+        self.save_workspace()
+        self.saver.save_version(self.history, self.project_entries(), self.current_data['hierarchy'].paths(), label)
+
+    def show_versioned(self, manifest):
+        self.statusBar().showMessage(f"Saved version {manifest['label'] or manifest['id']}", 2000)
+
+    def restore_stack(self, version_id, name):
+        self.save_workspace()
+
+        entry = self.history.read_stack(version_id, name)
+
+        if name in self.current_data['data']:
+            old_entry = self.current_data['data'][name]
+            self.replace_entry(name, entry)
+
+            self.undo_stack.push(Command(
+                f"Restore {name}",
+                lambda: self.replace_entry(name, old_entry),
+                lambda: self.replace_entry(name, entry),
+                cost=estimate_size([old_entry, entry])
+            ))
+
+            return
+
+        # A deleted stack goes back to its old folder, or to the top level if that folder is gone too
+        path = self.history.stack_path(version_id, name)
+        if "/" in path and path.rsplit("/", 1)[0] not in self.current_data['hierarchy']:
+            path = name
+
+        items = [(path, name, entry)]
+        self.restore_items(items)
+
+        self.undo_stack.push(Command(
+            f"Restore {name}",
+            lambda: self.remove_items(path),
+            lambda: self.restore_items(items),
+            cost=estimate_size(entry)
+        ))
+
+    def restore_project(self, version_id):
+        self.commit_version("Before restoring a version")
+        self.saver.wait()
+
+        data = self.history.checkout(version_id)
+
+        self.saver.discard()
+        self.backend.replace_data(data)
+
+        self.reload_project(self.backend.load())
+
+    def project_entries(self):
+        if isinstance(self.backend, SqliteStore):
+            # Read on a worker through its own connection, without filling the lazy cache
+            return self.backend.entries
+
+        entries = list(self.current_data['data'].items())
+        return lambda: entries
+
+    @trace.traced()
+    def rebuild_search_index(self):
+        self.search_index.rebuild(self.project_entries())
+
+    def jump_to_result(self, stack_name, ref):
+        node = self.current_data['hierarchy'].find_name(stack_name)
+        if node is None:
+            return
+
+        index = self.sidebar_model.reveal(node)
+        self.sidebar.setCurrentIndex(index)
+        self.sidebar.scrollTo(index)
+
+        self.load_stack_content(index)
+
+        if self.active_stack_name == stack_name and hasattr(self.workspace, "reveal"):
+            self.workspace.reveal(ref, self.search_panel.field.text())
+
+    def load_session_data(self):
+        self.current_data = self.backend.load()
+
+    @trace.traced()
+    def save_workspace(self):
+        if not self.workspace:
+            return
+
+        self.current_data = self.workspace.get_data()
+
+        stack_name = self.workspace.stack_name
+        self.saver.set_content(stack_name, self.current_data['data'][stack_name].get('content'))
+
+    def workspace_changed(self, workspace):
+        stack_name = workspace.stack_name
+
+        self.saver.defer_content(stack_name, lambda: self.content_record(workspace, stack_name))
+
+    @trace.traced()
+    def content_record(self, workspace, stack_name):
+        if workspace.stack_name not in self.current_data['data']:
+            return None
+
+        if hasattr(workspace, "take_changes"):
+            record = workspace.take_changes()
+            if record:
+                record["name"] = stack_name
+
+            return record
+
+        data = workspace.get_data()
+        return {
+            "op": "content",
+            "name": stack_name,
+            "content": data['data'][workspace.stack_name].get('content')
+        }
+
+    def show_save_status(self, latency, queue_depth):
+        self.statusBar().showMessage(f"Saved in {latency:.0f} ms, {queue_depth} queued", 2000)
+
+    def update_title(self):
+        self.setWindowTitle(f"{self.session.title} - Idea Stack")
+
+    def show_exported(self, file_path):
+        session = self.pending_session
+        self.pending_session = None
 
-    def update_json(self):
-        with open("temp.json", "w", encoding="utf-8") as file:
-            json.dump(self.current_data, file, indent=4)
+        if session is not None:
+            # The saver already writes to the new file, the project it came from is left as it was
+            previous = self.session
+            self.session = session
+            self.backend = self.saver.backend
+            self.history = History(history_path(self.backend.path))
+
+            previous.discard(moved_to=session.path)
+            self.update_title()
+
+        QMessageBox.information(self, "Saved", "IdeaStack saved successfully")
+
+    def show_export_error(self, file_path, message):
+        if self.pending_session is not None:
+            self.pending_session.close()
+            self.pending_session = None
+
+        QMessageBox.critical(self, "Save Error", f"Could not save to {file_path}: {message}")
+
+    def show_save_error(self, message):
+        QMessageBox.critical(self, "Save Error", f"Could not save the project: {message}")
+
+    def closeEvent(self, event):
+        self.save_workspace()
+
+        self.saver.compact()
+        self.saver.wait()
+        self.session.close()
+
+        if trace.enabled() and os.environ.get(trace.ENV_VAR):
+            trace.export(trace.output_path())
+
+        super().closeEvent(event)
 
     def create_menubar(self):
         menubar = self.menuBar()
@@ -316,79 +847,191 @@ class IdeaStack(QMainWindow):
         open_action.triggered.connect(self.open_project)
         file_menu.addAction(open_action)
 
+        file_menu.addSeparator()
+
+        version_action = QAction("Save Version...", self)
+        version_action.setShortcut("Ctrl+Alt+S")
+        version_action.triggered.connect(self.save_version)
+        file_menu.addAction(version_action)
+
+        history_action = QAction("Version History...", self)
+        history_action.triggered.connect(lambda: self.show_history())
+        file_menu.addAction(history_action)
+
+        edit_menu = menubar.addMenu("Edit")
+
+        undo_action = QAction("Undo", self)
+        undo_action.setShortcut(QKeySequence.Undo)
+        undo_action.triggered.connect(self.undo)
+        edit_menu.addAction(undo_action)
+
+        redo_action = QAction("Redo", self)
+        redo_action.setShortcut(QKeySequence.Redo)
+        redo_action.triggered.connect(self.redo)
+        edit_menu.addAction(redo_action)
+
+        view_menu = menubar.addMenu("View")
+
+        cache_action = QAction("Workspace Cache Statistics", self)
+        cache_action.triggered.connect(self.show_cache_stats)
+        view_menu.addAction(cache_action)
+
+        view_menu.addSeparator()
+
+        self.trace_action = QAction("Record Trace", self)
+        self.trace_action.setCheckable(True)
+        self.trace_action.setChecked(trace.enabled())
+        self.trace_action.toggled.connect(trace.enable)
+        view_menu.addAction(self.trace_action)
+
+        export_trace_action = QAction("Export Trace...", self)
+        export_trace_action.triggered.connect(self.export_trace)
+        view_menu.addAction(export_trace_action)
+
+        overlay_action = QAction("Performance Overlay", self)
+        overlay_action.setCheckable(True)
+        overlay_action.toggled.connect(self.show_overlay)
+        view_menu.addAction(overlay_action)
+
+    def show_overlay(self, shown):
+        # Frame times are only collected while tracing, so the overlay turns it on
+        if shown:
+            self.trace_action.setChecked(True)
+
+        self.overlay.set_shown(shown)
+
+    def export_trace(self):
+        file_path, _ = QFileDialog.getSaveFileName(
+            self, "Export Trace", trace.DEFAULT_PATH, "Chrome Trace (*.json)"
+        )
+
+        if not file_path:
+            return
+
+        try:
+            count = trace.export(file_path)
+        except OSError as e:
+            QMessageBox.critical(self, "Export Error", f"Could not write the trace: {e}")
+            return
+
+        self.statusBar().showMessage(f"Exported {count} trace events", 2000)
+
+    def undo_scope(self):
+        # Sidebar edits are always in reach, stack edits only while that stack is open
+        return (None, self.workspace) if self.workspace else (None,)
+
+    def undo(self):
+        command = self.undo_stack.undo(self.undo_scope())
+        if command:
+            self.statusBar().showMessage(f"Undid {command.label}", 2000)
+
+    def redo(self):
+        command = self.undo_stack.redo(self.undo_scope())
+        if command:
+            self.statusBar().showMessage(f"Redid {command.label}", 2000)
+
+    def show_cache_stats(self):
+        stats = self.workspace_cache.stats()
+
+        QMessageBox.information(
+            self,
+            "Workspace Cache",
+            f"Cached workspaces: {stats['entries']}\n"
+            f"Estimated memory: {stats['cost'] / 1048576:.1f} of {stats['budget'] / 1048576:.0f} MB\n"
+            f"Hits: {stats['hits']}, misses: {stats['misses']} ({stats['hit_rate']:.0%} hit rate)\n"
+            f"Evictions: {stats['evictions']}\n"
+            f"Average rebuild: {stats['average_rebuild_ms']:.0f} ms, last: {stats['last_rebuild_ms']:.0f} ms"
+        )
+
     def save_project(self):
-        if self.workspace:
-            self.current_data = self.workspace.get_data()
-            self.update_json()
+        self.save_workspace()
 
         options = QFileDialog.Options()
         file_path, _ = QFileDialog.getSaveFileName(
-            self, "Save Project", "", "JSON Files (*.json);;All Files (*)", options=options
+            self, "Save Project", "", PROJECT_FILTER, options=options
         )
 
-        if file_path:
-            shutil.copy2("temp.json", file_path)
-            QMessageBox.information(self, "Saved", "IdeaStack saved successfully")
+        if not file_path or self.pending_session is not None:
+            return
+
+        if os.path.abspath(file_path) == self.session.path:
+            # Already written in place, only the journal is left to fold into the file
+            self.saver.compact()
+            self.saver.wait()
+            self.show_exported(file_path)
+            return
+
+        try:
+            session = ProjectSession(file_path)
+        except ProjectLocked as e:
+            QMessageBox.critical(self, "Save Error", str(e))
+            return
+
+        session.clear_sidecars()
+
+        self.pending_session = session
+        self.saver.compact()
+        self.saver.export(file_path, session.open_backend)
 
     def open_project(self):
         options = QFileDialog.Options()
         file_path, _ = QFileDialog.getOpenFileName(
-            self, "Open Project", "", "JSON Files (*.json);;All Files (*)", options=options
+            self, "Open Project", "", PROJECT_FILTER, options=options
         )
 
-        if file_path:
-            shutil.copy2(file_path, "temp.json")
-
-            with open("temp.json", "r", encoding="utf-8") as file:
-                self.current_data = json.load(file)
-
-            self.sidebar.clear()
-            self.load_sidebar()
-
-            if self.workspace:
-                self.workspace.setParent(None)
-                self.workspace.deleteLater()
-                self.workspace = None
-            self.active_stack_name = None
-
-    def load_sidebar(self):
-        for path in sorted(self.current_data["hierarchy"]):
-            parts = path.split("/")
-            parent_item = self.sidebar
-
-            for part in parts:
-                found_item = None
-
-                if parent_item == self.sidebar:
-                    count = parent_item.topLevelItemCount()
-                else:
-                    count = parent_item.childCount()
-                not_sidebar = parent_item != self.sidebar
-
-                for j in range(count):
-                    child = parent_item.child(j) if not_sidebar else parent_item.topLevelItem(j)
-                    if child.text(0) == part:
-                        found_item = child
-                        break
-
-                if found_item:
-                    parent_item = found_item
-                else:
-                    new_item = QTreeWidgetItem(parent_item, [part])
-                    parent_item = new_item
-
-    def get_full_path(self, item):
-        parts = []
-        curr = item
-        while curr:
-            parts.insert(0, curr.text(0))
-            curr = curr.parent()
-        return "/".join(parts)
+        if not file_path or os.path.abspath(file_path) == self.session.path or self.pending_session is not None:
+            return
+
+        try:
+            session = ProjectSession(file_path)
+        except ProjectLocked as e:
+            QMessageBox.critical(self, "Open Error", str(e))
+            return
+
+        self.save_workspace()
+        self.saver.compact()
+        self.saver.wait()
+
+        # Opened where it is, the file is read once and its journal is written next to it from here on
+        backend = session.open_backend()
+        try:
+            data = backend.load()
+        except (OSError, ValueError) as e:
+            session.close()
+            QMessageBox.critical(self, "Open Error", f"Could not open {file_path}: {e}")
+            return
+
+        previous = self.session
+        self.session = session
+        self.backend = backend
+
+        self.reload_project(data)
+        previous.close()
+        self.update_title()
+
+    def reload_project(self, data):
+        self.saver.backend = self.backend
+        self.history = History(history_path(self.backend.path))
+        self.current_data = data
+
+        self.sidebar_model.reset(self.current_data['hierarchy'], self.current_data['data'])
+        self.rebuild_search_index()
+
+        for workspace in self.workspace_cache.clear():
+            workspace.deleteLater()
+
+        self.undo_stack.clear()
+
+        if self.workspace:
+            self.show_placeholder(self.splitter.sizes())
 
 if __name__ == "__main__":
     app = QApplication(sys.argv)
+    timing.mark("qt application")
 
     window = IdeaStack()
     window.show()
 
+    QTimer.singleShot(0, lambda: (timing.mark("first frame"), timing.report()))
+
     sys.exit(app.exec())
@@ -1,30 +1,273 @@
-import json
+import math
+import time
+import bisect
+import threading
 
-from PyQt5.QtCore import Qt
+import numpy as np
+
+from PyQt5.QtCore import Qt, QRectF, QPointF, QTimer, pyqtSignal
 from PyQt5.QtWidgets import (
     QGraphicsView,
     QGraphicsScene,
     QGraphicsItem,
     QShortcut,
     QGraphicsProxyWidget,
-    QGraphicsWidget,
-    QGraphicsLinearLayout,
     QTextEdit,
-    QPushButton,
     QMenu,
     QGraphicsEllipseItem,
-    QGraphicsPathItem
+    QGraphicsPathItem,
+    QProgressBar
+)
+from PyQt5.QtGui import (
+    QBrush, QPen, QColor, QPainter, QKeySequence, QPainterPath,
+    QPainterPathStroker, QStaticText, QFont, QTextCursor, QPixmap
 )
-from PyQt5.QtGui import QBrush, QPen, QColor, QPainter, QKeySequence, QPainterPath
+
+from core import layout
+from core.graph import GraphIndex
+from core import trace
+from core.undo import Command, COMMAND_COST, estimate_size
+
+VERSION = "1.0.0"
 
 NODE_BG_COLOR = QColor(45, 45, 45)
+CANVAS_COLOR = QColor(30, 30, 30)
+GRID_COLOR = QColor(38, 38, 38)
+EDITOR_BG_COLOR = QColor("#222")
+EDITOR_BORDER_COLOR = QColor("#444")
+PLACEHOLDER_COLOR = QColor("#777")
 SOCKET_COLOR = QColor("#555")
+SOCKET_HIGHLIGHT_COLOR = QColor("#FFCC00")
 WIRE_COLOR = QColor("#00d627")
 WIRE_SELECTED_COLOR = QColor("#FFCC00")
 COLORS = {
     "Comment": "#4a4a4a"
 }
 
+NODE_WIDTH = 180
+HEADER_HEIGHT = 24
+BODY_HEIGHT = 100
+NODE_HEIGHT = HEADER_HEIGHT + BODY_HEIGHT
+TEXT_PADDING = 4
+
+# Screen-space distance at which a dragged wire snaps to a socket
+SNAP_RADIUS = 24
+SOCKET_CELL_SIZE = 128
+
+WIRE_WIDTH = 2
+WIRE_SELECTED_WIDTH = 3
+WIRE_BEND = 50
+
+# Wire geometry is recomputed at most once per frame while nodes are dragged
+FRAME_INTERVAL = 16
+
+GRID_SIZE = 40
+
+LAYOUT_SPACING_X = NODE_WIDTH + 80
+LAYOUT_SPACING_Y = NODE_HEIGHT + 40
+
+# Zoom levels below which text is skipped, and below which items are drawn as flat shapes
+LOD_TEXT = 0.6
+LOD_FLAT = 0.3
+
+NODE_COST = 8 * 1024
+WIRE_COST = 1024
+
+# Big graphs are built a slice at a time between frames, nearest the saved viewport first
+LOAD_SLICE_MS = 10
+LOAD_CHECK_EVERY = 16
+
+# The viewport is saved once scrolling and zooming have settled
+VIEWPORT_SAVE_MS = 1000
+
+def has_stable_ids(entries):
+    ids = [entry.get("id") for entry in entries]
+
+    return all(isinstance(item_id, int) for item_id in ids) and all(a < b for a, b in zip(ids, ids[1:]))
+
+class ChangeTracker:
+    def __init__(self, content, changed):
+        self.content = content
+        self.changed = changed
+
+        # Saved lists stay sorted by id, so entries are found by bisection and new ids append
+        self.content.setdefault("nodes", [])
+        self.content.setdefault("wires", [])
+
+        self.rewritten = False
+        self.renumber()
+
+        self.next_ids = {
+            field: max((entry["id"] for entry in self.content[field]), default=0) + 1
+            for field in ("nodes", "wires")
+        }
+        self.dirty = {"nodes": {}, "wires": {}}
+        self.values = {}
+
+    def renumber(self):
+        nodes = self.content["nodes"]
+        wires = self.content["wires"]
+
+        if not has_stable_ids(nodes):
+            new_ids = {}
+            for new_id, entry in enumerate(nodes, start=1):
+                new_ids[entry.get("id")] = new_id
+                entry["id"] = new_id
+
+            for entry in wires:
+                entry["start_node"] = new_ids.get(entry.get("start_node"))
+                entry["end_node"] = new_ids.get(entry.get("end_node"))
+
+            self.rewritten = True
+
+        if not has_stable_ids(wires):
+            for new_id, entry in enumerate(wires, start=1):
+                entry["id"] = new_id
+
+            self.rewritten = True
+
+    def new_id(self, field):
+        item_id = self.next_ids[field]
+        self.next_ids[field] += 1
+
+        return item_id
+
+    def is_clean(self):
+        return not (self.rewritten or self.dirty["nodes"] or self.dirty["wires"] or self.values)
+
+    def mark(self, field, item):
+        if self.is_clean():
+            self.changed()
+
+        self.dirty[field][item.item_id] = item
+
+    def drop(self, field, item_id):
+        if self.is_clean():
+            self.changed()
+
+        self.dirty[field][item_id] = None
+
+    def set_value(self, key, value):
+        if self.values.get(key, self.content.get(key)) == value:
+            return
+
+        if self.is_clean():
+            self.changed()
+
+        self.values[key] = value
+
+    def position(self, field, item_id):
+        entries = self.content[field]
+        position = bisect.bisect_left(entries, item_id, key=lambda entry: entry["id"])
+
+        if position < len(entries) and entries[position]["id"] == item_id:
+            return position
+
+        return None
+
+    def flush(self):
+        upsert = {}
+        remove = {}
+
+        for field, dirty in self.dirty.items():
+            entries = self.content[field]
+
+            for item_id in sorted(dirty):
+                item = dirty[item_id]
+                position = self.position(field, item_id)
+
+                if item is None:
+                    if position is not None:
+                        entries.pop(position)
+                        remove.setdefault(field, []).append(item_id)
+                    continue
+
+                # Entries are replaced rather than mutated, a queued save may still be encoding the old one
+                data = item.get_data()
+                if position is None:
+                    # New ids land at the end, items restored by undo go back to their old place
+                    entries.insert(bisect.bisect_left(entries, item_id, key=lambda entry: entry["id"]), data)
+                else:
+                    entries[position] = data
+
+                upsert.setdefault(field, []).append(data)
+
+            dirty.clear()
+
+        values = self.values
+        self.values = {}
+        self.content.update(values)
+
+        if not (upsert or remove or values):
+            return None
+
+        return {"upsert": upsert, "remove": remove, "set": values}
+
+class GraphLoader:
+    def __init__(self, stack, content, center):
+        self.stack = stack
+
+        # Copies, the tracker reorders the saved lists while the user edits during loading
+        self.entries = list(content["nodes"])
+        self.pending = {entry["id"] for entry in self.entries}
+
+        self.wires_by_node = {}
+        self.waiting_wires = set()
+        for entry in content["wires"]:
+            self.wires_by_node.setdefault(entry["start_node"], []).append(entry)
+            self.wires_by_node.setdefault(entry["end_node"], []).append(entry)
+            self.waiting_wires.add(entry["id"])
+
+        xs = np.fromiter((entry["x"] for entry in self.entries), dtype=np.float64, count=len(self.entries))
+        ys = np.fromiter((entry["y"] for entry in self.entries), dtype=np.float64, count=len(self.entries))
+        self.order = np.argsort((xs - center[0]) ** 2 + (ys - center[1]) ** 2, kind="stable").tolist()
+        self.position = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    @property
+    def done(self):
+        return self.position >= len(self.order)
+
+    def build_node(self, entry):
+        stack = self.stack
+
+        node = Node(entry["x"], entry["y"], entry["type"], entry["id"])
+        node.set_content(entry["content"])
+        stack.add_node(node)
+        self.pending.discard(entry["id"])
+
+        # A wire is built by whichever of its two nodes arrives second
+        for wire in self.wires_by_node.pop(entry["id"], ()):
+            if wire["id"] not in self.waiting_wires:
+                continue
+
+            other = wire["end_node"] if wire["start_node"] == entry["id"] else wire["start_node"]
+            if other in self.pending:
+                continue
+
+            self.waiting_wires.discard(wire["id"])
+
+            start_node = stack.node_items.get(wire["start_node"])
+            end_node = stack.node_items.get(wire["end_node"])
+
+            if start_node and end_node:
+                stack.connect_sockets(start_node.output_socket, end_node.input_socket, wire["id"])
+
+    def step(self, budget_ms=None):
+        started = time.perf_counter()
+        deadline = None if budget_ms is None else started + budget_ms / 1000
+
+        while not self.done:
+            self.build_node(self.entries[self.order[self.position]])
+            self.position += 1
+
+            if deadline is not None and self.position % LOAD_CHECK_EVERY == 0 and time.perf_counter() >= deadline:
+                break
+
+        return self.done
+
 class Socket(QGraphicsEllipseItem):
     def __init__(self, parent, is_input=True):
         super().__init__(-7, -7, 14, 14, parent)
@@ -35,11 +278,20 @@ class Socket(QGraphicsEllipseItem):
         self.setPen(QPen(Qt.transparent))
 
         self.connected_wires = []
+        self.cell = None
+
+        self.setFlag(QGraphicsItem.ItemUsesExtendedStyleOption)
 
         if is_input:
-            self.setPos(0, 50)
+            self.setPos(0, HEADER_HEIGHT + BODY_HEIGHT / 2)
         else:
-            self.setPos(180, 50)
+            self.setPos(NODE_WIDTH, HEADER_HEIGHT + BODY_HEIGHT / 2)
+
+    def paint(self, painter, option, widget):
+        if option.levelOfDetailFromTransform(painter.worldTransform()) < LOD_FLAT:
+            return
+
+        super().paint(painter, option, widget)
 
     def mousePressEvent(self, event):
         view = self.scene().views()[0]
@@ -49,176 +301,538 @@ class Socket(QGraphicsEllipseItem):
 
     def update_wires(self):
         for wire in self.connected_wires:
-            wire.update_path()
+            if wire.layer:
+                wire.layer.schedule(wire)
 
-class Wire(QGraphicsPathItem):
-    def __init__(self, start_socket, end_socket):
-        super().__init__()
+    def set_highlighted(self, highlighted):
+        self.setBrush(QBrush(SOCKET_HIGHLIGHT_COLOR if highlighted else SOCKET_COLOR))
+
+    def accepts(self, other):
+        return other is not self and other.is_input != self.is_input
+
+class SocketIndex:
+    def __init__(self, cell_size=SOCKET_CELL_SIZE):
+        self.cell_size = cell_size
+        self.cells = {}
+
+    def cell_for(self, point):
+        return (math.floor(point.x() / self.cell_size), math.floor(point.y() / self.cell_size))
+
+    def add(self, socket):
+        socket.cell = self.cell_for(socket.scenePos())
+        self.cells.setdefault(socket.cell, set()).add(socket)
+
+    def remove(self, socket):
+        bucket = self.cells.get(socket.cell)
+
+        if bucket is not None:
+            bucket.discard(socket)
+            if not bucket:
+                del self.cells[socket.cell]
+
+        socket.cell = None
+
+    def update(self, socket):
+        if socket.cell is None:
+            return
+
+        cell = self.cell_for(socket.scenePos())
+        if cell != socket.cell:
+            self.remove(socket)
+            self.add(socket)
+
+    def nearest(self, point, radius, source):
+        reach = math.ceil(radius / self.cell_size)
+        cx, cy = self.cell_for(point)
 
+        best = None
+        best_distance = radius * radius
+
+        for x in range(cx - reach, cx + reach + 1):
+            for y in range(cy - reach, cy + reach + 1):
+                for socket in self.cells.get((x, y), ()):
+                    if not source.accepts(socket):
+                        continue
+
+                    position = socket.scenePos()
+                    distance = (position.x() - point.x()) ** 2 + (position.y() - point.y()) ** 2
+
+                    if distance <= best_distance:
+                        best = socket
+                        best_distance = distance
+
+        return best
+
+def wire_path(p1, p2):
+    path = QPainterPath()
+    path.moveTo(p1)
+    path.cubicTo(p1.x() + WIRE_BEND, p1.y(), p2.x() - WIRE_BEND, p2.y(), p2.x(), p2.y())
+
+    return path
+
+class Wire:
+    def __init__(self, start_socket, end_socket, wire_id=None):
         self.start_socket = start_socket
         self.end_socket = end_socket
-        self.setPen(QPen(WIRE_COLOR, 2))
+        self.item_id = wire_id
 
-        self.setFlags(QGraphicsItem.ItemIsSelectable | QGraphicsItem.ItemIsFocusable)
-        self.setZValue(-1)
+        self.layer = None
+        self.hit_shape = None
 
         self.update_path()
 
-    def keyPressEvent(self, event):
-        if event.key() in (Qt.Key_Delete, Qt.Key_Backspace):
-            self.remove_self()
-        else:
-            super().keyPressEvent(event)
-
     def remove_self(self):
-        scene = self.scene()
-
         if self.start_socket and self in self.start_socket.connected_wires:
             self.start_socket.connected_wires.remove(self)
         if self.end_socket and self in self.end_socket.connected_wires:
             self.end_socket.connected_wires.remove(self)
 
-        if scene:
-            scene.removeItem(self)
+        if self.layer:
+            self.layer.remove(self)
 
     def update_path(self):
-        path = QPainterPath()
+        self.p1 = self.start_socket.scenePos()
+        self.p2 = self.end_socket.scenePos()
+
+        self.path = wire_path(self.p1, self.p2)
+        self.bounds = self.path.controlPointRect().adjusted(
+            -WIRE_SELECTED_WIDTH, -WIRE_SELECTED_WIDTH, WIRE_SELECTED_WIDTH, WIRE_SELECTED_WIDTH
+        )
+        self.hit_shape = None
+
+    def contains(self, point):
+        if not self.bounds.contains(point):
+            return False
+
+        if self.hit_shape is None:
+            stroker = QPainterPathStroker()
+            stroker.setWidth(WIRE_SELECTED_WIDTH)
+            self.hit_shape = stroker.createStroke(self.path)
+
+        return self.hit_shape.contains(point)
+
+    def get_data(self):
+        return {
+            "id": self.item_id,
+            "start_node": self.start_socket.parentItem().item_id,
+            "end_node": self.end_socket.parentItem().item_id
+        }
+
+class WireLayer(QGraphicsItem):
+    def __init__(self):
+        super().__init__()
+
+        # Insertion ordered, so later wires paint over earlier ones like separate items did
+        self.wires = {}
+        self.wires_by_id = {}
+        self.selected_wires = set()
+        self.focus_wire = None
+
+        self.bounds = QRectF()
+        self.dirty = set()
+        self.stack = None
+
+        self.pen = QPen(WIRE_COLOR, WIRE_WIDTH)
+        self.selected_pen = QPen(WIRE_SELECTED_COLOR, WIRE_SELECTED_WIDTH)
+
+        self.frame_timer = QTimer()
+        self.frame_timer.setSingleShot(True)
+        self.frame_timer.setInterval(FRAME_INTERVAL)
+        self.frame_timer.timeout.connect(self.flush)
+
+        self.setFlags(
+            QGraphicsItem.ItemIsSelectable |
+            QGraphicsItem.ItemIsFocusable |
+            QGraphicsItem.ItemUsesExtendedStyleOption
+        )
+        self.setZValue(-1)
+
+    def __len__(self):
+        return len(self.wires)
+
+    def __iter__(self):
+        return iter(self.wires)
+
+    def boundingRect(self):
+        return self.bounds
+
+    def grow(self, rect):
+        if not self.bounds.contains(rect):
+            self.prepareGeometryChange()
+            self.bounds = self.bounds.united(rect)
+
+    def add(self, wire):
+        wire.layer = self
+        self.wires[wire] = None
+        self.wires_by_id[wire.item_id] = wire
+
+        self.grow(wire.bounds)
+        self.update(wire.bounds)
+
+    def remove(self, wire):
+        if self.wires.pop(wire, False) is not False:
+            self.wires_by_id.pop(wire.item_id, None)
+            self.update(wire.bounds)
+
+            if self.stack:
+                self.stack.tracker.drop("wires", wire.item_id)
+                self.stack.graph.remove_edge(wire.item_id)
+
+        self.dirty.discard(wire)
+        self.selected_wires.discard(wire)
+        wire.layer = None
 
-        p1 = self.start_socket.scenePos()
-        p2 = self.end_socket.scenePos()
+        if self.focus_wire is wire:
+            self.focus_wire = None
+        if not self.selected_wires and self.isSelected():
+            self.setSelected(False)
 
-        path.moveTo(p1)
+    def schedule(self, wire):
+        self.dirty.add(wire)
 
-        path.cubicTo(p1.x() + 50, p1.y(), p2.x() - 50, p2.y(), p2.x(), p2.y())
-        self.setPath(path)
+        if not self.frame_timer.isActive():
+            self.frame_timer.start()
+
+    def flush(self):
+        if not self.dirty:
+            return
+
+        region = QRectF()
+        for wire in self.dirty:
+            region = region.united(wire.bounds)
+            wire.update_path()
+            region = region.united(wire.bounds)
+
+        self.dirty.clear()
+
+        self.grow(region)
+        self.update(region)
+
+    def wire_at(self, point):
+        for wire in reversed(self.wires):
+            if wire.contains(point):
+                return wire
+
+        return None
+
+    def contains(self, point):
+        return self.wire_at(point) is not None
 
     def paint(self, painter, option, widget):
-        if self.isSelected():
-            self.setPen(QPen(WIRE_SELECTED_COLOR, 3))
+        exposed = option.exposedRect
+        flat = option.levelOfDetailFromTransform(painter.worldTransform()) < LOD_FLAT
+
+        painter.setBrush(Qt.NoBrush)
+
+        for wire in self.wires:
+            if not exposed.intersects(wire.bounds):
+                continue
+
+            painter.setPen(self.selected_pen if wire in self.selected_wires else self.pen)
+
+            if flat:
+                painter.drawLine(wire.p1, wire.p2)
+            else:
+                painter.drawPath(wire.path)
+
+    def select_wire(self, wire, toggle=False):
+        if toggle and wire in self.selected_wires:
+            self.selected_wires.discard(wire)
+        elif toggle:
+            self.selected_wires.add(wire)
         else:
-            self.setPen(QPen(WIRE_COLOR, 2))
+            for selected in self.selected_wires:
+                self.update(selected.bounds)
+            self.selected_wires = {wire}
 
-        super().paint(painter, option, widget)
+        self.update(wire.bounds)
+
+    def itemChange(self, change, value):
+        if change == QGraphicsItem.ItemSelectedHasChanged and not value:
+            for wire in self.selected_wires:
+                self.update(wire.bounds)
+            self.selected_wires.clear()
+
+        return super().itemChange(change, value)
 
     def mousePressEvent(self, event):
+        wire = self.wire_at(event.pos())
+        if wire is None:
+            event.ignore()
+            return
+
+        self.focus_wire = wire
         self.setFocus()
+
+        if event.modifiers() & Qt.ControlModifier:
+            self.select_wire(wire, toggle=True)
+            self.setSelected(bool(self.selected_wires))
+            event.accept()
+            return
+
+        self.select_wire(wire)
         super().mousePressEvent(event)
 
-class Node(QGraphicsWidget):
-    def __init__(self, x, y, node_type="Comment"):
+    def keyPressEvent(self, event):
+        if event.key() in (Qt.Key_Delete, Qt.Key_Backspace) and self.focus_wire:
+            if self.stack:
+                self.stack.delete_wires([self.focus_wire])
+            else:
+                self.focus_wire.remove_self()
+        else:
+            super().keyPressEvent(event)
+
+class NodeEditor(QTextEdit):
+    def __init__(self, node):
         super().__init__()
 
+        self.node = node
+
+        self.setPlaceholderText("Enter content...")
+        self.setFixedSize(NODE_WIDTH, BODY_HEIGHT)
+        self.setStyleSheet("""
+            background-color: #222;
+            color: white;
+            border: 1px solid #444;
+        """)
+
+    def focusOutEvent(self, event):
+        super().focusOutEvent(event)
+
+        if event.reason() != Qt.PopupFocusReason:
+            self.node.end_edit()
+
+class Node(QGraphicsItem):
+    def __init__(self, x, y, node_type="Comment", node_id=None):
+        super().__init__()
+
+        self.item_id = node_id
         self.node_type = node_type
+        self.content = ""
+
+        self.text_cache = QStaticText()
+        self.text_cache.setTextFormat(Qt.PlainText)
+        self.text_cache.setTextWidth(NODE_WIDTH - 2 * TEXT_PADDING)
+
+        self.editor = None
+        self.proxy_editor = None
+        self.stack = None
 
         self.setPos(x, y)
         self.setFlags(
             QGraphicsItem.ItemIsMovable |
             QGraphicsItem.ItemIsSelectable |
             QGraphicsItem.ItemIsFocusable |
-            QGraphicsItem.ItemSendsScenePositionChanges
+            QGraphicsItem.ItemSendsScenePositionChanges |
+            QGraphicsItem.ItemUsesExtendedStyleOption
+        )
+        self.setCacheMode(QGraphicsItem.DeviceCoordinateCache)
+
+        self.input_socket = Socket(self, is_input=True)
+        self.output_socket = Socket(self, is_input=False)
+
+    def boundingRect(self):
+        return QRectF(0, 0, NODE_WIDTH, NODE_HEIGHT)
+
+    def header_rect(self):
+        return QRectF(0, 0, NODE_WIDTH, HEADER_HEIGHT)
+
+    def body_rect(self):
+        return QRectF(0, HEADER_HEIGHT, NODE_WIDTH, BODY_HEIGHT)
+
+    def paint(self, painter, option, widget):
+        color = WIRE_SELECTED_COLOR if self.isSelected() else QColor(COLORS[self.node_type])
+        lod = option.levelOfDetailFromTransform(painter.worldTransform())
+
+        if lod < LOD_FLAT:
+            painter.fillRect(self.header_rect(), color)
+            painter.fillRect(self.body_rect(), EDITOR_BG_COLOR)
+            return
+
+        header_font = QFont(painter.font())
+        header_font.setBold(True)
+
+        painter.save()
+        painter.setFont(header_font)
+        painter.setPen(color)
+        painter.drawText(
+            self.header_rect().adjusted(TEXT_PADDING, 0, 0, 0),
+            Qt.AlignLeft | Qt.AlignVCenter,
+            self.node_type.upper()
         )
+        painter.restore()
 
-        self.layout = QGraphicsLinearLayout(Qt.Vertical)
-        self.setLayout(self.layout)
+        body = self.body_rect()
+        if self.proxy_editor or not option.exposedRect.intersects(body):
+            return
 
-        self.type_button = QPushButton(f"{self.node_type.upper()}")
-        self.type_button.setStyleSheet("""
-            QPushButton {
-                color: #4a4a4a;
-                border: 0;
-            }
-        """)
-        self.type_button.clicked.connect(self.show_type_menu)
-        self.type_button.setFocusPolicy(Qt.NoFocus)
+        painter.setPen(QPen(EDITOR_BORDER_COLOR, 1))
+        painter.setBrush(QBrush(EDITOR_BG_COLOR))
+        painter.drawRect(body)
 
-        self.proxy_type = QGraphicsProxyWidget(self)
-        self.proxy_type.setWidget(self.type_button)
-        self.layout.addItem(self.proxy_type)
+        if lod < LOD_TEXT:
+            return
 
-        self.editor = QTextEdit()
-        self.editor.setPlaceholderText("Enter content...")
-        self.editor.setFixedSize(180, 100)
-        self.editor.setStyleSheet("""
-            background-color: #222;
-            color: white;
-            border: 1px solid #444;
-        """)
+        painter.save()
+        painter.setClipRect(body)
+
+        position = body.topLeft() + QPointF(TEXT_PADDING, TEXT_PADDING)
+        if self.content:
+            painter.setPen(Qt.white)
+            painter.drawStaticText(position, self.text_cache)
+        else:
+            painter.setPen(PLACEHOLDER_COLOR)
+            painter.drawText(body.adjusted(TEXT_PADDING, TEXT_PADDING, 0, 0), Qt.AlignLeft | Qt.AlignTop, "Enter content...")
+
+        painter.restore()
+
+    def text(self):
+        if self.editor:
+            return self.editor.toPlainText()
+
+        return self.content
+
+    def set_content(self, text):
+        self.content = text
+        self.text_cache.setText(text)
+
+        self.update()
+
+    def begin_edit(self):
+        if self.proxy_editor:
+            return
+
+        self.edit_start = self.content
+
+        self.editor = NodeEditor(self)
+        self.editor.setPlainText(self.content)
+        self.editor.moveCursor(QTextCursor.End)
+        self.editor.textChanged.connect(self.changed)
 
         self.proxy_editor = QGraphicsProxyWidget(self)
         self.proxy_editor.setWidget(self.editor)
-        self.layout.addItem(self.proxy_editor)
+        self.proxy_editor.setPos(0, HEADER_HEIGHT)
 
-        self.setAutoFillBackground(False)
+        self.update()
 
-        self.update_type()
+        self.proxy_editor.setFocus()
+        self.editor.setFocus()
 
-        self.input_socket = Socket(self, is_input=True)
-        self.output_socket = Socket(self, is_input=False)
+    def end_edit(self):
+        if not self.proxy_editor:
+            return
 
-    def show_type_menu(self):
+        self.set_content(self.editor.toPlainText())
+
+        if self.stack and self.content != self.edit_start:
+            self.stack.record_change(self, "content", self.edit_start, self.content)
+
+        # Deleted later because this runs inside the editor's own focus-out handler
+        self.proxy_editor.hide()
+        self.proxy_editor.deleteLater()
+
+        self.proxy_editor = None
+        self.editor = None
+
+    def show_type_menu(self, screen_pos):
         menu = QMenu()
         menu.addAction("Comment")
 
-        action = menu.exec_(self.type_button.mapToGlobal(self.type_button.rect().bottomLeft()))
+        action = menu.exec_(screen_pos)
+
+        if action and action.text() != self.node_type:
+            if self.stack:
+                self.stack.record_change(self, "type", self.node_type, action.text())
 
-        if action:
             self.node_type = action.text()
-            self.type_button.setText(self.node_type.upper())
+            self.update()
+            self.changed()
 
-            self.update_type()
+    def changed(self):
+        if self.stack:
+            self.stack.tracker.mark("nodes", self)
 
     def itemChange(self, change, value):
         if change == QGraphicsItem.ItemPositionHasChanged:
-            if hasattr(self, 'input_socket'):
-                self.input_socket.update_wires()
-            if hasattr(self, 'output_socket'):
-                self.output_socket.update_wires()
+            self.input_socket.update_wires()
+            self.output_socket.update_wires()
+
+            if self.stack:
+                self.stack.socket_index.update(self.input_socket)
+                self.stack.socket_index.update(self.output_socket)
+                self.changed()
 
         elif change == QGraphicsItem.ItemSelectedHasChanged:
-            color = "#FFCC00" if value else COLORS[self.node_type]
-            self.type_button.setStyleSheet(f"color: {color}; background: transparent; text-align: left; border: 0; font-weight: bold;")
+            self.update()
 
         return super().itemChange(change, value)
 
-    def update_type(self):
-        color = COLORS[self.node_type]
-
-        self.type_button.setStyleSheet(f"""
-            color: {color};
-            background: transparent;
-            text-align: left;
-            border: 0;
-            font-weight: bold;
-        """)
-
     def mousePressEvent(self, event):
+        if event.button() == Qt.LeftButton and self.body_rect().contains(event.pos()):
+            self.begin_edit()
+            event.accept()
+            return
+
         self.setFocus()
         super().mousePressEvent(event)
 
+    def mouseReleaseEvent(self, event):
+        clicked = event.scenePos() == event.buttonDownScenePos(Qt.LeftButton)
+
+        super().mouseReleaseEvent(event)
+
+        if event.button() == Qt.LeftButton and clicked and self.header_rect().contains(event.pos()):
+            self.show_type_menu(event.screenPos())
+
     def keyPressEvent(self, event):
         if event.key() in (Qt.Key_Delete, Qt.Key_Backspace):
-            self.remove_self()
+            if self.stack:
+                self.stack.delete_nodes([self])
+            else:
+                self.remove_self()
         else:
             super().keyPressEvent(event)
 
+    def set_field(self, field, value):
+        if field == "content":
+            self.set_content(value)
+        else:
+            self.node_type = value
+            self.update()
+
+        self.changed()
+
     def remove_self(self):
         all_wires = self.input_socket.connected_wires + self.output_socket.connected_wires
 
         for wire in all_wires[:]:
             wire.remove_self()
+
+        if self.stack:
+            self.stack.socket_index.remove(self.input_socket)
+            self.stack.socket_index.remove(self.output_socket)
+            self.stack.tracker.drop("nodes", self.item_id)
+            self.stack.graph.remove_node(self.item_id)
+            self.stack.node_items.pop(self.item_id, None)
+            self.stack = None
+
         if self.scene():
             self.scene().removeItem(self)
 
     def get_data(self):
         return {
-            "id": id(self),
+            "id": self.item_id,
             "type": self.node_type,
             "x": self.x(),
             "y": self.y(),
-            "content": self.editor.toPlainText()
+            "content": self.text()
         }
 
 class Stack(QGraphicsView):
+    save_requested = pyqtSignal()
+    content_changed = pyqtSignal()
+    layout_ready = pyqtSignal(int, object, object)
+
     def __init__(self, stack_name: str, current_data: dict = None):
         super().__init__()
 
@@ -228,9 +842,15 @@ class Stack(QGraphicsView):
         self.scene = QGraphicsScene(-5000, -5000, 10000, 10000)
         self.setScene(self.scene)
 
-        self.setBackgroundBrush(QBrush(QColor(30, 30, 30)))
+        self.scene.setItemIndexMethod(QGraphicsScene.BspTreeIndex)
+
+        self.setBackgroundBrush(QBrush(CANVAS_COLOR))
         self.setRenderHint(QPainter.Antialiasing)
 
+        self.grid_tile = self.create_grid_tile()
+        self.setCacheMode(QGraphicsView.CacheBackground)
+        self.setViewportUpdateMode(QGraphicsView.SmartViewportUpdate)
+
         self.setTransformationAnchor(QGraphicsView.AnchorUnderMouse)
         self.setResizeAnchor(QGraphicsView.AnchorUnderMouse)
         self.setDragMode(QGraphicsView.ScrollHandDrag)
@@ -238,48 +858,267 @@ class Stack(QGraphicsView):
         self.node_shortcut = QShortcut(QKeySequence("Ctrl+T"), self)
         self.node_shortcut.activated.connect(self.add_node_at_center)
 
-        self.active_wire = None
+        self.wire_layer = WireLayer()
+        self.scene.addItem(self.wire_layer)
+
+        self.socket_index = SocketIndex()
+
+        self.graph = GraphIndex()
+        self.node_items = {}
+
+        self.preview_wire = None
         self.start_socket = None
+        self.snap_socket = None
+
+        # Set by main, node edits are recorded by id so they survive a node being deleted and restored
+        self.undo_stack = None
+        self.drag_start = None
 
         self.save_shortcut = QShortcut(QKeySequence("Ctrl+S"), self)
         self.save_shortcut.activated.connect(self.save_to_file)
 
+        self.layered_shortcut = QShortcut(QKeySequence("Ctrl+L"), self)
+        self.layered_shortcut.activated.connect(lambda: self.arrange("layered"))
+        self.force_shortcut = QShortcut(QKeySequence("Ctrl+Shift+L"), self)
+        self.force_shortcut.activated.connect(lambda: self.arrange("force"))
+
+        self.downstream_shortcut = QShortcut(QKeySequence("Ctrl+Shift+Down"), self)
+        self.downstream_shortcut.activated.connect(lambda: self.select_related(self.graph.downstream))
+        self.upstream_shortcut = QShortcut(QKeySequence("Ctrl+Shift+Up"), self)
+        self.upstream_shortcut.activated.connect(lambda: self.select_related(self.graph.upstream))
+        self.cycle_shortcut = QShortcut(QKeySequence("Ctrl+Shift+C"), self)
+        self.cycle_shortcut.activated.connect(self.select_cycle)
+
+        # Results from a superseded layout run are ignored
+        self.layout_generation = 0
+        self.layout_ready.connect(self.apply_layout)
+
+        self.loader = None
+        self.load_timer = QTimer(self)
+        self.load_timer.timeout.connect(self.load_step)
+
+        self.load_progress = QProgressBar(self)
+        self.load_progress.setFormat("Loading nodes %v of %m")
+        self.load_progress.setFixedWidth(240)
+        self.load_progress.hide()
+
+        self.saved_center = None
+        self.viewport_timer = QTimer(self)
+        self.viewport_timer.setSingleShot(True)
+        self.viewport_timer.setInterval(VIEWPORT_SAVE_MS)
+        self.viewport_timer.timeout.connect(self.save_viewport)
+
         self.load_previous_data()
 
+        # Through a lambda, start() would take the scroll value as its interval
+        self.horizontalScrollBar().valueChanged.connect(lambda: self.viewport_timer.start())
+        self.verticalScrollBar().valueChanged.connect(lambda: self.viewport_timer.start())
+
     def add_node_at_center(self):
         center_point = self.mapToScene(self.viewport().rect().center())
         new_node = Node(center_point.x(), center_point.y())
 
-        self.scene.addItem(new_node)
+        self.add_node(new_node)
+
+        state = [new_node.get_data()]
+        self.record(
+            "Add node",
+            lambda: self.remove_nodes([state[0]["id"]]),
+            lambda: self.restore_nodes(state, [])
+        )
+
+    def record(self, label, undo, redo, cost=COMMAND_COST):
+        if self.undo_stack is not None:
+            self.undo_stack.push(Command(label, undo, redo, owner=self, cost=cost))
+
+    def record_change(self, node, field, old, new):
+        node_id = node.item_id
+
+        def set_field(value):
+            node = self.node_items.get(node_id)
+            if node:
+                node.set_field(field, value)
+
+        self.record(f"Edit node {field}", lambda: set_field(old), lambda: set_field(new), cost=COMMAND_COST + 2 * (len(old) + len(new)))
+
+    def restore_nodes(self, nodes, wires):
+        for entry in nodes:
+            node = Node(entry["x"], entry["y"], entry["type"], entry["id"])
+            node.set_content(entry["content"])
+
+            self.add_node(node)
+            node.changed()
+
+        self.restore_wires(wires)
+
+    def restore_wires(self, wires):
+        for entry in wires:
+            start_node = self.node_items.get(entry["start_node"])
+            end_node = self.node_items.get(entry["end_node"])
+
+            if start_node and end_node:
+                wire = self.connect_sockets(start_node.output_socket, end_node.input_socket, entry["id"])
+                self.tracker.mark("wires", wire)
+
+    def remove_nodes(self, node_ids):
+        for node_id in node_ids:
+            node = self.node_items.get(node_id)
+            if node:
+                node.remove_self()
+
+    def remove_wires(self, wire_ids):
+        for wire_id in wire_ids:
+            wire = self.wire_layer.wires_by_id.get(wire_id)
+            if wire is not None:
+                wire.remove_self()
+
+    def delete_nodes(self, nodes):
+        # Wires to nodes that are not built yet would be missed by the undo state
+        self.finish_loading()
+
+        wires = {}
+        for node in nodes:
+            for wire in node.input_socket.connected_wires + node.output_socket.connected_wires:
+                wires[wire.item_id] = wire.get_data()
+
+        states = [node.get_data() for node in nodes]
+        wires = list(wires.values())
+
+        for node in nodes:
+            node.remove_self()
+
+        node_ids = [entry["id"] for entry in states]
+        self.record(
+            "Delete node",
+            lambda: self.restore_nodes(states, wires),
+            lambda: self.remove_nodes(node_ids),
+            cost=estimate_size([states, wires])
+        )
+
+    def delete_wires(self, wires):
+        states = [wire.get_data() for wire in wires]
+
+        for wire in wires:
+            wire.remove_self()
+
+        wire_ids = [entry["id"] for entry in states]
+        self.record("Delete wire", lambda: self.restore_wires(states), lambda: self.remove_wires(wire_ids))
+
+    def positions(self, node_ids):
+        return {node_id: (self.node_items[node_id].x(), self.node_items[node_id].y()) for node_id in node_ids}
+
+    def set_positions(self, positions):
+        # Moving many nodes at once is cheaper with the BSP tree rebuilt once at the end
+        self.scene.setItemIndexMethod(QGraphicsScene.NoIndex)
+        self.setUpdatesEnabled(False)
+
+        for node_id, (x, y) in positions.items():
+            node = self.node_items.get(node_id)
+            if node:
+                node.setPos(x, y)
+
+        self.setUpdatesEnabled(True)
+        self.resume_index()
+
+    def resume_index(self):
+        # The BSP tree is left off until a progressive load has built every node
+        if self.loader is None:
+            self.scene.setItemIndexMethod(QGraphicsScene.BspTreeIndex)
+
+    def record_move(self, label, old_positions, new_positions):
+        moved = [node_id for node_id, position in new_positions.items() if old_positions.get(node_id) != position]
+        if not moved:
+            return
+
+        old_positions = {node_id: old_positions[node_id] for node_id in moved if node_id in old_positions}
+        new_positions = {node_id: new_positions[node_id] for node_id in moved}
+
+        self.record(
+            label,
+            lambda: self.set_positions(old_positions),
+            lambda: self.set_positions(new_positions),
+            cost=COMMAND_COST + 64 * len(moved)
+        )
+
+    def add_node(self, node):
+        self.scene.addItem(node)
+
+        node.stack = self
+        self.socket_index.add(node.input_socket)
+        self.socket_index.add(node.output_socket)
+
+        if node.item_id is None:
+            node.item_id = self.tracker.new_id("nodes")
+            node.changed()
+
+        self.node_items[node.item_id] = node
+        self.graph.add_node(node.item_id)
+
+    def connect_sockets(self, start_socket, end_socket, wire_id=None):
+        wire = Wire(start_socket, end_socket, wire_id)
+
+        start_socket.connected_wires.append(wire)
+        end_socket.connected_wires.append(wire)
+
+        # Numbered before it joins the layer, which keeps wires by id
+        if wire.item_id is None:
+            wire.item_id = self.tracker.new_id("wires")
+            self.tracker.mark("wires", wire)
+
+        self.wire_layer.add(wire)
+
+        self.graph.add_edge(wire.item_id, start_socket.parentItem().item_id, end_socket.parentItem().item_id)
+
+        return wire
 
     def make_connection(self, end_socket):
-        self.active_wire.end_socket = end_socket
+        start_socket = self.start_socket
+
+        # Wires are stored output to input, whichever end the drag started from
+        if start_socket.is_input:
+            start_socket, end_socket = end_socket, start_socket
 
-        self.start_socket.connected_wires.append(self.active_wire)
-        end_socket.connected_wires.append(self.active_wire)
+        wire = self.connect_sockets(start_socket, end_socket)
 
-        self.active_wire.update_path()
+        state = [wire.get_data()]
+        self.record("Connect", lambda: self.remove_wires([state[0]["id"]]), lambda: self.restore_wires(state))
+
+        return wire
 
     def start_connection(self, socket):
         self.setDragMode(QGraphicsView.NoDrag)
 
         self.start_socket = socket
-        self.active_wire = Wire(socket, socket)
 
-        self.scene.addItem(self.active_wire)
+        self.preview_wire = QGraphicsPathItem(wire_path(socket.scenePos(), socket.scenePos()))
+        self.preview_wire.setPen(QPen(WIRE_COLOR, WIRE_WIDTH))
+        self.preview_wire.setZValue(-1)
+
+        self.scene.addItem(self.preview_wire)
+
+    def find_snap_socket(self, scene_pos):
+        return self.socket_index.nearest(scene_pos, SNAP_RADIUS / self.zoom(), self.start_socket)
+
+    def set_snap_socket(self, socket):
+        if socket is self.snap_socket:
+            return
+
+        if self.snap_socket:
+            self.snap_socket.set_highlighted(False)
+        if socket:
+            socket.set_highlighted(True)
+
+        self.snap_socket = socket
 
     def mouseMoveEvent(self, event):
-        if self.active_wire:
+        if self.preview_wire:
             mouse_scene_pos = self.mapToScene(event.pos())
 
-            path = QPainterPath()
-            p1 = self.start_socket.scenePos()
-            p2 = mouse_scene_pos
-            path.moveTo(p1)
-
-            path.cubicTo(p1.x() + 50, p1.y(), p2.x() - 50, p2.y(), p2.x(), p2.y())
+            self.set_snap_socket(self.find_snap_socket(mouse_scene_pos))
+            if self.snap_socket:
+                mouse_scene_pos = self.snap_socket.scenePos()
 
-            self.active_wire.setPath(path)
+            self.preview_wire.setPath(wire_path(self.start_socket.scenePos(), mouse_scene_pos))
         else:
             super().mouseMoveEvent(event)
 
@@ -290,33 +1129,152 @@ class Stack(QGraphicsView):
                 self.scene.focusItem().clearFocus()
         super().mousePressEvent(event)
 
+        # Taken after the press so a node picked up by this click is part of the drag
+        if event.button() == Qt.LeftButton:
+            self.drag_start = self.positions(self.selected_ids())
+
     def mouseReleaseEvent(self, event):
         self.setDragMode(QGraphicsView.ScrollHandDrag)
 
-        if self.active_wire:
-            scene_pos = self.mapToScene(event.pos())
-            items = self.scene.items(scene_pos)
-
-            target_socket = None
-            for item in items:
-                if isinstance(item, Socket) and item != self.start_socket:
-                    target_socket = item
-                    break
-
-            if target_socket and target_socket.is_input != self.start_socket.is_input:
+        if self.preview_wire:
+            target_socket = self.find_snap_socket(self.mapToScene(event.pos()))
+            if target_socket:
                 self.make_connection(target_socket)
 
-            else:
-                self.scene.removeItem(self.active_wire)
-
-            if self.active_wire:
-                self.active_wire.setAcceptedMouseButtons(Qt.LeftButton | Qt.RightButton)
+            self.set_snap_socket(None)
+            self.scene.removeItem(self.preview_wire)
 
-            self.active_wire = None
+            self.preview_wire = None
             self.start_socket = None
 
         super().mouseReleaseEvent(event)
 
+        if self.drag_start is not None:
+            drag_start, self.drag_start = self.drag_start, None
+            self.record_move("Move nodes", drag_start, self.positions(drag_start.keys() & self.node_items.keys()))
+
+    def nodes(self):
+        return list(self.node_items.values())
+
+    def selected_ids(self):
+        return [item.item_id for item in self.scene.selectedItems() if isinstance(item, Node)]
+
+    def select_ids(self, node_ids):
+        for node_id in node_ids:
+            self.node_items[node_id].setSelected(True)
+
+    def select_related(self, query):
+        self.finish_loading()
+
+        selected = self.selected_ids()
+        self.select_ids(query(*selected) - set(selected))
+
+    def reveal(self, ref, query):
+        if not (isinstance(ref, tuple) and ref[0] == "node"):
+            return
+
+        if ref[1] not in self.node_items:
+            self.finish_loading()
+
+        node = self.node_items.get(ref[1])
+        if node:
+            self.scene.clearSelection()
+            node.setSelected(True)
+            self.centerOn(node)
+
+    def select_cycle(self):
+        self.finish_loading()
+
+        cycle = self.graph.find_cycle()
+        if not cycle:
+            return
+
+        self.scene.clearSelection()
+        self.select_ids(cycle)
+        self.centerOn(self.node_items[cycle[0]])
+
+    def arrange(self, mode):
+        self.finish_loading()
+
+        nodes = self.nodes()
+        if not nodes:
+            return
+
+        index = {node: position for position, node in enumerate(nodes)}
+        edges = [
+            (index[wire.start_socket.parentItem()], index[wire.end_socket.parentItem()])
+            for wire in self.wire_layer
+        ]
+        positions = [(node.x(), node.y()) for node in nodes]
+
+        self.layout_generation += 1
+        generation = self.layout_generation
+
+        def run():
+            with trace.span("layout.arrange", "layout", mode=mode, nodes=len(positions)):
+                result = layout.arrange(mode, positions, edges, LAYOUT_SPACING_X, LAYOUT_SPACING_Y)
+            self.layout_ready.emit(generation, nodes, result)
+
+        threading.Thread(target=run, daemon=True).start()
+
+    @trace.traced("nodes.apply_layout", "layout")
+    def apply_layout(self, generation, nodes, positions):
+        if generation != self.layout_generation:
+            return
+
+        left, top = positions.min(axis=0)
+        right, bottom = positions.max(axis=0)
+        self.scene.setSceneRect(self.scene.sceneRect().united(
+            QRectF(left, top, right - left + NODE_WIDTH, bottom - top + NODE_HEIGHT).adjusted(-1000, -1000, 1000, 1000)
+        ))
+
+        new_positions = {
+            node.item_id: (x, y)
+            for node, (x, y) in zip(nodes, positions.tolist()) if node.stack is self
+        }
+        old_positions = self.positions(new_positions)
+
+        self.set_positions(new_positions)
+        self.record_move("Arrange nodes", old_positions, new_positions)
+
+    def paintEvent(self, event):
+        if not trace.enabled():
+            super().paintEvent(event)
+            return
+
+        started = time.perf_counter()
+
+        with trace.span("nodes.paint", "paint"):
+            super().paintEvent(event)
+
+        trace.frame((time.perf_counter() - started) * 1000)
+        trace.counter("nodes.items", **self.item_counts())
+
+    def item_counts(self):
+        return {"nodes": len(self.node_items), "wires": len(self.wire_layer)}
+
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+
+        self.load_progress.move(8, self.height() - self.load_progress.height() - 8)
+
+    def showEvent(self, event):
+        super().showEvent(event)
+
+        # Centered once the view has its real size, centering before that lands off by half the difference
+        if self.saved_center is not None:
+            self.centerOn(*self.saved_center)
+            self.saved_center = None
+            self.viewport_timer.stop()
+
+    def viewport_state(self):
+        center = self.mapToScene(self.viewport().rect().center())
+        return {"x": round(center.x()), "y": round(center.y()), "zoom": round(self.zoom(), 3)}
+
+    def save_viewport(self):
+        if self.saved_center is None and self.isVisible():
+            self.tracker.set_value("viewport", self.viewport_state())
+
     def wheelEvent(self, event):
         zoom_in_factor = 1.25
         zoom_out_factor = 1 / zoom_in_factor
@@ -326,53 +1284,121 @@ class Stack(QGraphicsView):
         else:
             self.scale(zoom_out_factor, zoom_out_factor)
 
-    def load_previous_data(self):
-        data = self.current_data["data"][self.stack_name].get("content")
+        self.setRenderHint(QPainter.Antialiasing, self.zoom() >= LOD_FLAT)
+        self.viewport_timer.start()
+
+    def zoom(self):
+        return self.transform().m11()
+
+    def create_grid_tile(self):
+        tile = QPixmap(GRID_SIZE, GRID_SIZE)
+        tile.fill(CANVAS_COLOR)
+
+        painter = QPainter(tile)
+        painter.setPen(QPen(GRID_COLOR, 1))
+        painter.drawLine(0, 0, GRID_SIZE, 0)
+        painter.drawLine(0, 0, 0, GRID_SIZE)
+        painter.end()
+
+        return tile
+
+    def drawBackground(self, painter, rect):
+        painter.fillRect(rect, self.backgroundBrush())
 
-        if not data:
+        if self.zoom() < LOD_TEXT:
             return
 
-        id_map = {}
-        for n_data in data.get("nodes", []):
-            node = Node(n_data["x"], n_data["y"], n_data["type"])
-            node.editor.setPlainText(n_data["content"])
-            self.scene.addItem(node)
+        offset = QPointF(rect.left() % GRID_SIZE, rect.top() % GRID_SIZE)
+        painter.drawTiledPixmap(rect, self.grid_tile, offset)
 
-            id_map[n_data["id"]] = node
+    @trace.traced("nodes.load", "load")
+    def load_previous_data(self):
+        data = self.current_data["data"][self.stack_name].get("content") or {}
 
-        for w_data in data.get("wires", []):
-            start_node = id_map.get(w_data["start_node"])
-            end_node = id_map.get(w_data["end_node"])
+        self.tracker = ChangeTracker(data, self.content_changed.emit)
+        self.wire_layer.stack = self
 
-            if start_node and end_node:
-                wire = Wire(start_node.output_socket, end_node.input_socket)
-                self.scene.addItem(wire)
+        viewport = data.get("viewport")
+        if viewport:
+            zoom = viewport.get("zoom", 1.0)
+            self.scale(zoom, zoom)
+            self.setRenderHint(QPainter.Antialiasing, zoom >= LOD_FLAT)
+            self.saved_center = (viewport.get("x", 0), viewport.get("y", 0))
+            self.centerOn(*self.saved_center)
+
+        # The scene starts out centered on the origin when no viewport was saved
+        self.loader = GraphLoader(self, data, self.saved_center or (0, 0))
 
-                start_node.output_socket.connected_wires.append(wire)
-                end_node.input_socket.connected_wires.append(wire)
+        # Inserting into the BSP tree item by item costs more than building it once at the end
+        self.scene.setItemIndexMethod(QGraphicsScene.NoIndex)
 
-                wire.update_path()
+        # One slice is built right away, so the first frame already shows what is around the viewport
+        if self.loader.step(LOAD_SLICE_MS):
+            self.end_loading()
+        else:
+            self.load_progress.setRange(0, len(self.loader))
+            self.load_progress.setValue(self.loader.position)
+            self.load_progress.show()
+            self.load_timer.start(0)
+
+        if self.tracker.rewritten:
+            # Files written before ids were stable get renumbered once, after main has connected to us
+            QTimer.singleShot(0, self.content_changed.emit)
+
+    @trace.traced("nodes.load_step", "load")
+    def load_step(self):
+        if self.loader is None:
+            return
 
+        if self.loader.step(LOAD_SLICE_MS):
+            self.end_loading()
+        else:
+            self.load_progress.setValue(self.loader.position)
+
+    def finish_loading(self):
+        if self.loader is not None:
+            self.loader.step()
+            self.end_loading()
+
+    def end_loading(self):
+        self.load_timer.stop()
+        self.load_progress.hide()
+
+        self.loader = None
+        self.resume_index()
+
+    @trace.traced("nodes.serialize", "save")
     def serialize(self):
-        nodes_data = []
-        wires_data = []
+        self.tracker.flush()
+        self.tracker.rewritten = False
 
-        for item in self.scene.items():
-            if isinstance(item, Node):
-                nodes_data.append(item.get_data())
-            elif isinstance(item, Wire):
-                wires_data.append({
-                    "start_node": id(item.start_socket.parentItem()),
-                    "end_node": id(item.end_socket.parentItem())
-                })
+        # A copy, the saver encodes it on its own thread while the tracker keeps editing the live lists
+        content = dict(self.tracker.content)
+        for field in ("nodes", "wires"):
+            content[field] = [dict(entry) for entry in content[field]]
 
-        return {"nodes": nodes_data, "wires": wires_data}
+        return content
+
+    @trace.traced("nodes.take_changes", "save")
+    def take_changes(self):
+        if self.tracker.rewritten:
+            return {"op": "content", "content": self.serialize()}
+
+        patch = self.tracker.flush()
+        if patch is None:
+            return None
+
+        return {"op": "patch", **patch}
 
     def save_to_file(self):
-        self.current_data["data"][self.stack_name]["content"] = self.serialize()
+        self.save_requested.emit()
+
+    def memory_cost(self):
+        cost = len(self.wire_layer) * WIRE_COST
+        for entry in self.tracker.content["nodes"]:
+            cost += NODE_COST + len(entry.get("content", "")) * 2
 
-        with open("temp.json", "w", encoding="utf-8") as f:
-            json.dump(self.current_data, f, indent=4)
+        return cost
 
     def get_data(self):
         self.current_data["data"][self.stack_name]["content"] = self.serialize()
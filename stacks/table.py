@@ -0,0 +1,691 @@
+import io
+import os
+import re
+import csv
+import mmap
+import operator
+import threading
+
+from collections import OrderedDict
+
+import numpy as np
+
+from PyQt5.QtWidgets import (
+    QWidget, QVBoxLayout, QHBoxLayout, QTableView, QHeaderView, QLineEdit, QComboBox,
+    QPushButton, QLabel, QShortcut, QFileDialog, QAbstractItemView
+)
+from PyQt5.QtGui import QKeySequence
+from PyQt5.QtCore import Qt, QAbstractTableModel, QModelIndex, QTimer, pyqtSignal
+
+from core import trace
+
+VERSION = "1.0.0"
+
+TABLE_FILTER = "Tables (*.csv *.tsv *.txt *.npy);;All Files (*)"
+
+NEWLINE = ord("\n")
+RETURN = ord("\r")
+QUOTE = ord('"')
+
+# Only every BLOCK_ROWS-th row start is indexed, a 5 GB file needs a few MB of offsets instead of hundreds
+BLOCK_ROWS = 64
+BLOCK_CACHE = 256
+SCAN_CHUNK = 16 * 1024 * 1024
+SPAN_BLOCKS = 1024
+SNIFF_SIZE = 64 * 1024
+
+# Cells wider than this are cut out of the file one by one, the array path would copy width bytes per row
+FAST_WIDTH = 256
+
+ROW_HEIGHT = 22
+FILTER_DELAY_MS = 250
+
+COMPARISON = re.compile(r"^\s*(<=|>=|!=|<|>|=)\s*([-+]?[\d.]+(?:[eE][-+]?\d+)?)\s*$")
+OPERATORS = {
+    "<": operator.lt, "<=": operator.le, ">": operator.gt,
+    ">=": operator.ge, "=": operator.eq, "!=": operator.ne
+}
+
+def row_ends(chunk, quotes_before):
+    # A newline inside a quoted field has an odd number of quotes before it, counted from the first row
+    newlines = np.flatnonzero(chunk == NEWLINE)
+    quotes = np.flatnonzero(chunk == QUOTE)
+
+    if quotes.size:
+        before = np.searchsorted(quotes, newlines) + quotes_before
+        newlines = newlines[before % 2 == 0]
+
+    return newlines, (quotes_before + quotes.size) % 2
+
+def split_column(span, column, delimiter):
+    # Cells of one column from a span without quotes, as a bytes array, or None when a cell is too wide
+    if span.size and span[-1] != NEWLINE:
+        span = np.append(span, np.uint8(NEWLINE))
+
+    separators = np.flatnonzero((span == delimiter) | (span == NEWLINE))
+    newline = span[separators] == NEWLINE
+    rows = int(np.count_nonzero(newline))
+
+    row = np.cumsum(newline) - newline
+    field = np.arange(len(separators)) - np.searchsorted(row, np.arange(rows))[row]
+
+    ends = np.full(rows, -1, dtype=np.int64)
+    picked = field == column
+    ends[row[picked]] = separators[picked]
+
+    if column == 0:
+        starts = np.concatenate(([0], separators[newline][:-1] + 1))
+    else:
+        starts = np.full(rows, -1, dtype=np.int64)
+        picked = field == column - 1
+        starts[row[picked]] = separators[picked] + 1
+
+    present = (starts >= 0) & (ends >= 0)
+    starts = np.where(present, starts, 0)
+    lengths = np.where(present, ends - starts, 0)
+    lengths -= (lengths > 0) & (span[np.maximum(ends - 1, 0)] == RETURN)
+
+    width = int(lengths.max(initial=0)) or 1
+    if width > FAST_WIDTH:
+        return None
+
+    offsets = np.arange(width)
+    cells = span[np.minimum(starts[:, None] + offsets, span.size - 1)]
+    cells[offsets >= lengths[:, None]] = 0
+
+    return np.ascontiguousarray(cells).view(f"S{width}").ravel()
+
+def to_column(cells):
+    # Columns where every filled cell is a number sort and compare as numbers
+    try:
+        return np.where(cells == b"", b"nan", cells).astype(np.float64)
+    except ValueError:
+        pass
+
+    try:
+        return cells.astype(str)
+    except UnicodeDecodeError:
+        return np.char.decode(cells, "utf-8", "replace")
+
+def sniff(path):
+    with open(path, "r", encoding="utf-8", errors="replace", newline="") as file:
+        sample = file.read(SNIFF_SIZE)
+
+    try:
+        delimiter = csv.Sniffer().sniff(sample, delimiters=",;\t|").delimiter
+    except csv.Error:
+        delimiter = "\t" if path.endswith(".tsv") else ","
+
+    try:
+        header = csv.Sniffer().has_header(sample)
+    except csv.Error:
+        header = True
+
+    return delimiter, header
+
+class CsvSource:
+    def __init__(self, path, delimiter=",", header=True):
+        self.path = path
+        self.delimiter = delimiter
+
+        with open(path, "rb") as file:
+            self.size = os.fstat(file.fileno()).st_size
+            # The mapping outlives the file object, pages are read only when a row or column touches them
+            self.view = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) if self.size else b""
+
+        self.bytes = np.frombuffer(self.view, dtype=np.uint8)
+
+        self.blocks = np.zeros(1024, dtype=np.int64)
+        self.block_count = 0
+        self.row_count = 0
+        self.complete = False
+        self.cancelled = False
+
+        self.block_cache = OrderedDict()
+        self.column_cache = {}
+        self.column_lock = threading.Lock()
+
+        self.data_start, self.columns = self.read_header(header)
+
+    def read_header(self, header):
+        first, _ = row_ends(self.bytes[:SCAN_CHUNK], 0)
+        end = int(first[0]) + 1 if first.size else self.size
+
+        fields = self.parse(0, end)
+        fields = fields[0] if fields else []
+
+        if header:
+            return end, fields
+
+        return 0, [f"Column {position + 1}" for position in range(len(fields))]
+
+    def parse(self, start, end):
+        text = self.view[start:end].decode("utf-8", "replace")
+        return list(csv.reader(io.StringIO(text, newline=""), delimiter=self.delimiter))
+
+    def cancel(self):
+        self.cancelled = True
+
+    @property
+    def available_rows(self):
+        # While indexing, only whole blocks are shown, the last one may still be missing rows
+        if self.complete:
+            return self.row_count
+
+        return max(0, self.block_count - 1) * BLOCK_ROWS
+
+    def add_blocks(self, starts):
+        needed = self.block_count + len(starts)
+
+        if needed > len(self.blocks):
+            # Readers keep using the old array until the new one is published
+            grown = np.zeros(max(needed, len(self.blocks) * 2), dtype=np.int64)
+            grown[:self.block_count] = self.blocks[:self.block_count]
+            self.blocks = grown
+
+        self.blocks[self.block_count:needed] = starts
+        self.block_count = needed
+
+    @trace.traced("table.index", "load")
+    def build_index(self, progress):
+        rows = 0
+        quotes = 0
+
+        if self.data_start < self.size:
+            self.add_blocks([self.data_start])
+            rows = 1
+
+        for start in range(self.data_start, self.size, SCAN_CHUNK):
+            if self.cancelled:
+                return
+
+            end = min(start + SCAN_CHUNK, self.size)
+            ends, quotes = row_ends(self.bytes[start:end], quotes)
+
+            starts = ends + start + 1
+            starts = starts[starts < self.size]
+
+            numbers = np.arange(rows, rows + len(starts))
+            self.add_blocks(starts[numbers % BLOCK_ROWS == 0])
+
+            rows += len(starts)
+            self.row_count = rows
+
+            progress(end / self.size)
+
+        self.row_count = rows
+        self.complete = True
+        progress(1.0)
+
+    def block_end(self, block):
+        return int(self.blocks[block + 1]) if block + 1 < self.block_count else self.size
+
+    def read_block(self, block):
+        rows = self.block_cache.get(block)
+
+        if rows is None:
+            rows = self.parse(int(self.blocks[block]), self.block_end(block))
+            self.block_cache[block] = rows
+
+            if len(self.block_cache) > BLOCK_CACHE:
+                self.block_cache.popitem(last=False)
+        else:
+            self.block_cache.move_to_end(block)
+
+        return rows
+
+    def cell(self, row, column):
+        rows = self.read_block(row // BLOCK_ROWS)
+        offset = row % BLOCK_ROWS
+
+        if offset >= len(rows) or column >= len(rows[offset]):
+            return ""
+
+        return rows[offset][column]
+
+    def column(self, column):
+        # Parsed once on a worker, in spans of many blocks, then kept for every later sort and filter
+        with self.column_lock:
+            if column in self.column_cache:
+                return self.column_cache[column]
+
+            delimiter = self.delimiter.encode("utf-8")
+
+            parts = []
+            for block in range(0, self.block_count, SPAN_BLOCKS):
+                if self.cancelled:
+                    return None
+
+                start = int(self.blocks[block])
+                end = self.block_end(min(block + SPAN_BLOCKS, self.block_count) - 1)
+
+                cells = None
+                if len(delimiter) == 1 and self.view.find(b'"', start, end) == -1:
+                    cells = split_column(self.bytes[start:end], column, delimiter[0])
+
+                if cells is None:
+                    rows = self.parse(start, end)
+                    cells = np.char.encode(np.array([row[column] if column < len(row) else "" for row in rows]), "utf-8")
+
+                parts.append(cells)
+
+            cells = np.concatenate(parts) if parts else np.zeros(0, dtype="S1")
+            self.column_cache[column] = to_column(cells[:self.row_count])
+
+            return self.column_cache[column]
+
+    def memory_cost(self):
+        columns = sum(array.nbytes for array in self.column_cache.values())
+        return self.blocks.nbytes + columns + len(self.block_cache) * BLOCK_ROWS * 256
+
+class NpySource:
+    def __init__(self, path):
+        self.path = path
+        self.array = np.load(path, mmap_mode="r", allow_pickle=False)
+
+        if self.array.dtype.names:
+            self.fields = list(self.array.dtype.names)
+            self.columns = self.fields
+        else:
+            self.fields = None
+            width = self.array.shape[1] if self.array.ndim > 1 else 1
+            self.columns = [f"Column {position + 1}" for position in range(width)]
+
+        self.row_count = len(self.array)
+        self.available_rows = self.row_count
+        self.complete = True
+
+    def cancel(self):
+        pass
+
+    def build_index(self, progress):
+        progress(1.0)
+
+    def column(self, column):
+        if self.fields:
+            return self.array[self.fields[column]]
+        if self.array.ndim == 1:
+            return self.array
+
+        return self.array[:, column]
+
+    def cell(self, row, column):
+        if self.fields:
+            return str(self.array[row][self.fields[column]])
+        if self.array.ndim == 1:
+            return str(self.array[row])
+
+        return str(self.array[row, column])
+
+    def memory_cost(self):
+        return 0
+
+def open_source(settings):
+    path = settings["source"]
+
+    if path.endswith(".npy"):
+        return NpySource(path)
+
+    return CsvSource(path, settings.get("delimiter", ","), settings.get("header", True))
+
+def match(column, needle):
+    comparison = COMPARISON.match(needle)
+
+    if comparison and column.dtype.kind in "iuf":
+        return OPERATORS[comparison.group(1)](column, float(comparison.group(2)))
+
+    strings = column if column.dtype.kind == "U" else column.astype(str)
+    return np.char.find(np.char.lower(strings), needle.casefold()) >= 0
+
+@trace.traced("table.view", "view")
+def compute_view(source, sort, needle, filter_column):
+    # Row numbers in display order, or None while the file is shown as it is
+    order = None
+
+    if sort is not None:
+        column = source.column(sort[0])
+        if column is None:
+            return None
+
+        if column.dtype.kind in "iuf":
+            # Negated rather than reversed, so empty cells stay at the bottom either way
+            keys = -column.astype(np.float64) if sort[1] == "desc" else column
+            order = np.argsort(keys, kind="stable")
+        else:
+            keys = np.char.lower(column) if column.dtype.kind == "U" else column
+            order = np.argsort(keys, kind="stable")
+
+            if sort[1] == "desc":
+                order = order[::-1]
+
+    if needle:
+        column = source.column(filter_column)
+        if column is None:
+            return None
+
+        mask = match(column, needle)
+        order = np.flatnonzero(mask) if order is None else order[mask[order]]
+
+    return order
+
+class TableModel(QAbstractTableModel):
+    sort_requested = pyqtSignal(int, object)
+
+    def __init__(self, source):
+        super().__init__()
+
+        self.source = source
+        self.rows = 0
+
+        # Visible rows as numbers into the file, None while every row is shown in order
+        self.view = None
+
+    def source_row(self, row):
+        return row if self.view is None else int(self.view[row])
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+
+        return self.rows if self.view is None else len(self.view)
+
+    def columnCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+
+        return len(self.source.columns)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or role != Qt.DisplayRole:
+            return None
+
+        return self.source.cell(self.source_row(index.row()), index.column())
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole:
+            return None
+
+        if orientation == Qt.Horizontal:
+            return self.source.columns[section] if section < len(self.source.columns) else None
+
+        return str(self.source_row(section) + 1)
+
+    def flags(self, index):
+        if not index.isValid():
+            return Qt.NoItemFlags
+
+        return Qt.ItemIsEnabled | Qt.ItemIsSelectable
+
+    def sort(self, column, order=Qt.AscendingOrder):
+        self.sort_requested.emit(column, order)
+
+    def grow(self, rows):
+        if rows <= self.rows:
+            return
+
+        if self.view is None:
+            self.beginInsertRows(QModelIndex(), self.rows, rows - 1)
+            self.rows = rows
+            self.endInsertRows()
+        else:
+            self.rows = rows
+
+    def set_view(self, view):
+        self.beginResetModel()
+        self.view = view
+        self.endResetModel()
+
+class Stack(QWidget):
+    save_requested = pyqtSignal()
+    content_changed = pyqtSignal()
+    indexed = pyqtSignal(int, float)
+    view_ready = pyqtSignal(int, object)
+    view_failed = pyqtSignal(int, str)
+
+    def __init__(self, stack_name, current_data):
+        super().__init__()
+
+        self.stack_name = stack_name
+        self.current_data = current_data
+
+        # Only where the file is and how it is viewed are saved, never its rows
+        self.settings = dict(self.current_data['data'][self.stack_name].get('content') or {})
+        self.dirty = False
+
+        self.source = None
+        self.model = None
+
+        # Results for a superseded file or view are ignored
+        self.generation = 0
+        self.view_generation = 0
+
+        self.layout = QVBoxLayout(self)
+
+        self.layout.setContentsMargins(0, 0, 0, 0)
+        self.layout.setSpacing(0)
+
+        self.tool_bar = QHBoxLayout()
+
+        self.open_button = QPushButton("Open File...")
+        self.open_button.clicked.connect(self.choose_file)
+
+        self.filter_column = QComboBox()
+        self.filter_column.currentIndexChanged.connect(self.schedule_filter)
+
+        self.filter_field = QLineEdit()
+        self.filter_field.setPlaceholderText("Filter, or compare numbers with <, >, =...")
+        self.filter_field.textChanged.connect(self.schedule_filter)
+
+        self.status_label = QLabel()
+
+        for widget in (self.open_button, self.filter_column, self.filter_field, self.status_label):
+            self.tool_bar.addWidget(widget)
+
+        self.filter_timer = QTimer(self)
+        self.filter_timer.setSingleShot(True)
+        self.filter_timer.setInterval(FILTER_DELAY_MS)
+        self.filter_timer.timeout.connect(self.apply_filter)
+
+        # Fixed row heights let the view place any row without measuring the ones above it
+        self.table_view = QTableView()
+        self.table_view.setWordWrap(False)
+        self.table_view.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
+        self.table_view.verticalHeader().setDefaultSectionSize(ROW_HEIGHT)
+        self.table_view.horizontalHeader().setSortIndicator(-1, Qt.AscendingOrder)
+        self.table_view.setSelectionBehavior(QAbstractItemView.SelectRows)
+
+        self.layout.addLayout(self.tool_bar)
+        self.layout.addWidget(self.table_view)
+
+        self.save_shortcut = QShortcut(QKeySequence("Ctrl+S"), self)
+        self.save_shortcut.activated.connect(self.save_requested)
+
+        self.indexed.connect(self.show_indexed)
+        self.view_ready.connect(self.apply_view)
+        self.view_failed.connect(self.show_view_error)
+
+        if self.settings.get("source"):
+            self.load_source()
+        else:
+            self.set_ready(False)
+            self.status_label.setText("Open a CSV or .npy file")
+
+    def set_ready(self, ready):
+        self.filter_column.setEnabled(ready)
+        self.filter_field.setEnabled(ready)
+        self.table_view.setSortingEnabled(ready)
+
+    def choose_file(self):
+        file_path, _ = QFileDialog.getOpenFileName(self, "Open Table", "", TABLE_FILTER)
+        if not file_path:
+            return
+
+        self.settings = {"source": file_path}
+        if not file_path.endswith(".npy"):
+            self.settings["delimiter"], self.settings["header"] = sniff(file_path)
+
+        self.mark_edited()
+        self.load_source()
+
+    def cancel_source(self):
+        if self.source is not None:
+            self.source.cancel()
+
+    def load_source(self):
+        self.cancel_source()
+        self.set_ready(False)
+
+        self.generation += 1
+        self.view_generation += 1
+        generation = self.generation
+
+        try:
+            self.source = open_source(self.settings)
+        except (OSError, ValueError) as e:
+            self.source = None
+            self.status_label.setText(f"Could not open {self.settings['source']}: {e}")
+            return
+
+        # Connected to the source itself, the widget is already gone when destroyed fires
+        self.destroyed.connect(self.source.cancel)
+
+        self.model = TableModel(self.source)
+        self.model.sort_requested.connect(self.request_sort)
+        self.table_view.setModel(self.model)
+
+        self.filter_column.blockSignals(True)
+        self.filter_column.clear()
+        self.filter_column.addItems(self.source.columns)
+        self.filter_column.blockSignals(False)
+
+        source = self.source
+
+        def run():
+            def progress(fraction):
+                try:
+                    self.indexed.emit(generation, fraction)
+                except RuntimeError:
+                    # The stack was closed while the file was still being indexed
+                    source.cancel()
+
+            source.build_index(progress)
+
+        threading.Thread(target=run, daemon=True).start()
+
+    def show_indexed(self, generation, fraction):
+        if generation != self.generation:
+            return
+
+        self.model.grow(self.source.available_rows)
+
+        if not self.source.complete:
+            self.status_label.setText(f"Indexing {fraction:.0%}, {self.source.available_rows:,} rows")
+            return
+
+        self.status_label.setText(f"{self.source.row_count:,} rows")
+        self.restore_view()
+        self.set_ready(True)
+
+    def restore_view(self):
+        sort = self.settings.get("sort")
+        needle = self.settings.get("filter")
+
+        self.filter_column.blockSignals(True)
+        self.filter_field.blockSignals(True)
+
+        if needle:
+            self.filter_column.setCurrentIndex(needle[0])
+            self.filter_field.setText(needle[1])
+        if sort:
+            self.table_view.horizontalHeader().setSortIndicator(
+                sort[0], Qt.DescendingOrder if sort[1] == "desc" else Qt.AscendingOrder
+            )
+
+        self.filter_column.blockSignals(False)
+        self.filter_field.blockSignals(False)
+
+        if sort or needle:
+            self.refresh_view()
+
+    def request_sort(self, column, order):
+        if self.source is None or not self.source.complete:
+            return
+
+        sort = [column, "desc" if order == Qt.DescendingOrder else "asc"] if column >= 0 else None
+        if sort == self.settings.get("sort"):
+            return
+
+        self.settings["sort"] = sort
+        self.mark_edited()
+        self.refresh_view()
+
+    def schedule_filter(self, *args):
+        if self.source is not None and self.source.complete:
+            self.filter_timer.start()
+
+    def apply_filter(self):
+        text = self.filter_field.text()
+        needle = [self.filter_column.currentIndex(), text] if text else None
+
+        if needle == self.settings.get("filter"):
+            return
+
+        self.settings["filter"] = needle
+        self.mark_edited()
+        self.refresh_view()
+
+    def refresh_view(self):
+        # Sorting and filtering a few million rows takes a while, so it runs off the UI thread
+        self.view_generation += 1
+        generation = self.view_generation
+
+        source = self.source
+        sort = self.settings.get("sort")
+        needle = self.settings.get("filter") or [0, ""]
+
+        self.status_label.setText("Sorting..." if sort else "Filtering...")
+
+        def run():
+            try:
+                try:
+                    view = compute_view(source, sort, needle[1], needle[0])
+                except Exception as e:
+                    self.view_failed.emit(generation, str(e))
+                else:
+                    self.view_ready.emit(generation, view)
+            except RuntimeError:
+                # The stack was closed before the view was ready
+                pass
+
+        threading.Thread(target=run, daemon=True).start()
+
+    def apply_view(self, generation, view):
+        if generation != self.view_generation:
+            return
+
+        self.model.set_view(view)
+
+        if view is None:
+            self.status_label.setText(f"{self.source.row_count:,} rows")
+        else:
+            self.status_label.setText(f"{len(view):,} of {self.source.row_count:,} rows")
+
+    def show_view_error(self, generation, message):
+        if generation != self.view_generation:
+            return
+
+        self.status_label.setText(f"Could not sort or filter: {message}")
+
+    def mark_edited(self):
+        self.dirty = True
+        self.content_changed.emit()
+
+    def memory_cost(self):
+        return self.source.memory_cost() if self.source is not None else 0
+
+    def get_data(self):
+        if self.dirty:
+            self.current_data['data'][self.stack_name]['content'] = dict(self.settings)
+            self.dirty = False
+
+        return self.current_data
@@ -1,38 +1,215 @@
-import json
-
-from PyQt5.QtGui import QKeySequence
+from PyQt5.QtCore import QEvent, QTimer, pyqtSignal
+from PyQt5.QtGui import QKeySequence, QTextCursor
 from PyQt5.QtWidgets import (
-    QTextEdit, QShortcut
+    QPlainTextEdit, QShortcut
 )
 
-class Stack(QTextEdit):
-    def __init__(self, stack_name: str, current_data: dict = None):
+from core import trace
+from core.undo import Command
+
+VERSION = "1.1.0"
+
+# Notes above this size are streamed into the editor a chunk per event loop pass
+LARGE_DOCUMENT = 4 * 1024 * 1024
+CHUNK_SIZE = 512 * 1024
+
+# Qt hands out paragraph and line separators where the saved text has newlines
+SEPARATORS = str.maketrans({"\u2029": "\n", "\u2028": "\n"})
+
+class Stack(QPlainTextEdit):
+    save_requested = pyqtSignal()
+    content_changed = pyqtSignal()
+
+    def __init__(self, stack_name: str, current_data: dict):
         super().__init__()
 
         self.stack_name = stack_name
         self.current_data = current_data
 
-        if not current_data:
-            with open("temp.json", "r", encoding="utf-8") as file:
-                self.current_data = json.load(file)
-
         if "content" not in self.current_data["data"][self.stack_name]:
             self.current_data["data"][self.stack_name]["content"] = ""
         self.text = self.current_data["data"][self.stack_name]["content"]
 
-        self.setPlainText(self.text)
-        self.textChanged.connect(self.sync_data)
+        # The document is only turned back into a string when something asks for the data
+        self.dirty = False
+        self.loading = False
+        self.loaded = 0
+
+        # Edits since the last save as (position, removed, inserted), autosave journals these instead of the note
+        self.splices = []
+        # Document positions count UTF-16 units, so notes with characters outside the BMP save whole
+        self.wide = self.has_wide(self.text)
+
+        self.load_timer = QTimer(self)
+        self.load_timer.timeout.connect(self.load_chunk)
+
+        if len(self.text) > LARGE_DOCUMENT:
+            self.begin_chunked_load()
+        else:
+            self.setPlainText(self.text)
+
+        self.document().contentsChange.connect(self.track_change)
+
+        # Set by main, each of the document's own undo steps is mirrored there so one history spans the window
+        self.undo_stack = None
+        self.undo_command = None
+        self.document().undoCommandAdded.connect(self.record_undo)
 
         self.new_stack_key = QShortcut(QKeySequence("Ctrl+S"), self)
         self.new_stack_key.activated.connect(self.save_data)
 
+    def begin_chunked_load(self):
+        self.loading = True
+
+        self.setReadOnly(True)
+        self.setUndoRedoEnabled(False)
+
+        self.load_timer.start(0)
+
+    @trace.traced("text.load_chunk", "load")
+    def load_chunk(self):
+        chunk = self.text[self.loaded:self.loaded + CHUNK_SIZE]
+
+        cursor = QTextCursor(self.document())
+        cursor.movePosition(QTextCursor.End)
+        cursor.insertText(chunk)
+
+        self.loaded += len(chunk)
+
+        if self.loaded >= len(self.text):
+            self.load_timer.stop()
+            self.loading = False
+
+            self.setUndoRedoEnabled(True)
+            self.setReadOnly(False)
+
+    def has_wide(self, text):
+        return bool(text) and max(text) > "\uffff"
+
+    def track_change(self, position, removed, added):
+        if self.loading:
+            return
+
+        # Changes at the end can count the document's closing separator, which the plain text does not have
+        over = position + added - (self.document().characterCount() - 1)
+        if over > 0:
+            added -= over
+            removed = max(0, removed - over)
+
+        cursor = QTextCursor(self.document())
+        cursor.setPosition(position)
+        cursor.setPosition(position + added, QTextCursor.KeepAnchor)
+        inserted = cursor.selectedText().translate(SEPARATORS)
+
+        # The document keeps removed and inserted text as UTF-16 for as long as the step can be undone
+        # Edits arrive after their step is added, typing the document merges into that step is charged to it too
+        if self.undo_command is not None and not self.undo_stack.applying:
+            self.undo_stack.charge(self.undo_command, 2 * (removed + added))
+
+        self.wide = self.wide or self.has_wide(inserted)
+        self.add_splice(position, removed, inserted)
+
+        self.dirty = True
+        self.content_changed.emit()
+
+    def add_splice(self, position, removed, inserted):
+        if self.splices:
+            last_position, last_removed, last_inserted = self.splices[-1]
+            end = last_position + len(last_inserted)
+
+            # Typing and backspacing at the end of the previous edit extend it instead of adding another
+            if position + removed == end and removed <= len(last_inserted):
+                self.splices[-1] = (last_position, last_removed, last_inserted[:len(last_inserted) - removed] + inserted)
+                return
+
+        self.splices.append((position, removed, inserted))
+
+    @trace.traced("text.take_changes", "save")
+    def take_changes(self):
+        if not self.dirty:
+            return None
+
+        if self.wide:
+            return {"op": "content", "content": self.get_data()["data"][self.stack_name]["content"]}
+
+        splices = [list(splice) for splice in self.splices]
+        self.splices = []
+
+        return {"op": "patch", "splices": splices} if splices else None
+
+    def record_undo(self):
+        if self.undo_stack is None:
+            return
+
+        document = self.document()
+        command = Command("Typing", document.undo, document.redo, owner=self, discard=self.forget_undo)
+
+        self.undo_stack.push(command)
+        self.undo_command = command
+
+    def forget_undo(self, evicted):
+        # The document cannot drop single steps, so losing its oldest one to the budget takes the rest of the note's history
+        self.undo_command = None
+
+        if evicted:
+            self.undo_stack.discard_owner(self)
+
+        if not self.undo_stack.owns(self):
+            self.document().clearUndoRedoStacks()
+
+    def is_undo_key(self, event):
+        return event.matches(QKeySequence.Undo) or event.matches(QKeySequence.Redo)
+
+    def event(self, event):
+        # Left to the window's Edit actions, which keep the shared history in order
+        if event.type() == QEvent.ShortcutOverride and self.undo_stack is not None and self.is_undo_key(event):
+            event.ignore()
+            return False
+
+        return super().event(event)
+
+    def keyPressEvent(self, event):
+        if self.undo_stack is not None and self.is_undo_key(event):
+            event.ignore()
+            return
+
+        super().keyPressEvent(event)
+
+    def contextMenuEvent(self, event):
+        menu = self.createStandardContextMenu()
+
+        if self.undo_stack is not None:
+            for action in menu.actions():
+                if action.objectName() in ("edit-undo", "edit-redo"):
+                    menu.removeAction(action)
+
+        menu.exec_(event.globalPos())
+        menu.deleteLater()
+
+    @trace.traced("text.sync", "save")
     def sync_data(self):
-        self.current_data["data"][self.stack_name]["content"] = self.toPlainText()
+        if self.dirty:
+            self.text = self.toPlainText()
+            self.dirty = False
+            self.splices = []
+
+        self.current_data["data"][self.stack_name]["content"] = self.text
 
     def save_data(self):
-        with open("temp.json", "w", encoding="utf-8") as file:
-            json.dump(self.current_data, file, indent=4)
+        self.save_requested.emit()
+
+    def reveal(self, ref, query):
+        words = query.split()
+        if not words or self.loading:
+            return
+
+        self.moveCursor(QTextCursor.Start)
+        self.find(words[0])
+        self.setFocus()
+
+    def memory_cost(self):
+        return max(self.document().characterCount(), len(self.text)) * 2
 
     def get_data(self):
-        self.current_data["data"][self.stack_name]["content"] = self.toPlainText()
+        self.sync_data()
         return self.current_data
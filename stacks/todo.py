@@ -1,13 +1,261 @@
-from PyQt5.QtWidgets import QWidget, QVBoxLayout, QListWidget, QListWidgetItem, QLineEdit
-from PyQt5.QtCore import Qt
+from PyQt5.QtWidgets import (
+    QWidget, QVBoxLayout, QHBoxLayout, QTableView, QHeaderView, QLineEdit, QComboBox,
+    QPushButton, QShortcut, QApplication, QAbstractItemView
+)
+from PyQt5.QtGui import QKeySequence
+from PyQt5.QtCore import Qt, QAbstractListModel, QModelIndex, pyqtSignal
+
+from core import trace
+from core.undo import Command, COMMAND_COST
+
+VERSION = "1.2.0"
+
+TASK_COST = 128
+ROW_HEIGHT = 22
+
+FILTERS = ["All", "Open", "Done"]
+SORTS = ["Manual", "A to Z", "Open first"]
+
+class TaskModel(QAbstractListModel):
+    edited = pyqtSignal()
+    task_changed = pyqtSignal(int, int, object, object)
+
+    def __init__(self, tasks=()):
+        super().__init__()
+
+        # Parallel arrays instead of a dict or item per task
+        self.texts = [task["text"] for task in tasks]
+        self.done = bytearray(bool(task["done"]) for task in tasks)
+
+        self.status = "All"
+        self.needle = ""
+        self.order = "Manual"
+
+        # Visible rows as indexes into the arrays, None while every task is shown in order
+        self.view = None
+
+        # Tasks edited since the last save, autosave journals just these rows
+        self.touched = set()
+        self.shrunk = False
+
+    def __len__(self):
+        return len(self.texts)
+
+    def source_row(self, row):
+        return row if self.view is None else self.view[row]
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+
+        return len(self.texts) if self.view is None else len(self.view)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+
+        task = self.source_row(index.row())
+
+        if role in (Qt.DisplayRole, Qt.EditRole):
+            return self.texts[task]
+        if role == Qt.CheckStateRole:
+            return Qt.Checked if self.done[task] else Qt.Unchecked
+
+        return None
+
+    def setData(self, index, value, role=Qt.EditRole):
+        if not index.isValid():
+            return False
+
+        task = self.source_row(index.row())
+
+        if role == Qt.EditRole:
+            if not value:
+                return False
+            old = self.texts[task]
+        elif role == Qt.CheckStateRole:
+            value = int(value == Qt.Checked)
+            old = self.done[task]
+        else:
+            return False
+
+        if value == old:
+            return True
+
+        self.set_task(task, role, value)
+        self.task_changed.emit(task, role, old, value)
+        return True
+
+    def set_task(self, task, role, value):
+        if role == Qt.EditRole:
+            self.texts[task] = value
+        else:
+            self.done[task] = value
+
+        self.touched.add(task)
+
+        row = self.view_row(task)
+        if row is not None:
+            self.dataChanged.emit(self.index(row), self.index(row), [role])
+
+        self.edited.emit()
+
+    def flags(self, index):
+        if not index.isValid():
+            return Qt.NoItemFlags
+
+        return Qt.ItemIsEnabled | Qt.ItemIsSelectable | Qt.ItemIsEditable | Qt.ItemIsUserCheckable
+
+    def is_identity(self):
+        return self.status == "All" and not self.needle and self.order == "Manual"
+
+    @trace.traced("todo.refresh", "view")
+    def refresh(self):
+        self.beginResetModel()
+
+        if self.is_identity():
+            self.view = None
+        else:
+            rows = range(len(self.texts))
+
+            if self.status != "All":
+                wanted = self.status == "Done"
+                rows = [row for row in rows if self.done[row] == wanted]
+
+            if self.needle:
+                texts = self.texts
+                rows = [row for row in rows if self.needle in texts[row].casefold()]
+
+            if self.order == "A to Z":
+                rows = sorted(rows, key=lambda row: self.texts[row].casefold())
+            elif self.order == "Open first":
+                rows = sorted(rows, key=self.done.__getitem__)
+
+            self.view = list(rows)
+
+        self.endResetModel()
+
+    def set_filter(self, status=None, needle=None):
+        if status is not None:
+            self.status = status
+        if needle is not None:
+            self.needle = needle.casefold()
+
+        self.refresh()
+
+    def set_order(self, order):
+        self.order = order
+        self.refresh()
+
+    def extend(self, texts, done=False):
+        texts = [text for text in texts if text]
+        if not texts:
+            return
+
+        self.touched.update(range(len(self.texts), len(self.texts) + len(texts)))
+
+        self.texts.extend(texts)
+        self.done.extend(bytes([done]) * len(texts))
+
+        if self.view is None:
+            start = self.rowCount()
+            self.beginInsertRows(QModelIndex(), start, start + len(texts) - 1)
+            self.endInsertRows()
+        else:
+            self.refresh()
+
+        self.edited.emit()
+
+    def truncate(self, length):
+        if length >= len(self.texts):
+            return
+
+        self.shrunk = True
+
+        if self.view is None:
+            self.beginRemoveRows(QModelIndex(), length, len(self.texts) - 1)
+            del self.texts[length:]
+            del self.done[length:]
+            self.endRemoveRows()
+        else:
+            del self.texts[length:]
+            del self.done[length:]
+            self.refresh()
+
+        self.edited.emit()
+
+    def set_done(self, rows, done):
+        tasks = [task for task in map(self.source_row, rows) if self.done[task] != done]
+        self.set_flags(tasks, done)
+
+        return tasks
+
+    def set_flags(self, tasks, done):
+        if not tasks:
+            return
+
+        for task in tasks:
+            self.done[task] = done
+
+        self.touched.update(tasks)
+
+        if self.status != "All" or self.order == "Open first":
+            self.refresh()
+        elif self.view is None:
+            self.dataChanged.emit(self.index(min(tasks)), self.index(max(tasks)), [Qt.CheckStateRole])
+        else:
+            self.dataChanged.emit(self.index(0), self.index(len(self.view) - 1), [Qt.CheckStateRole])
+
+        self.edited.emit()
+
+    def view_row(self, task):
+        if self.view is None:
+            return task if task < len(self.texts) else None
+
+        try:
+            return self.view.index(task)
+        except ValueError:
+            return None
+
+    def tasks(self):
+        return [{"text": text, "done": bool(done)} for text, done in zip(self.texts, self.done)]
+
+    def take_changes(self):
+        length = len(self.texts)
+        rows = [
+            [task, {"text": self.texts[task], "done": bool(self.done[task])}]
+            for task in sorted(self.touched) if task < length
+        ]
+
+        record = {"op": "patch", "rows": rows}
+        if self.shrunk:
+            record["length"] = length
+
+        shrunk = self.shrunk
+        self.forget_changes()
+
+        return record if rows or shrunk else None
+
+    def forget_changes(self):
+        self.touched = set()
+        self.shrunk = False
 
 class Stack(QWidget):
+    save_requested = pyqtSignal()
+    content_changed = pyqtSignal()
+
     def __init__(self, stack_name, current_data):
         super().__init__()
 
         self.stack_name = stack_name
         self.current_data = current_data
 
+        # Saved content stays valid until the model is edited
+        self.dirty = False
+
+        # Set by main when the stack is opened
+        self.undo_stack = None
+
         self.layout = QVBoxLayout(self)
 
         self.layout.setContentsMargins(0, 0, 0, 0)
@@ -17,39 +265,146 @@ class Stack(QWidget):
         self.input_field.setPlaceholderText("Enter task and press Enter...")
         self.input_field.returnPressed.connect(self.add_task)
 
-        self.list_widget = QListWidget()
+        self.filter_bar = QHBoxLayout()
+
+        self.filter_field = QLineEdit()
+        self.filter_field.setPlaceholderText("Filter tasks...")
+        self.filter_field.textChanged.connect(lambda text: self.model.set_filter(needle=text))
+
+        self.status_box = QComboBox()
+        self.status_box.addItems(FILTERS)
+        self.status_box.currentTextChanged.connect(lambda status: self.model.set_filter(status=status))
+
+        self.sort_box = QComboBox()
+        self.sort_box.addItems(SORTS)
+        self.sort_box.currentTextChanged.connect(lambda order: self.model.set_order(order))
+
+        self.check_button = QPushButton("Check")
+        self.check_button.clicked.connect(lambda: self.set_done(True))
+        self.uncheck_button = QPushButton("Uncheck")
+        self.uncheck_button.clicked.connect(lambda: self.set_done(False))
+
+        for widget in (self.filter_field, self.status_box, self.sort_box, self.check_button, self.uncheck_button):
+            self.filter_bar.addWidget(widget)
+
+        self.model = TaskModel(self.current_data['data'][self.stack_name].get('content') or [])
+        self.model.edited.connect(self.mark_edited)
+        self.model.task_changed.connect(self.record_task_change)
+
+        # A one column table lays out in constant time, a list view walks every row on reset
+        self.task_view = QTableView()
+        self.task_view.setShowGrid(False)
+        self.task_view.horizontalHeader().hide()
+        self.task_view.horizontalHeader().setStretchLastSection(True)
+        self.task_view.verticalHeader().hide()
+        self.task_view.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
+        self.task_view.verticalHeader().setDefaultSectionSize(ROW_HEIGHT)
+        self.task_view.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.task_view.setSelectionMode(QAbstractItemView.ExtendedSelection)
+        self.task_view.setModel(self.model)
 
         self.layout.addWidget(self.input_field)
-        self.layout.addWidget(self.list_widget)
+        self.layout.addLayout(self.filter_bar)
+        self.layout.addWidget(self.task_view)
+
+        self.save_shortcut = QShortcut(QKeySequence("Ctrl+S"), self)
+        self.save_shortcut.activated.connect(self.save_requested)
+
+        self.paste_shortcut = QShortcut(QKeySequence("Ctrl+Shift+V"), self)
+        self.paste_shortcut.activated.connect(self.paste_tasks)
+
+    def mark_edited(self):
+        self.dirty = True
+        self.content_changed.emit()
+
+    def record(self, label, undo, redo, cost=COMMAND_COST):
+        if self.undo_stack is not None:
+            self.undo_stack.push(Command(label, undo, redo, owner=self, cost=cost))
+
+    def record_task_change(self, task, role, old, new):
+        label = "Edit task" if role == Qt.EditRole else "Check task"
+        cost = COMMAND_COST + 2 * (len(old) + len(new)) if role == Qt.EditRole else COMMAND_COST
 
-        self.load_data()
+        self.record(
+            label,
+            lambda: self.model.set_task(task, role, old),
+            lambda: self.model.set_task(task, role, new),
+            cost=cost
+        )
+
+    def extend_tasks(self, label, texts, done=False):
+        start = len(self.model)
+        self.model.extend(texts, done)
+
+        added = self.model.texts[start:]
+        if not added:
+            return
+
+        self.record(
+            label,
+            lambda: self.model.truncate(start),
+            lambda: self.model.extend(added, done),
+            cost=COMMAND_COST + sum(len(text) for text in added) * 2
+        )
 
     def add_task(self, text=None, checked=False):
         task_text = text if text else self.input_field.text()
         if not task_text:
             return
 
-        item = QListWidgetItem(task_text)
-        item.setFlags(item.flags() | Qt.ItemIsUserCheckable | Qt.ItemIsEditable)
-        state = Qt.Checked if checked else Qt.Unchecked
-        item.setCheckState(state)
-
-        self.list_widget.addItem(item)
+        self.extend_tasks("Add task", [task_text], checked)
         self.input_field.clear()
 
+    def paste_tasks(self):
+        lines = QApplication.clipboard().text().splitlines()
+        self.extend_tasks("Paste tasks", [line.strip() for line in lines])
+
+    def set_done(self, done):
+        rows = [index.row() for index in self.task_view.selectionModel().selectedIndexes()]
+
+        # Without a selection the bulk action applies to everything the filter shows
+        if not rows:
+            rows = range(self.model.rowCount())
+
+        # Only tasks whose flag flipped are kept, so each of them was the opposite of done before
+        changed = self.model.set_done(rows, done)
+
+        if changed:
+            self.record(
+                "Check tasks" if done else "Uncheck tasks",
+                lambda: self.model.set_flags(changed, not done),
+                lambda: self.model.set_flags(changed, done),
+                cost=COMMAND_COST + 8 * len(changed)
+            )
+
+    def reveal(self, ref, query):
+        if not (isinstance(ref, tuple) and ref[0] == "task"):
+            return
+
+        row = self.model.view_row(ref[1])
+        if row is None:
+            self.filter_field.clear()
+            self.status_box.setCurrentIndex(0)
+            row = self.model.view_row(ref[1])
+
+        if row is not None:
+            index = self.model.index(row)
+            self.task_view.setCurrentIndex(index)
+            self.task_view.scrollTo(index)
+            self.task_view.setFocus()
+
+    def memory_cost(self):
+        return len(self.model) * TASK_COST
+
+    @trace.traced("todo.take_changes", "save")
+    def take_changes(self):
+        return self.model.take_changes()
+
+    @trace.traced("todo.get_data", "save")
     def get_data(self):
-        tasks = []
-        for i in range(self.list_widget.count()):
-            item = self.list_widget.item(i)
-            tasks.append({
-                "text": item.text(),
-                "done": item.checkState() == Qt.Checked
-            })
-
-        self.current_data['data'][self.stack_name]['content'] = tasks
-        return self.current_data
+        if self.dirty:
+            self.current_data['data'][self.stack_name]['content'] = self.model.tasks()
+            self.model.forget_changes()
+            self.dirty = False
 
-    def load_data(self):
-        content = self.current_data['data'][self.stack_name].get('content', [])
-        for task in content:
-            self.add_task(task['text'], task['done'])
+        return self.current_data
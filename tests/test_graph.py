@@ -0,0 +1,41 @@
+from core.graph import GraphIndex
+
+def chain_content():
+    return {
+        "nodes": [{"id": 1}, {"id": 2}, {"id": 3}, {"id": 4}],
+        "wires": [
+            {"id": 1, "start_node": 1, "end_node": 2},
+            {"id": 2, "start_node": 2, "end_node": 3},
+            {"id": 3, "start_node": 1, "end_node": 99}
+        ]
+    }
+
+def test_from_content_skips_wires_to_missing_nodes():
+    graph = GraphIndex.from_content(chain_content())
+
+    assert sorted(graph) == [1, 2, 3, 4]
+    assert sorted(graph.edges) == [1, 2]
+
+def test_reaches_follows_wire_direction():
+    graph = GraphIndex.from_content(chain_content())
+
+    assert graph.reaches(1, 3)
+    assert not graph.reaches(3, 1)
+    assert not graph.reaches(1, 4)
+    assert not graph.reaches(1, 99)
+
+def test_topological_order_and_cycles():
+    graph = GraphIndex.from_content(chain_content())
+
+    order = graph.topological_order()
+    assert order.index(1) < order.index(2) < order.index(3)
+    assert not graph.has_cycle()
+
+    graph.add_edge(4, 3, 1)
+
+    assert graph.topological_order() is None
+    assert graph.has_cycle()
+    assert sorted(graph.find_cycle()) == [1, 2, 3]
+
+    graph.remove_edge(4)
+    assert not graph.has_cycle()
@@ -0,0 +1,98 @@
+import os
+
+from PyQt5.QtGui import QTextCursor
+
+from core.journal import Journal
+from core.saver import SaveScheduler
+from stacks import nodes, text, todo
+
+def open_stack(app, tmp_path, stack_class, name, content):
+    journal = Journal(os.path.join(tmp_path, "project.json"))
+    data = journal.load()
+    data["data"][name] = {"type": stack_class.__module__, "content": content}
+
+    saver = SaveScheduler(journal)
+    stack = stack_class(name, data)
+
+    # The same wiring main gives a workspace, edits are deferred and Ctrl+S queues the whole content
+    def content_record():
+        record = stack.take_changes()
+        if record:
+            record["name"] = name
+        return record
+
+    stack.content_changed.connect(lambda: saver.defer_content(name, content_record))
+
+    def save():
+        saver.set_content(name, stack.get_data()["data"][name]["content"])
+
+    return journal, saver, stack, save
+
+def replay(journal, saver, name):
+    saver.flush()
+    saver.wait()
+
+    return Journal(journal.path).load()["data"][name]["content"]
+
+def test_text_edit_after_save_keeps_saved_content(app, tmp_path):
+    journal, saver, stack, save = open_stack(app, tmp_path, text.Stack, "note", "")
+
+    cursor = stack.textCursor()
+    cursor.insertText("abc")
+    save()
+
+    cursor.movePosition(QTextCursor.End)
+    cursor.insertText("d")
+
+    assert replay(journal, saver, "note") == "abcd"
+
+def test_node_edit_after_save_keeps_saved_content(app, tmp_path):
+    journal, saver, stack, save = open_stack(app, tmp_path, nodes.Stack, "graph", {})
+
+    stack.add_node(nodes.Node(0, 0))
+    save()
+    stack.add_node(nodes.Node(100, 0))
+
+    saved = replay(journal, saver, "graph")
+    assert [entry["id"] for entry in saved["nodes"]] == sorted(stack.node_items)
+
+def test_todo_edits_are_journaled_as_rows(app, tmp_path):
+    tasks = [{"text": f"task {i}", "done": False} for i in range(5)]
+    journal, saver, stack, save = open_stack(app, tmp_path, todo.Stack, "list", tasks)
+
+    stack.add_task("first")
+    save()
+    stack.add_task("second")
+    stack.model.set_flags([1, 5], True)
+
+    batches = []
+    saver.listeners.append(batches.append)
+    saver.flush()
+
+    assert [[row[0] for row in record.get("rows", ())] for record in batches[0]] == [[], [1, 5, 6]]
+
+    stack.model.truncate(6)
+
+    assert replay(journal, saver, "list") == stack.model.tasks()
+
+class FailingBackend:
+    def append(self, *records):
+        raise OSError("disk full")
+
+def test_failed_write_is_not_reported_as_saved(app):
+    saver = SaveScheduler(FailingBackend())
+
+    saved = []
+    failed = []
+    saver.saved.connect(lambda latency, depth: saved.append(latency))
+    saver.failed.connect(failed.append)
+
+    saver.set_content("note", "text")
+    saver.flush()
+    saver.wait()
+
+    # Signals from the worker thread are delivered through the event loop
+    app.processEvents()
+
+    assert saved == []
+    assert failed == ["disk full"]